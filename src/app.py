@@ -2,15 +2,32 @@ import tkinter as tk
 import tkinter.ttk as ttk
 import tkinter.filedialog as filedialog
 import tkinter.messagebox as messagebox
+import tkinter.simpledialog as simpledialog
 import lsystem as lsys
 import utilities as util
 import lsysfilehandler as fh
 import widgets as w
+import drawstats as ds
+import exporters as ex
+import headless
+import rendering as rd
+import spatial as sp
+import io
+import itertools
 import os
 
 #Get project root directory
 ROOT_DIR = os.path.split(os.path.dirname(os.path.abspath(__file__)))[0]
 
+#Live preview waits this many ms after the last edit before drawing
+PREVIEW_DELAY = 300
+
+#Color of the subtree highlighted when inspecting segments
+HIGHLIGHT_COLOR = "#ffd54f"
+
+#Live preview first draws this many iterations less, then refines
+PREVIEW_ITERATION_DROP = 2
+
 class VariablesFrame(tk.Frame):
     def __init__(self, master=None, **kw):
         super().__init__(master=master, **kw)
@@ -98,20 +115,7 @@ class VariablesFrame(tk.Frame):
         self._symbols.clear()
 
         #Insert each symbol into treeview and symbols dict
-        self._symbols.append(("F", "Move pen down"))
-        self._symbols.append(("G", "Move pen up"))
-        self._symbols.append(("+", "Turn right"))
-        self._symbols.append(("-", "Turn left"))
-        self._symbols.append(("!", "Switch turn directions"))
-        self._symbols.append(("@", "Multiply step", 0.6))
-        self._symbols.append(("[", "Save state"))
-        self._symbols.append(("]", "Load state"))
-        self._symbols.append(("<", "Color up", 1))
-        self._symbols.append((">", "Color down", 1))
-        self._symbols.append(("%", "Color set"))
-        self._symbols.append(("(", "Thickness up", 1))
-        self._symbols.append((")", "Thickness down", 1))
-        self._symbols.append(("&", "Thickness set"))
+        self._symbols.extend(util.default_symbols)
 
         self.treeview.update_rows(self._symbols)
 
@@ -127,13 +131,25 @@ class VariablesFrame(tk.Frame):
         self.operation_combobox.set("")
 
     def get_symbols(self):
+        return util.symbols_list_to_dict(self._symbols)
 
-        #Convert to dictionary first
-        dictionary = {}
-        for symbol in self._symbols:
-            dictionary[symbol[0]] = (util.op_conversion_dict[symbol[1]], symbol[2] if len(symbol) > 2 else None)
-        
-        return dictionary
+    def set_symbols(self, symbols):
+        '''
+        Replaces the symbols with a list of (symbol, readable op, default value) tuples.
+        '''
+        self._symbols.clear()
+        self._symbols.extend(tuple(symbol) for symbol in symbols)
+        self.treeview.update_rows(self._symbols)
+
+    def get_symbols_json(self):
+        '''
+        Returns the symbols the way an lsystem object holds them, "defaults" or
+        a list of [symbol, readable op, default value] lists.
+        '''
+        if self._symbols == util.default_symbols:
+            return "defaults"
+
+        return [list(symbol) for symbol in self._symbols]
 
 class RulesFrame(tk.Frame):
     def __init__(self, master=None, **kw):
@@ -237,10 +253,12 @@ class RulesFrame(tk.Frame):
     def insert_rule(self, var, mutation):
         self._rules.append((var, mutation))
         self.treeview.update_rows(self._rules)
+        self.event_generate("<<RulesChanged>>")
 
     def delete_rule(self, index):
         self._rules.remove(self._rules[index])
         self.treeview.update_rows(self._rules)
+        self.event_generate("<<RulesChanged>>")
         
     def get_rules(self):
         return self._rules
@@ -301,6 +319,7 @@ class RulesFrame(tk.Frame):
         
         #Refresh the treeview with new updated rules list
         self.treeview.update_rows(self._rules)
+        self.event_generate("<<RulesChanged>>")
 
         #Clear entries
         self.clear_entries()
@@ -358,6 +377,7 @@ class SettingsFrame(tk.Frame):
         self.line_start_thickness_label = tk.Label(self.input_frame, text = "Line thickness:")
         self.step_length_label = tk.Label(self.input_frame, text = "Step length:")
         self.start_color_label = tk.Label(self.input_frame, text = "Start color:")
+        self.seed_label = tk.Label(self.input_frame, text = "Seed:")
 
         #Setup entries
         self.axiom_entry = w.Entry(self.input_frame, width = 8)
@@ -388,6 +408,14 @@ class SettingsFrame(tk.Frame):
 
         self.step_length_entry = w.NumberEntry(self.input_frame, width = 8)
         self.start_color_entry = w.NumberEntry(self.input_frame, 3, width = 8)
+        self.seed_entry = w.NumberEntry(self.input_frame, width = 8)
+
+        #Parametric symbols take their values as arguments, e.g. F(10), and need NumPy
+        self.parametric_var = tk.BooleanVar(value = False)
+        self.parametric_checkbutton = tk.Checkbutton(
+            self.input_frame,
+            text = "Parametric",
+            variable = self.parametric_var)
 
         #Setup ColorPaletteOptions
         self.color_palette_options = w.ColorPaletteOptions(self.color_palette_label_frame)
@@ -399,6 +427,7 @@ class SettingsFrame(tk.Frame):
         self.turn_angle_entry.insert(0, 45)
         self.step_length_entry.insert(0, 25)
         self.start_color_entry.insert(0, 0)
+        self.seed_entry.insert(0, 0)
 
         #Placement
         self.label_frame.pack(fill = tk.BOTH)
@@ -420,11 +449,14 @@ class SettingsFrame(tk.Frame):
         self.line_start_thickness_label.grid(column = 2, row = 1, sticky = tk.W, padx = (10, 0), pady = (0, 5))
         self.step_length_label.grid(column = 2, row = 2, sticky = tk.W, padx = (10, 0), pady = (0, 5))
         self.start_color_label.grid(column = 2, row = 3, sticky = tk.W, padx = (10, 0), pady = (0, 5))
+        self.seed_label.grid(column = 2, row = 4, sticky = tk.W, padx = (10, 0), pady = (0, 5))
 
         self.iteration_spinbox.grid(column = 3, row = 0, pady = (0, 5))
         self.line_thickness_spinbox.grid(column = 3, row = 1, pady = (0, 5))
         self.step_length_entry.grid(column = 3, row = 2, pady = (0, 5))
         self.start_color_entry.grid(column = 3, row = 3, pady = (0, 5))
+        self.seed_entry.grid(column = 3, row = 4, pady = (0, 5))
+        self.parametric_checkbutton.grid(column = 2, row = 5, columnspan = 2, sticky = tk.W, padx = (10, 0))
 
         self.color_palette_label_frame.pack(fill = tk.X, padx = 5)
         self.color_palette_options.pack(fill = tk.X)
@@ -442,13 +474,23 @@ class SettingsFrame(tk.Frame):
             "iteration" : int(self.iteration_spinbox.get()),
             "line_thickness" : int(self.line_thickness_spinbox.get()),
             "step_length" : float(self.step_length_entry.get()),
-            "start_color" : int(self.start_color_entry.get())
+            "start_color" : int(self.start_color_entry.get()),
+            "seed" : int(self.seed_entry.get()),
+            "parametric" : self.parametric_var.get()
         }
 
 class DrawButtonFrame(tk.Frame):
     def __init__(self, master=None, **kw):
         super().__init__(master=master, **kw)
 
+        #Internal data
+        self._expansion_cache = lsys.ExpansionCache()
+        self._generations = []
+        self._rules = []
+        self._seed = 0
+        self._preview_after_id = None
+        self._render_job = None
+
         #Setup draw button icon
         icon_image = tk.PhotoImage(file = ROOT_DIR + r"\resources\drawing-button.png")
 
@@ -467,27 +509,29 @@ class DrawButtonFrame(tk.Frame):
         #Placement
         self.draw_button.pack(fill = tk.BOTH, expand = True, padx = 5, pady = (5, 0))
 
-    def on_draw_button_click(self):
-
-        #Gather information for drawing
+    def get_draw_arguments(self, iterations = None):
+        '''
+        Gathers the drawing information from the widgets and returns the
+        arguments for lsys.draw_lsystem, the lsystem expanded the given
+        amount of iterations (the iteration setting by default).
+        '''
         symbols = variables_frame.get_symbols()
         rules = rules_frame.get_rules()
         settings = settings_frame.get_settings_dict()
         colors = settings_frame.get_color_palette()
 
-        #Initialize lsystem object
-        lsystem = lsys.LSystem(settings["axiom"], rules)
+        if iterations == None:
+            iterations = settings["iteration"]
 
-        #Don't exactly know why im iterating the lsystem like this?
-        for _ in range(settings["iteration"]):
-            next(lsystem)
-        
-        #Clear canvas before drawing
-        drawing_frame.draw_canvas.clear_canvas()
+        #Expansions are cached, so settings that only change the geometry don't expand again
+        #The generations are kept for finding where picked symbols came from
+        self._generations = self._expansion_cache.get_generations(settings["axiom"], rules, iterations, 
+            settings["seed"], settings["parametric"])
+        self._rules = list(rules)
+        self._seed = settings["seed"]
 
-        lsys.draw_lsystem(
-            drawing_frame.draw_canvas, 
-            str(lsystem), 
+        return (
+            self._generations[-1], 
             symbols,
             (settings["pos_x"], settings["pos_y"]),
             settings["angle"],
@@ -497,16 +541,299 @@ class DrawButtonFrame(tk.Frame):
             colors,
             settings["start_color"])
 
+    def trace(self, draw_arguments, deduplicator = None):
+        '''
+        Returns the segments of the given draw arguments, recording them
+        for picking on the drawing canvas as they're drawn. Raises a ValueError
+        for unmatched load symbols here, not once the segments are drawn.
+        '''
+        segments = lsys.trace_lsystem(drawing_frame.get_world_size(), *draw_arguments)
+
+        #The stack is checked before the first segment, outside of the render job's tk callbacks
+        first = next(segments, None)
+        segments = itertools.chain([first] if first != None else [], segments)
+
+        if deduplicator != None:
+            segments = deduplicator.filter(segments)
+
+        drawing_frame.start_picking(self._generations, self._rules, self._seed, draw_arguments[1])
+        return drawing_frame.picker.record(segments)
+
+    def cancel_render(self):
+        '''
+        Stops the live preview that's waiting or being drawn.
+        '''
+        if self._preview_after_id != None:
+            self.after_cancel(self._preview_after_id)
+            self._preview_after_id = None
+
+        if self._render_job != None:
+            self._render_job.cancel()
+            self._render_job = None
+
+    def request_preview(self):
+        '''
+        Draws a live preview once the settings haven't changed for PREVIEW_DELAY ms,
+        if live preview is enabled. Every request restarts the wait and stops
+        the preview being drawn, as it's outdated.
+        '''
+        if not top_menu.live_preview_var.get():
+            return
+
+        self.cancel_render()
+        self._preview_after_id = self.after(PREVIEW_DELAY, self.start_preview)
+
+    def start_preview(self):
+        self._preview_after_id = None
+
+        #Half typed numbers etc. can't be drawn, wait for the next edit
+        try:
+            iterations = settings_frame.get_settings_dict()["iteration"]
+        except ValueError:
+            return
+
+        self.draw_preview(max(1, iterations - PREVIEW_ITERATION_DROP), iterations)
+
+    def draw_preview(self, iterations, final_iterations):
+        '''
+        Draws the lsystem expanded the given amount of iterations, a batch of lines
+        at a time, and then again with final_iterations if there are more of them.
+        '''
+        deduplicator = lsys.SegmentDeduplicator() if top_menu.dedupe_var.get() else None
+
+        #Expanding raises for invalid rules, and parametric l-systems without NumPy
+        try:
+            draw_arguments = self.get_draw_arguments(iterations)
+            segments = self.trace(draw_arguments, deduplicator)
+        except (ValueError, ImportError) as e:
+            messagebox.showerror("Can't draw the lsystem", str(e))
+            return
+
+        on_done = None
+        if iterations < final_iterations:
+            on_done = lambda: self.draw_preview(final_iterations, final_iterations)
+
+        drawing_frame.draw_canvas.clear_canvas()
+
+        #A raster is drawn at once, there's nothing to cancel
+        if top_menu.raster_mode_var.get():
+            self._render_job = None
+            drawing_frame.draw_raster(segments)
+            if on_done != None:
+                self._preview_after_id = self.after_idle(on_done)
+            return
+
+        self._render_job = rd.RenderJob(drawing_frame.draw_canvas, drawing_frame.draw_canvas.get_view_segments(segments), 
+            on_done = on_done, on_progress = self.on_render_progress)
+        self._render_job.start()
+
+    def on_settings_changed(self, event = None):
+        self.request_preview()
+
+    def on_draw_button_click(self):
+
+        #The full drawing replaces any preview
+        self.cancel_render()
+
+        #Only collect draw statistics if they're shown or logged
+        stats = ds.DrawStats() if top_menu.is_draw_stats_enabled() else None
+        canvas = drawing_frame.draw_canvas
+
+        deduplicator = lsys.SegmentDeduplicator() if top_menu.dedupe_var.get() else None
+
+        #Expanding raises for invalid rules, and parametric l-systems without NumPy
+        try:
+            if stats != None:
+                stats.start_phase("expansion")
+
+            draw_arguments = self.get_draw_arguments()
+
+            if stats != None:
+                stats.stop_phase("expansion")
+                canvas = stats.wrap_canvas(canvas)
+
+            segments = self.trace(draw_arguments, deduplicator)
+        except (ValueError, ImportError) as e:
+            messagebox.showerror("Can't draw the lsystem", str(e))
+            return
+
+        lsystem, symbols = draw_arguments[:2]
+
+        #Clear canvas before drawing
+        drawing_frame.draw_canvas.clear_canvas()
+
+        def on_done():
+            if stats == None:
+                return
+
+            #Drawn over several ticks, so the interpretation time is the time spent in them
+            if self._render_job != None:
+                stats.add_time("interpretation", self._render_job.draw_time)
+                stats.count_render(self._render_job)
+
+            stats.exclude_canvas_time("interpretation")
+            stats.count_lsystem(lsystem, symbols)
+            if deduplicator != None:
+                stats.count_duplicates(deduplicator)
+            top_menu.report_draw_stats(stats)
+
+        #Raster rendering draws a single image instead of a canvas item per line
+        if top_menu.raster_mode_var.get():
+            if stats != None:
+                stats.start_phase("interpretation")
+            drawing_frame.draw_raster(segments)
+            if stats != None:
+                stats.stop_phase("interpretation")
+            on_done()
+            return
+
+        #Draw a batch of lines per tick, sized to fit the frame budget
+        self._render_job = rd.RenderJob(canvas, drawing_frame.draw_canvas.get_view_segments(segments), 
+            on_done = on_done, on_progress = self.on_render_progress)
+        self._render_job.start()
+
+    def on_render_progress(self, render_job):
+        drawing_frame.set_status(render_job.get_summary())
+
 class CanvasFrame(tk.Frame):
     def __init__(self, master=None, **kw):
         super().__init__(master=master, **kw)
 
-        #Setup draw canvas
-        self.draw_canvas = w.DrawingCanvas(self, bg = "#212121")
+        #Setup draw canvas, drawings keep their size in world coordinates and are scaled to fit the canvas
+        self.draw_canvas = w.DrawingCanvas(self, world_size = (headless.CANVAS_WIDTH, headless.CANVAS_HEIGHT), 
+            bg = "#212121")
+        self._raster_after_id = None
+
+        #Setup status bar, only placed when draw statistics are shown or segments inspected
+        self.status_bar = tk.Label(self, anchor = tk.W, font = ("", 9), relief = tk.SUNKEN)
+
+        #Spatial index of the drawn segments & where their symbols came from
+        self.picker = sp.SegmentPicker()
+        self._generations = []
+        self._rules = []
+        self._seed = None
+        self._origins = None
+        self._symbols = {}
+        self.inspecting = False
+
+        #Setup event bindings
+        self.draw_canvas.bind("<Motion>", self.on_canvas_motion, add = "+")
+        self.draw_canvas.bind("<Button-1>", self.on_canvas_click, add = "+")
+        self.draw_canvas.bind("<<ViewChanged>>", self.on_view_changed, add = "+")
 
         #Placement
         self.draw_canvas.pack(fill = tk.BOTH, expand = True)
 
+    def get_world_size(self):
+        return self.draw_canvas.world_size
+
+    def draw_raster(self, segments):
+        '''
+        Renders the segments, in world coordinates, to a png image of the view
+        with the raster exporter and draws it to the canvas.
+        '''
+        canvas = self.draw_canvas
+
+        with io.BytesIO() as fp:
+            ex.write_png(fp, segments, canvas.world_size, canvas.view_scale, workers = 1, compress_level = 1)
+            canvas.delete("raster")
+            canvas.draw_png(fp.getvalue(), canvas.view_offset[0], canvas.view_offset[1], tags = "raster")
+
+    def redraw_raster(self):
+        '''
+        Renders the raster again at the current view scale from the segments kept by the picker.
+        '''
+        self._raster_after_id = None
+        if self.draw_canvas.find_withtag("raster"):
+            self.draw_raster(self.picker.grid.segments)
+
+    def start_picking(self, generations, rules, seed, symbols):
+        '''
+        Clears the picker for a new drawing of the last of the given generations.
+        '''
+        self.picker = sp.SegmentPicker()
+        self._generations = generations
+        self._rules = rules
+        self._seed = seed
+        self._symbols = symbols
+
+        #Built when a segment is first picked, drawing without inspecting doesn't need it
+        self._origins = None
+
+    def describe_segment(self, segment):
+        '''
+        Returns a text telling which symbol drew the segment and which rule wrote the symbol.
+        '''
+        lsystem = self._generations[-1]
+        text = "Symbol %s at %d" % (lsystem[segment.index], segment.index)
+
+        #Hovering after that only bisects the successor offsets found once
+        if self._origins == None:
+            self._origins = lsys.SymbolOriginIndex(self._generations, self._rules, self._seed)
+
+        origin = self._origins.get_origin(segment.index)
+        if origin == None:
+            return text + ", from the axiom"
+
+        return text + ", written by rule %s -> %s (generation %d, symbol %d of the successor)" % (
+            origin.var, origin.successor, origin.generation, origin.offset)
+
+    def highlight_subtree(self, segment):
+        '''
+        Highlights the segments drawn from the given one up to the end of its branch.
+        '''
+        self.draw_canvas.delete("highlight")
+        if segment == None:
+            return
+
+        save_symbol = "["
+        load_symbol = "]"
+        for symbol, op in self._symbols.items():
+            if op[0] == "state_save":
+                save_symbol = symbol
+            elif op[0] == "state_load":
+                load_symbol = symbol
+
+        end = lsys.get_branch_end(self._generations[-1], segment.index, save_symbol, load_symbol)
+
+        for subtree_segment in self.draw_canvas.get_view_segments(self.picker.get_segments_between(segment.index, end)):
+            self.draw_canvas.create_line(subtree_segment[0], subtree_segment[1], 
+                subtree_segment[2], subtree_segment[3],
+                width = subtree_segment.thickness + 2, fill = HIGHLIGHT_COLOR, tags = "highlight")
+
+    def show_status_bar(self, show):
+        if show:
+            self.status_bar.pack(side = tk.BOTTOM, fill = tk.X, before = self.draw_canvas)
+        else:
+            self.status_bar.pack_forget()
+
+    def set_status(self, text):
+        self.status_bar["text"] = text
+
+    #Event functions
+
+    def pick(self, event):
+        #The picker holds the segments in world coordinates
+        x, y = self.draw_canvas.to_world(event.x, event.y)
+        return self.picker.pick(x, y, 3 / self.draw_canvas.view_scale)
+
+    def on_canvas_motion(self, event):
+        if not self.inspecting:
+            return
+
+        segment = self.pick(event)
+        self.set_status(self.describe_segment(segment) if segment != None else "")
+
+    def on_canvas_click(self, event):
+        if self.inspecting:
+            self.highlight_subtree(self.pick(event))
+
+    def on_view_changed(self, event):
+        #Lines are scaled by the canvas, a raster is rendered again once resizing stops
+        if self._raster_after_id != None:
+            self.after_cancel(self._raster_after_id)
+        self._raster_after_id = self.after(PREVIEW_DELAY, self.redraw_raster)
+
 class TopMenu(tk.Menu):
     '''
     The top-level menu widget of the program.
@@ -519,19 +846,58 @@ class TopMenu(tk.Menu):
         #Assign the path first to be the cwd\..\data\l-systems_files folder
         self.last_opened_file_path = ROOT_DIR + r"\data\lsystems"
         self.user_save_file_path = ROOT_DIR + r"\data\my_lsystems"
+        self.draw_stats_log_path = os.path.join(ROOT_DIR, "draw-stats.jsonl")
+
+        #Draw statistics options
+        self.show_draw_stats_var = tk.BooleanVar(value = False)
+        self.log_draw_stats_var = tk.BooleanVar(value = False)
+
+        #Render to a single raster image instead of canvas lines
+        self.raster_mode_var = tk.BooleanVar(value = False)
+
+        #Skip lines that have already been drawn
+        self.dedupe_var = tk.BooleanVar(value = False)
+
+        #Redraw while the settings are edited
+        self.live_preview_var = tk.BooleanVar(value = False)
+
+        #Show where the segments under the mouse came from
+        self.inspect_var = tk.BooleanVar(value = False)
 
         #Create pulldown menus
         filemenu = tk.Menu(self, tearoff = 0)
         filemenu.add_command(label = "Open l-system", command = self.open_lsystem_file)
         filemenu.add_command(label = "Save l-system", command = self.save_lsystem_file)
         filemenu.add_separator()
+        filemenu.add_command(label = "Export SVG", command = self.export_svg_file)
+        filemenu.add_command(label = "Export PNG", command = self.export_png_file)
+        filemenu.add_separator()
         filemenu.add_command(label = "Exit", command = master.quit)
 
+        viewmenu = tk.Menu(self, tearoff = 0)
+        viewmenu.add_checkbutton(label = "Raster rendering", variable = self.raster_mode_var)
+        viewmenu.add_checkbutton(label = "Remove duplicate lines", variable = self.dedupe_var)
+        viewmenu.add_checkbutton(
+            label = "Live preview",
+            variable = self.live_preview_var,
+            command = self.on_live_preview_toggle)
+        viewmenu.add_checkbutton(
+            label = "Inspect segments",
+            variable = self.inspect_var,
+            command = self.on_inspect_toggle)
+        viewmenu.add_separator()
+        viewmenu.add_checkbutton(
+            label = "Show draw statistics", 
+            variable = self.show_draw_stats_var,
+            command = self.update_status_bar)
+        viewmenu.add_checkbutton(label = "Log draw statistics", variable = self.log_draw_stats_var)
+
         helpmenu = tk.Menu(self, tearoff = 0)
         helpmenu.add_command(label = "About")
 
         #Add pulldown menus to top-level menu
         self.add_cascade(label = "File", menu = filemenu)
+        self.add_cascade(label = "View", menu = viewmenu)
         self.add_cascade(label = "Help", menu = helpmenu)
 
     def open_lsystem_file(self):
@@ -576,6 +942,77 @@ class TopMenu(tk.Menu):
         #    messagebox.showerror("Error creating file", ("Error occurred while trying to save the lsystem!\n"
         #        "Make sure every form contains valid data"))
 
+    def export_svg_file(self):
+
+        #Open a file dialog window and return the chosen file path
+        path = filedialog.asksaveasfilename(
+            initialdir = self.user_save_file_path,
+            defaultextension = ".svg",
+            filetypes = [("Svg file", "*.svg")])
+
+        if not path:
+            return
+
+        #Export the current settings at the drawing canvas' size
+        lsys_obj = create_lsystem_file_object()
+        size = drawing_frame.get_world_size()
+
+        with ex.expand_lsystem_object(lsys_obj) as lsystem:
+            ex.export_svg(path, fh.trace_lsystem_object(size, lsys_obj, lsystem), size)
+
+    def export_png_file(self):
+
+        #Ask for the image size relative to the drawing canvas
+        scale = simpledialog.askfloat("Export PNG", "Image scale (canvas size times):", 
+            initialvalue = 1, minvalue = 0.1, maxvalue = 50)
+
+        if scale == None:
+            return
+
+        #Open a file dialog window and return the chosen file path
+        path = filedialog.asksaveasfilename(
+            initialdir = self.user_save_file_path,
+            defaultextension = ".png",
+            filetypes = [("Png file", "*.png")])
+
+        if not path:
+            return
+
+        lsys_obj = create_lsystem_file_object()
+        size = drawing_frame.get_world_size()
+
+        with ex.expand_lsystem_object(lsys_obj) as lsystem:
+            ex.export_png(path, fh.trace_lsystem_object(size, lsys_obj, lsystem), size, scale)
+
+    def is_draw_stats_enabled(self):
+        return self.show_draw_stats_var.get() or self.log_draw_stats_var.get()
+
+    def report_draw_stats(self, stats):
+        '''
+        Shows the draw statistics in the status bar and/or appends 
+        them as a json line to the draw statistics log.
+        '''
+        if self.show_draw_stats_var.get():
+            drawing_frame.set_status(stats.get_summary())
+
+        if self.log_draw_stats_var.get():
+            stats.write_json_line(self.draw_stats_log_path)
+
+    def update_status_bar(self):
+        drawing_frame.show_status_bar(self.show_draw_stats_var.get() or self.inspect_var.get())
+
+    def on_inspect_toggle(self):
+        drawing_frame.inspecting = self.inspect_var.get()
+        if not drawing_frame.inspecting:
+            drawing_frame.highlight_subtree(None)
+        self.update_status_bar()
+
+    def on_live_preview_toggle(self):
+        if self.live_preview_var.get():
+            draw_button_frame.request_preview()
+        else:
+            draw_button_frame.cancel_render()
+
 def overwrite_settings(lsys_dic):
     '''
     Takes in a l-system file object and
@@ -586,15 +1023,18 @@ def overwrite_settings(lsys_dic):
     #Lazy way of loading defaults variables
     variables_frame.load_defaults_button_clicked_event(None)
 
+    #Symbols saved with the file replace the defaults
+    if lsys_dic.get("symbols", "defaults") != "defaults":
+        variables_frame.set_symbols(lsys_dic["symbols"])
+
     try:
         #Really messy way to handle rules but due
         #to json not allowing lists of tuples we 
         #have to use this hacky approach
         rules_frame._rules.clear()
 
-        for rule_dic in lsys_dic["rules"]:
-            for key, val in rule_dic.items():
-                rules_frame.insert_rule(key, val)
+        for var, rule in fh.get_rules(lsys_dic):
+            rules_frame.insert_rule(var, rule)
 
         #Set settings
         settings_frame.axiom_entry.set_new_value(lsys_dic["settings"]["axiom"])
@@ -606,6 +1046,8 @@ def overwrite_settings(lsys_dic):
         settings_frame.line_thickness_var.set(lsys_dic["settings"]["thickness"])
         settings_frame.step_length_entry.set_new_value(lsys_dic["settings"]["step_length"])
         settings_frame.start_color_entry.set_new_value(lsys_dic["settings"]["start_color"])
+        settings_frame.seed_entry.set_new_value(lsys_dic["settings"].get("seed", 0))
+        settings_frame.parametric_var.set(fh.is_parametric(lsys_dic))
         settings_frame.color_palette_options.set_colors_force(lsys_dic["settings"]["color_palette"])
         
     except Exception:
@@ -619,13 +1061,12 @@ def create_lsystem_file_object():
     '''
 
     #Prep rules data for weird json dictionary list (rules : [ {x1 : y1}, {x2 : y2} ]), not exactly beautiful
-    rules_list = []
-    for rule in rules_frame._rules:
-        rules_list.append({rule[0] : rule[1]})
+    rules_list = fh.get_rules_json(rules_frame._rules)
 
     #Create dict that will hold all lsystem data
+    #The symbols get_symbols gives draw_lsystem, so exports are drawn like the canvas
     lsys_dict = { 
-        "symbols" : "defaults",
+        "symbols" : variables_frame.get_symbols_json(),
         "rules" : rules_list,
         "settings" : {
             "axiom" : settings_frame.axiom_entry.get(),
@@ -639,40 +1080,67 @@ def create_lsystem_file_object():
             "thickness" : settings_frame.line_thickness_var.get(),
             "step_length" : float(settings_frame.step_length_entry.get()),
             "start_color" : int(settings_frame.start_color_entry.get()),
+            "seed" : int(settings_frame.seed_entry.get()),
+            "parametric" : settings_frame.parametric_var.get(),
             "color_palette" : settings_frame.color_palette_options._colors
         }
     }
 
     return lsys_dict
 
-#Create the top-level widget of TK
-app = tk.Tk()
-app.title("Lindenmayer Systems Illustrator")
-app.geometry("1150x770")
-app.resizable(0,0)
-
-#Setup top-level menu
-top_menu = TopMenu(app)
-app.config(menu = top_menu)
-
-#Setup main frames
-control_frame = tk.Frame(app, padx = 5, pady = 5)
-drawing_frame = CanvasFrame(app)
-
-#Setup widgets
-variables_frame = VariablesFrame(control_frame)
-rules_frame = RulesFrame(control_frame)
-settings_frame = SettingsFrame(control_frame)
-draw_button_frame = DrawButtonFrame(control_frame)
-
-#Placement
-control_frame.place(relx = 0, rely = 0, relwidth = 0.3, relheight = 1)
-drawing_frame.place(relx = 0.3, rely = 0, relwidth = 0.7, relheight = 1)
-
-variables_frame.pack(fill = tk.X)
-rules_frame.pack(fill = tk.X)
-settings_frame.pack(fill = tk.X)
-draw_button_frame.pack(fill = tk.BOTH, expand = True)
-
-#Start the mainloop of TK
-app.mainloop()
\ No newline at end of file
+def main():
+    '''
+    Creates the application window and widgets and starts the mainloop.
+
+    Nothing is created when the module is imported, so its functions 
+    can be used without starting the GUI. The widgets are module globals,
+    as the frames & functions above expect.
+    '''
+    global app, top_menu, control_frame, drawing_frame
+    global variables_frame, rules_frame, settings_frame, draw_button_frame
+
+    #Create the top-level widget of TK
+    app = tk.Tk()
+    app.title("Lindenmayer Systems Illustrator")
+    app.geometry("1150x770")
+
+    #Setup top-level menu
+    top_menu = TopMenu(app)
+    app.config(menu = top_menu)
+
+    #Setup main frames
+    control_frame = tk.Frame(app, padx = 5, pady = 5)
+    drawing_frame = CanvasFrame(app)
+
+    #Setup widgets
+    variables_frame = VariablesFrame(control_frame)
+    rules_frame = RulesFrame(control_frame)
+    settings_frame = SettingsFrame(control_frame)
+    draw_button_frame = DrawButtonFrame(control_frame)
+
+    #Placement
+    control_frame.place(relx = 0, rely = 0, relwidth = 0.3, relheight = 1)
+    drawing_frame.place(relx = 0.3, rely = 0, relwidth = 0.7, relheight = 1)
+
+    variables_frame.pack(fill = tk.X)
+    rules_frame.pack(fill = tk.X)
+    settings_frame.pack(fill = tk.X)
+    draw_button_frame.pack(fill = tk.BOTH, expand = True)
+
+    #Live preview, redraw on every settings change
+    for entry in (settings_frame.axiom_entry, settings_frame.position_x_entry, settings_frame.position_y_entry,
+        settings_frame.angle_entry, settings_frame.turn_angle_entry, settings_frame.step_length_entry,
+        settings_frame.start_color_entry, settings_frame.seed_entry):
+        entry.bind("<KeyRelease>", draw_button_frame.on_settings_changed, add = "+")
+
+    for variable in (settings_frame.iteration_var, settings_frame.line_thickness_var, settings_frame.parametric_var):
+        variable.trace_add("write", lambda *args: draw_button_frame.on_settings_changed())
+
+    rules_frame.bind("<<RulesChanged>>", draw_button_frame.on_settings_changed)
+    settings_frame.color_palette_options.bind("<<PaletteChanged>>", draw_button_frame.on_settings_changed)
+
+    #Start the mainloop of TK
+    app.mainloop()
+
+if __name__ == "__main__":
+    main()
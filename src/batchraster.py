@@ -0,0 +1,173 @@
+'''
+Holds the NumPy raster renderer, drawing whole batches of segments at once.
+
+Needs NumPy. The exporters fall back to the pure Python RasterTile in the
+raster module when it isn't installed.
+'''
+
+import numpy as np
+
+#Supported modes:
+#aliased - every pixel is either covered by a line or not
+#coverage - anti-aliased, edge pixels are blended by how much of them a line covers
+#density - anti-aliased and additive, overlapping lines build up brightness
+MODES = ("aliased", "coverage", "density")
+
+#Maximum amount of candidate pixels processed at a time
+BATCH_PIXELS = 1 << 22
+
+class BatchRasterTile:
+    '''
+    A rectangle of RGB pixels at position (x, y) of a larger image, drawn to
+    a batch of segments at a time.
+
+    For every segment the pixels of its bounding box are generated as arrays,
+    and their coverage is found from the distance of the pixel centers to the
+    line (butt capped, thickness wide). The covered pixels are then blended
+    into the tile in drawing order, without a python loop over segments or pixels.
+
+    Has the same draw_segment_list() & get_row() methods as raster.RasterTile.
+    '''
+
+    def __init__(self, x, y, width, height, background = (0, 0, 0), mode = "coverage", density_gain = 0.5):
+        if mode not in MODES:
+            raise ValueError("Unknown raster mode %s, expected one of %s" % (mode, ", ".join(MODES)))
+
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self.density_gain = density_gain
+
+        self._background = np.frombuffer(bytes(background), dtype = np.uint8).astype(np.float64)
+        if mode == "density":
+            #Summed colors & coverage of the lines, blended with the background at the end
+            self._pixels = np.zeros((width * height, 3))
+            self._density = np.zeros(width * height)
+        else:
+            self._pixels = np.tile(self._background, (width * height, 1))
+            self._density = None
+        self._bytes = None
+
+    def draw_segment_list(self, segments):
+        '''
+        Draws a list of (x0, y0, x1, y1, thickness, rgb bytes) segments.
+        '''
+        if not segments:
+            return
+
+        coords = np.array([segment[:5] for segment in segments], dtype = np.float64)
+        colors = np.frombuffer(b"".join(segment[5] for segment in segments), dtype = np.uint8).reshape(-1, 3)
+
+        self.draw_segments(coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3], coords[:, 4], colors)
+
+    def draw_segments(self, x0, y0, x1, y1, thickness, colors):
+        '''
+        Draws segments given as arrays in image coordinates, colors being an
+        (n, 3) array of r, g, b values. Segments are drawn in array order.
+        '''
+        x0 = np.asarray(x0, dtype = np.float64) - self.x
+        y0 = np.asarray(y0, dtype = np.float64) - self.y
+        x1 = np.asarray(x1, dtype = np.float64) - self.x
+        y1 = np.asarray(y1, dtype = np.float64) - self.y
+        half = np.maximum(np.asarray(thickness, dtype = np.float64), 1) / 2
+        colors = np.asarray(colors, dtype = np.float64).reshape(-1, 3)
+
+        #Draw zero length lines as a dot, one pixel long
+        dots = (x0 == x1) & (y0 == y1)
+        x0 = np.where(dots, x0 - 0.5, x0)
+        x1 = np.where(dots, x1 + 0.5, x1)
+
+        #Bounding boxes in pixels, clipped to the tile
+        first_x = np.clip(np.floor(np.minimum(x0, x1) - half - 1), 0, self.width).astype(np.int64)
+        first_y = np.clip(np.floor(np.minimum(y0, y1) - half - 1), 0, self.height).astype(np.int64)
+        box_width = np.clip(np.ceil(np.maximum(x0, x1) + half + 1), 0, self.width).astype(np.int64) - first_x
+        box_height = np.clip(np.ceil(np.maximum(y0, y1) + half + 1), 0, self.height).astype(np.int64) - first_y
+        counts = np.maximum(box_width, 0) * np.maximum(box_height, 0)
+
+        #Split into batches of about BATCH_PIXELS candidate pixels, keeping drawing order
+        cumulative = np.cumsum(counts)
+        start = 0
+        while start < len(counts):
+            limit = cumulative[start] - counts[start] + BATCH_PIXELS
+            end = max(int(np.searchsorted(cumulative, limit, side = "right")), start + 1)
+            batch = slice(start, end)
+            self._draw_batch(x0[batch], y0[batch], x1[batch], y1[batch], half[batch], colors[batch],
+                first_x[batch], first_y[batch], box_width[batch], counts[batch])
+            start = end
+
+    def get_row(self, row):
+        if self._bytes == None:
+            self._bytes = self._get_rgb().astype(np.uint8).tobytes()
+
+        start = row * self.width * 3
+        return self._bytes[start:start + self.width * 3]
+
+    def _draw_batch(self, x0, y0, x1, y1, half, colors, first_x, first_y, box_width, counts):
+        total = int(counts.sum())
+        if total == 0:
+            return
+
+        #Expand every segment to the pixels of its bounding box
+        segment = np.repeat(np.arange(len(counts)), counts)
+        offset = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        pixel_x = first_x[segment] + offset % box_width[segment]
+        pixel_y = first_y[segment] + offset // box_width[segment]
+
+        #Distance of the pixel centers along and across the segment
+        dx = x1 - x0
+        dy = y1 - y0
+        length = np.hypot(dx, dy)
+        rel_x = pixel_x + 0.5 - x0[segment]
+        rel_y = pixel_y + 0.5 - y0[segment]
+        along = (rel_x * dx[segment] + rel_y * dy[segment]) / length[segment]
+        across = np.abs(rel_x * dy[segment] - rel_y * dx[segment]) / length[segment]
+
+        if self.mode == "aliased":
+            coverage = ((across <= half[segment]) & (along >= 0) & (along <= length[segment])).astype(np.float64)
+        else:
+            coverage = (np.clip(half[segment] + 0.5 - across, 0, 1) *
+                np.clip(np.minimum(along, length[segment] - along) + 0.5, 0, 1))
+
+        covered = coverage > 0
+        segment = segment[covered]
+        coverage = coverage[covered]
+        pixel = pixel_y[covered] * self.width + pixel_x[covered]
+
+        if self.mode == "density":
+            self._pixels[:, :] += self._bincount_colors(pixel, coverage[:, None] * colors[segment])
+            self._density += np.bincount(pixel, coverage, minlength = self._density.size)
+            return
+
+        #Blend in drawing order. Sorted by pixel then segment, every candidate is
+        #weighted by its coverage times the transparency of the candidates above it
+        order = np.lexsort((segment, pixel))
+        segment = segment[order]
+        coverage = np.minimum(coverage[order], 1 - 1e-9)
+        pixel = pixel[order]
+
+        transparency = np.log1p(-coverage)
+        pixel_transparency = np.bincount(pixel, transparency, minlength = self.width * self.height)
+        inclusive = np.cumsum(transparency)
+        group_start = np.searchsorted(pixel, pixel)
+        before_group = inclusive[group_start] - transparency[group_start]
+        above = pixel_transparency[pixel] - (inclusive - before_group)
+        weight = coverage * np.exp(above)
+
+        self._pixels *= np.exp(pixel_transparency)[:, None]
+        self._pixels += self._bincount_colors(pixel, weight[:, None] * colors[segment])
+
+    def _bincount_colors(self, pixel, weighted_colors):
+        return np.stack([np.bincount(pixel, weighted_colors[:, channel], minlength = self.width * self.height)
+            for channel in range(3)], axis = 1)
+
+    def _get_rgb(self):
+        if self.mode != "density":
+            return np.clip(np.rint(self._pixels), 0, 255)
+
+        #Average color of the lines over a pixel, more opaque the more lines overlap
+        density = self._density[:, None]
+        average = self._pixels / np.maximum(density, 1e-9)
+        alpha = 1 - np.exp(-self.density_gain * density)
+        return np.clip(np.rint(self._background * (1 - alpha) + average * alpha), 0, 255)
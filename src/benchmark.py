@@ -0,0 +1,239 @@
+'''
+Benchmarks the bundled l-systems.
+
+Every file in data/lsystems is loaded and iterated from 1 up to its own
+iteration count (or --max-iterations), timing expansion, interpretation
+(draw_lsystem on a NullCanvas) and rendering (draw_lsystem on a tkinter
+Canvas) separately. Results are printed and can be saved as json with
+--output and compared against an earlier run with --compare.
+
+With --import-time, the import time (python -X importtime) of the headless
+core modules and of the GUI module is measured instead.
+
+Usage: py benchmark.py [--max-iterations N] [--output FILE] [--compare FILE] [files...]
+       py benchmark.py --import-time [--output FILE]
+'''
+
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tkinter as tk
+import tracemalloc
+import headless
+import lsysfilehandler as fh
+
+#Get project root directory
+ROOT_DIR = os.path.split(os.path.dirname(os.path.abspath(__file__)))[0]
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+LSYSTEMS_DIR = os.path.join(ROOT_DIR, "data", "lsystems")
+
+#Modules measured by --import-time, the headless core should import neither tkinter nor numpy
+CORE_MODULES = ["lsystem", "lsysfilehandler", "geometry", "exporters"]
+GUI_MODULES = ["app"]
+
+class _SizedCanvas(tk.Canvas):
+    '''
+    A tkinter Canvas reporting its configured size, since the
+    benchmark window is never mapped to the screen.
+    '''
+
+    def winfo_width(self):
+        return int(self["width"])
+
+    def winfo_height(self):
+        return int(self["height"])
+
+def measure(function, *args):
+    '''
+    Calls function with args twice, first for wall time and then again
+    with tracemalloc running for peak memory, since tracing skews the timing.
+    Returns a tuple (result, wall time, peak memory in bytes).
+    '''
+
+    start = time.perf_counter()
+    result = function(*args)
+    wall_time = time.perf_counter() - start
+
+    tracemalloc.start()
+    function(*args)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return (result, wall_time, peak_memory)
+
+def expand(lsysobj, iterations):
+    lsystem = fh.create_lsystem(lsysobj)
+    for _ in range(iterations):
+        next(lsystem)
+    return lsystem.current_state
+
+def interpret(lsysobj, lsystem):
+    canvas = headless.NullCanvas()
+    fh.draw_lsystem_object(canvas, lsysobj, lsystem)
+    return canvas.line_count
+
+def render(root, lsysobj, lsystem):
+    canvas = _SizedCanvas(root, width = headless.CANVAS_WIDTH, height = headless.CANVAS_HEIGHT)
+    fh.draw_lsystem_object(canvas, lsysobj, lsystem)
+    item_count = len(canvas.find_all())
+    canvas.destroy()
+    return item_count
+
+def create_result(name, iterations, phase, wall_time, peak_memory, chars, segments):
+    return {
+        "name" : name,
+        "iterations" : iterations,
+        "phase" : phase,
+        "wall_time" : wall_time,
+        "peak_memory" : peak_memory,
+        "chars" : chars,
+        "segments" : segments,
+        "chars_per_s" : chars / wall_time if wall_time > 0 else None,
+        "segments_per_s" : segments / wall_time if wall_time > 0 and segments != None else None
+    }
+
+def benchmark_file(filepath, max_iterations, root):
+    '''
+    Benchmarks the l-system file at filepath and returns a list of result dicts,
+    one per phase and iteration count.
+    '''
+
+    results = []
+    name = os.path.splitext(os.path.basename(filepath))[0]
+    lsysobj = fh.load_lsystem(filepath)
+    iterations = lsysobj["settings"]["iterations"]
+
+    if max_iterations != None:
+        iterations = min(iterations, max_iterations)
+
+    for iteration in range(1, iterations + 1):
+        lsystem, wall_time, peak_memory = measure(expand, lsysobj, iteration)
+        results.append(create_result(name, iteration, "expansion", wall_time, peak_memory, len(lsystem), None))
+
+        segments, wall_time, peak_memory = measure(interpret, lsysobj, lsystem)
+        results.append(create_result(name, iteration, "interpretation", wall_time, peak_memory, len(lsystem), segments))
+
+        #Rendering needs a display
+        if root != None:
+            segments, wall_time, peak_memory = measure(render, root, lsysobj, lsystem)
+            results.append(create_result(name, iteration, "rendering", wall_time, peak_memory, len(lsystem), segments))
+
+    return results
+
+def measure_import_time(module, repeat = 5):
+    '''
+    Imports module in a fresh interpreter with -X importtime, repeat times, and
+    returns a result dict with the fastest cumulative import time in microseconds
+    and whether tkinter or numpy got imported along with it.
+    '''
+    best = None
+    imported = set()
+
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import " + module],
+            cwd = SRC_DIR, capture_output = True, text = True).stderr
+
+        for line in output.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+
+            fields = line[len("import time:"):].split("|")
+            if not fields[0].strip().isdigit():
+                continue
+
+            name = fields[2].strip()
+            imported.add(name)
+
+            if name == module:
+                cumulative = int(fields[1])
+                best = cumulative if best == None else min(best, cumulative)
+
+    return {
+        "module" : module,
+        "import_time_us" : best,
+        "imports_tkinter" : "tkinter" in imported,
+        "imports_numpy" : "numpy" in imported
+    }
+
+def print_result(result, baseline = None):
+    line = "%-28s %3d  %-14s %10.2f ms %12s chars/s %12s segs/s %10.1f KiB" % (
+        result["name"],
+        result["iterations"],
+        result["phase"],
+        result["wall_time"] * 1000,
+        "%.0f" % result["chars_per_s"] if result["chars_per_s"] != None else "-",
+        "%.0f" % result["segments_per_s"] if result["segments_per_s"] != None else "-",
+        result["peak_memory"] / 1024)
+
+    if baseline != None and result["wall_time"] > 0:
+        line += "  %.2fx" % (baseline["wall_time"] / result["wall_time"])
+
+    print(line)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Benchmark the bundled l-systems")
+    parser.add_argument("files", nargs = "*", help = "l-system files, defaults to every file in data/lsystems")
+    parser.add_argument("--max-iterations", type = int, default = None, help = "cap on the iteration count")
+    parser.add_argument("--output", default = None, help = "save the results as json to this file")
+    parser.add_argument("--compare", default = None, help = "earlier results json to compare against")
+    parser.add_argument("--no-render", action = "store_true", help = "skip the tkinter rendering phase")
+    parser.add_argument("--import-time", action = "store_true", help = "measure module import times instead")
+    args = parser.parse_args(argv)
+
+    if args.import_time:
+        results = []
+        for module in CORE_MODULES + GUI_MODULES:
+            result = measure_import_time(module)
+            result["kind"] = "gui" if module in GUI_MODULES else "core"
+            results.append(result)
+            print("%-18s %-4s %8.1f ms  tkinter: %-5s numpy: %s" % (module, result["kind"], 
+                result["import_time_us"] / 1000, result["imports_tkinter"], result["imports_numpy"]))
+
+        if args.output != None:
+            with open(args.output, "w") as fp:
+                json.dump({"python" : platform.python_version(), "timestamp" : time.time(), 
+                    "imports" : results}, fp, indent = 4)
+        return
+
+    files = args.files or sorted(glob.glob(os.path.join(LSYSTEMS_DIR, "*.json")))
+
+    root = None
+    if not args.no_render:
+        try:
+            root = tk.Tk()
+            root.withdraw()
+        except tk.TclError:
+            print("No display available, skipping the rendering phase", file = sys.stderr)
+
+    baselines = {}
+    if args.compare != None:
+        with open(args.compare, "r") as fp:
+            for result in json.load(fp)["results"]:
+                baselines[(result["name"], result["iterations"], result["phase"])] = result
+
+    results = []
+    for filepath in files:
+        for result in benchmark_file(filepath, args.max_iterations, root):
+            print_result(result, baselines.get((result["name"], result["iterations"], result["phase"])))
+            results.append(result)
+
+    if root != None:
+        root.destroy()
+
+    if args.output != None:
+        with open(args.output, "w") as fp:
+            json.dump({
+                "python" : platform.python_version(),
+                "platform" : platform.platform(),
+                "timestamp" : time.time(),
+                "results" : results
+            }, fp, indent = 4)
+
+if __name__ == "__main__":
+    main()
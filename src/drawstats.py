@@ -0,0 +1,137 @@
+'''
+Holds the phase timers and counters collected while drawing an l-system.
+'''
+
+import collections
+import json
+import time
+import lsystem as lsys
+
+class DrawStats:
+    '''
+    Collects per-phase timings (expansion, interpretation & canvas item creation)
+    and counters for a single draw.
+
+    Nothing here runs inside draw_lsystem's loop. The counters are found from the
+    expanded string after the draw, and canvas time is measured by wrapping the
+    canvas, so a draw without a DrawStats object pays no overhead at all.
+    '''
+
+    def __init__(self):
+        self.timings = collections.OrderedDict()
+        self.counters = collections.OrderedDict()
+        self.op_counts = collections.Counter()
+        self._phase_starts = {}
+
+    def start_phase(self, name):
+        self._phase_starts[name] = time.perf_counter()
+
+    def stop_phase(self, name):
+        elapsed = time.perf_counter() - self._phase_starts.pop(name)
+        self.timings[name] = self.timings.get(name, 0) + elapsed
+
+    def exclude_canvas_time(self, name):
+        '''
+        Subtracts the time spent creating canvas items from the named phase,
+        for phases that draw to a canvas returned by wrap_canvas.
+        '''
+        self.timings[name] -= self.timings.get("canvas", 0)
+
+    def wrap_canvas(self, canvas):
+        '''
+        Returns a stand-in for canvas that times and counts the lines created on it.
+        '''
+        return _TimedCanvas(canvas, self)
+
+    def count_lsystem(self, lsystem, symbols):
+        '''
+        Counts the expanded chars, the ops executed by type, the segments emitted
+        and the state stack's high-water mark of the given lsystem string.
+        '''
+        char_counts = collections.Counter(lsystem)
+
+        for char, count in char_counts.items():
+            op = symbols.get(char, None)
+            if op != None:
+                self.op_counts[op[0]] += count
+
+        self.counters["chars_expanded"] = len(lsystem)
+        self.counters["ops_executed"] = sum(self.op_counts.values())
+        self.counters["segments_emitted"] = self.op_counts["move_down"]
+        self.counters["max_stack_depth"] = lsys.get_max_stack_depth(lsystem, symbols)
+
+    def add_time(self, name, seconds):
+        '''
+        Adds time measured elsewhere, e.g. over several render ticks, to the named phase.
+        '''
+        self.timings[name] = self.timings.get(name, 0) + seconds
+
+    def count_render(self, render_job):
+        '''
+        Counts the throughput and average frame time of the given rendering.RenderJob.
+        '''
+        self.counters["lines_per_s"] = render_job.get_throughput()
+        self.counters["frame_time"] = render_job.get_frame_time()
+
+    def count_duplicates(self, deduplicator):
+        '''
+        Counts the duplicate segments removed by the given SegmentDeduplicator.
+        '''
+        self.counters["duplicate_segments"] = deduplicator.duplicate_count
+        self.counters["duplicate_ratio"] = deduplicator.get_duplicate_ratio()
+
+    def get_summary(self):
+        '''
+        Returns a one line summary fit for a status bar.
+        '''
+        timings = "  ".join("%s %.0f ms" % (name, seconds * 1000) for name, seconds in self.timings.items())
+        return "%s  |  %d chars  %d ops  %d segments  %d items  stack %d" % (
+            timings,
+            self.counters.get("chars_expanded", 0),
+            self.counters.get("ops_executed", 0),
+            self.counters.get("segments_emitted", 0),
+            self.counters.get("canvas_items", 0),
+            self.counters.get("max_stack_depth", 0)) + (
+            "  dupes %.1f%%" % (self.counters["duplicate_ratio"] * 100) if "duplicate_ratio" in self.counters else "") + (
+            "  %.0f lines/s  frame %.1f ms" % (self.counters["lines_per_s"], self.counters["frame_time"] * 1000)
+            if "lines_per_s" in self.counters else "")
+
+    def to_dict(self):
+        return {
+            "timings" : dict(self.timings),
+            "counters" : dict(self.counters),
+            "ops" : dict(self.op_counts)
+        }
+
+    def write_json_line(self, filepath):
+        '''
+        Appends the stats as a single json line to the file at filepath.
+        '''
+        record = self.to_dict()
+        record["timestamp"] = time.time()
+
+        with open(filepath, "a") as fp:
+            fp.write(json.dumps(record) + "\n")
+
+class _TimedCanvas:
+    '''
+    Wraps a canvas, adding the time spent in create_line to the stats'
+    "canvas" timing and counting the created items. Everything else is
+    passed on to the wrapped canvas.
+    '''
+
+    def __init__(self, canvas, stats):
+        self._canvas = canvas
+        self._stats = stats
+        stats.timings["canvas"] = stats.timings.get("canvas", 0)
+        stats.counters["canvas_items"] = stats.counters.get("canvas_items", 0)
+
+    def create_line(self, *args, **kw):
+        start = time.perf_counter()
+        item = self._canvas.create_line(*args, **kw)
+        self._stats.timings["canvas"] += time.perf_counter() - start
+        self._stats.counters["canvas_items"] += 1
+        return item
+
+    def __getattr__(self, name):
+        return getattr(self._canvas, name)
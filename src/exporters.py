@@ -0,0 +1,477 @@
+'''
+Holds the exporters writing l-systems to files other than json.
+
+Can also be run from the command line:
+py exporters.py svg|png|dzi|npz|arrow <lsystem json> <output file> [--iterations N] [--width W] [--height H]
+    [--scale S] [--tile-size T] [--workers N] [--raster-mode aliased|coverage|density] [--dedupe] [--out-of-core]
+'''
+
+import argparse
+import collections
+import concurrent.futures
+import contextlib
+import hashlib
+import math
+import os
+import shutil
+import tempfile
+import geometry
+import headless
+import lsystem as lsys
+import lsysfilehandler as fh
+import raster
+import spatial
+
+#The NumPy raster backend, imported on first use by get_batchraster
+_batchraster = None
+
+#Background color of the application's DrawingCanvas
+BACKGROUND_COLOR = "#212121"
+
+#Pixels of the rows of tiles write_png renders ahead of the rows it has written, at least a row of tiles
+MAX_PIXELS_IN_FLIGHT = 1 << 24
+
+def format_number(value, precision):
+    '''
+    Returns value as a string with at most precision decimals,
+    without trailing zeros.
+    '''
+    text = ("%.*f" % (precision, value)).rstrip("0").rstrip(".") if precision > 0 else "%d" % round(value)
+    return "0" if text in ("-0", "") else text
+
+class SvgWriter:
+    '''
+    Streams segments to an open svg file as they're added, holding nothing
+    but the pen position and style of the path currently being written.
+
+    Segments continuing where the previous one ended, with the same thickness
+    and color, are merged into a single <path> element of relative line commands.
+    Coordinates are rounded to precision decimals, and the pen position is kept
+    rounded too, so rounding errors don't add up along a path.
+    '''
+
+    def __init__(self, fp, size, background = None, precision = 2):
+        self._fp = fp
+        self._precision = precision
+        self._style = None
+        self._pen = None
+
+        self.segment_count = 0
+        self.path_count = 0
+
+        fp.write('<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" viewBox="0 0 %d %d">\n' % (
+            size[0], size[1], size[0], size[1]))
+
+        if background != None:
+            fp.write('<rect width="100%%" height="100%%" fill="%s"/>\n' % background)
+
+        fp.write('<g fill="none" stroke-linejoin="round">\n')
+
+    def add_segment(self, segment):
+        x0 = round(segment[0], self._precision)
+        y0 = round(segment[1], self._precision)
+        x1 = round(segment[2], self._precision)
+        y1 = round(segment[3], self._precision)
+        style = (segment[4], segment[5])
+
+        #Start a new path unless the segment continues the current one
+        if style != self._style or (x0, y0) != self._pen:
+            self._close_path()
+            self._fp.write('<path stroke="%s" stroke-width="%s" d="M%s %s l' % (
+                style[1],
+                format_number(style[0], self._precision),
+                format_number(x0, self._precision),
+                format_number(y0, self._precision)))
+
+            self._style = style
+            self.path_count += 1
+
+        self._fp.write(" %s %s" % (
+            format_number(x1 - x0, self._precision),
+            format_number(y1 - y0, self._precision)))
+
+        self._pen = (x1, y1)
+        self.segment_count += 1
+
+    def close(self):
+        self._close_path()
+        self._fp.write("</g>\n</svg>\n")
+
+    def _close_path(self):
+        if self._style != None:
+            self._fp.write('"/>\n')
+            self._style = None
+            self._pen = None
+
+def export_svg(filepath, segments, size, background = BACKGROUND_COLOR, precision = 2):
+    '''
+    Streams the given segments (any iterable, e.g. trace_lsystem's generator)
+    to an svg file of the given size at filepath. Returns the SvgWriter used,
+    holding the segment and path counts.
+    '''
+    with open(filepath, "w") as fp:
+        writer = SvgWriter(fp, size, background, precision)
+        for segment in segments:
+            writer.add_segment(segment)
+        writer.close()
+
+    return writer
+
+def get_batchraster():
+    '''
+    Imports and returns the batchraster module, or None if NumPy isn't installed.
+    NumPy is slow to import, so it's only imported once a raster is rendered.
+    '''
+    global _batchraster
+
+    if _batchraster == None:
+        try:
+            import batchraster
+            _batchraster = batchraster
+        except ImportError:
+            _batchraster = False
+
+    return _batchraster or None
+
+def create_raster_tile(x, y, width, height, background_rgb, mode = None):
+    '''
+    Returns a batchraster.BatchRasterTile in the given mode (see batchraster.MODES).
+    If mode is None, the anti-aliased "coverage" mode is used if NumPy is installed,
+    otherwise an aliased pure python raster.RasterTile.
+    '''
+    batchraster = get_batchraster()
+
+    if batchraster == None:
+        if mode != None:
+            raise RuntimeError("The %s raster mode needs NumPy installed" % mode)
+        return raster.RasterTile(x, y, width, height, background_rgb)
+
+    return batchraster.BatchRasterTile(x, y, width, height, background_rgb, mode or "coverage")
+
+def export_png(filepath, segments, size, scale = 1, background = BACKGROUND_COLOR, 
+    tile_size = 512, workers = None, mode = None):
+    '''
+    Renders the given segments, positioned for a canvas of the given size, to a png
+    file at filepath, scaled by scale (e.g. an 805x770 canvas at scale 20 gives a
+    16100x15400 image). Returns the image size (width, height).
+    See write_png.
+    '''
+    with open(filepath, "wb") as fp:
+        return write_png(fp, segments, size, scale, background, tile_size, workers, mode)
+
+def map_in_order(function, jobs, workers, max_pending):
+    '''
+    Yields function(*job) for every job of the iterable jobs, in order, running them
+    in a pool of workers processes (1 runs them in this process). Jobs are taken from
+    jobs as they're submitted, at most max_pending of them ahead of the one yielded.
+    '''
+    if workers == 1:
+        for job in jobs:
+            yield function(*job)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        pending = collections.deque()
+
+        for job in jobs:
+            pending.append(executor.submit(function, *job))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+def render_tile_row(tile_y, width, tile_height, tile_size, background_rgb, mode, tile_segments):
+    '''
+    Renders a row of tiles, tile_segments holding the segment list of every tile
+    from left to right, and returns the image's pixel rows in it as a list of bytes.
+    Runs in the worker processes of write_png.
+    '''
+    tiles = [create_raster_tile(tile_x, tile_y, min(tile_size, width - tile_x), tile_height, background_rgb, mode)
+        for tile_x in range(0, width, tile_size)]
+
+    for tile, segments in zip(tiles, tile_segments):
+        tile.draw_segment_list(segments)
+
+    return [b"".join(tile.get_row(row) for tile in tiles) for row in range(tile_height)]
+
+def write_png(fp, segments, size, scale = 1, background = BACKGROUND_COLOR, 
+    tile_size = 512, workers = None, mode = None, compress_level = 6):
+    '''
+    Renders the given segments, positioned for a canvas of the given size and
+    scaled by scale, as a png to the open binary file fp. Tiles are created by
+    create_raster_tile in the given raster mode. Returns the image size (width, height).
+
+    The segments are put in a grid spatial index with one cell per tile, then the
+    rows of tiles are rendered by a pool of worker processes (defaults to one per
+    cpu core, 1 renders in this process) and streamed to the file one pixel row at
+    a time, in order. At most two rows of tiles per worker, and at most
+    MAX_PIXELS_IN_FLIGHT pixels of them (but always one row), are rendered ahead
+    of the writer, so a wide image is rendered on fewer workers rather than
+    taking more memory.
+    '''
+    width = math.ceil(size[0] * scale)
+    height = math.ceil(size[1] * scale)
+    background_rgb = raster.get_rgb_bytes(background)
+
+    #Index every segment by the tiles it may cover, in image coordinates.
+    #Like the tkinter canvas, lines are at least 1 canvas pixel wide
+    grid = spatial.SegmentGrid(tile_size)
+    for segment in segments:
+        thickness = max(segment[4], 1) * scale
+        grid.insert(
+            (segment[0] * scale, segment[1] * scale, segment[2] * scale, segment[3] * scale, 
+                thickness, raster.get_rgb_bytes(segment[5])),
+            thickness / 2)
+
+    def get_job(tile_y):
+        #A worker is only sent the segments of its own row of tiles
+        return (tile_y, width, min(tile_size, height - tile_y), tile_size, background_rgb, mode,
+            [[grid.segments[index] for index in grid.get_cell(tile_x // tile_size, tile_y // tile_size)]
+                for tile_x in range(0, width, tile_size)])
+
+    writer = raster.PngWriter(fp, width, height, compress_level)
+    tile_rows = range(0, height, tile_size)
+
+    if workers == None:
+        workers = os.cpu_count() or 1
+
+    #Keep the workers busy without rendering far ahead of the writer
+    max_pending = max(1, min(2 * workers, MAX_PIXELS_IN_FLIGHT // (tile_size * width)))
+    workers = min(workers, max_pending, len(tile_rows))
+
+    for rows in map_in_order(render_tile_row, (get_job(tile_y) for tile_y in tile_rows), workers, max_pending):
+        for row in rows:
+            writer.write_row(row)
+
+    writer.close()
+    return (width, height)
+
+def get_lod_segments(segments, scale):
+    '''
+    Returns the level of detail culled version of the given segments, scaled by
+    scale. Segment ends are snapped to the pixel grid, and segments snapping to
+    the same pixels (in either direction) are drawn once, in the color of the last
+    one drawn. Segments within a single pixel become a dot.
+    '''
+    culled = {}
+
+    for segment in segments:
+        start = (math.floor(segment[0] * scale), math.floor(segment[1] * scale))
+        end = (math.floor(segment[2] * scale), math.floor(segment[3] * scale))
+        key = (min(start, end), max(start, end))
+
+        #Move the key to the end, so the culled segments stay in drawing order
+        culled.pop(key, None)
+        culled[key] = (start[0] + 0.5, start[1] + 0.5, end[0] + 0.5, end[1] + 0.5, 
+            max(segment[4] * scale, 1), segment[5])
+
+    return list(culled.values())
+
+def render_dzi_tile(tile_filepath, x, y, width, height, background_rgb, mode, tile_segments):
+    '''
+    Renders a tile of the given segments and writes it as a png to tile_filepath.
+    Runs in the worker processes of export_dzi.
+    '''
+    tile = create_raster_tile(x, y, width, height, background_rgb, mode)
+    tile.draw_segment_list(tile_segments)
+
+    #Write to a temporary file first, so an interrupted run never leaves half a tile behind
+    with open(tile_filepath + ".tmp", "wb") as fp:
+        writer = raster.PngWriter(fp, tile.width, tile.height)
+        for tile_row in range(tile.height):
+            writer.write_row(tile.get_row(tile_row))
+        writer.close()
+
+    os.replace(tile_filepath + ".tmp", tile_filepath)
+    return 1
+
+def export_dzi(filepath, segments, size, scale = 1, background = BACKGROUND_COLOR, 
+    tile_size = 254, overlap = 1, workers = None, mode = None):
+    '''
+    Renders the given segments, positioned for a canvas of the given size, as a
+    Deep Zoom image pyramid scaled by scale. Writes the .dzi descriptor to filepath
+    and the png tiles of every level to <name>_files/<level>/<column>_<row>.png.
+    Returns the amount of tiles rendered.
+
+    Levels at or above the canvas' resolution render the segments found through a
+    grid spatial index, coarser levels render level of detail culled segments (see
+    get_lod_segments) built from the level above. Tiles are rendered by a pool of
+    worker processes (defaults to one per cpu core, 1 renders in this process), on
+    tiles created by create_raster_tile in the given raster mode. A hash of the geometry and settings is written next to the
+    tiles once they're all rendered. Rerun with an identical hash, tiles already
+    on disk are skipped, otherwise the tiles on disk are deleted first.
+    '''
+    width = math.ceil(size[0] * scale)
+    height = math.ceil(size[1] * scale)
+    max_level = math.ceil(math.log2(max(width, height, 1)))
+    background_rgb = raster.get_rgb_bytes(background)
+
+    #Index the segments in canvas coordinates, with cells the size of a tile
+    #at the finest level, and hash them along with the settings
+    grid = spatial.SegmentGrid(tile_size / scale)
+    settings_hash = hashlib.sha256(repr((size, scale, background, tile_size, overlap, mode)).encode("utf-8"))
+    for segment in segments:
+        segment = tuple(segment[:6])
+        grid.insert(segment, max(segment[4], 1) / 2 + overlap / scale)
+        settings_hash.update(repr(segment).encode("utf-8"))
+
+    tiles_directory = os.path.splitext(filepath)[0] + "_files"
+    hash_filepath = os.path.join(tiles_directory, "settings.sha256")
+    can_skip = False
+    if os.path.exists(hash_filepath):
+        with open(hash_filepath, "r") as fp:
+            can_skip = fp.read() == settings_hash.hexdigest()
+
+    #Tiles of other settings would be skipped if the hash was written before they're all replaced,
+    #so they're deleted and the hash is only written once the whole pyramid is rendered
+    if not can_skip and os.path.isdir(tiles_directory):
+        if os.path.exists(hash_filepath):
+            os.remove(hash_filepath)
+        for name in os.listdir(tiles_directory):
+            if name.isdigit() and os.path.isdir(os.path.join(tiles_directory, name)):
+                shutil.rmtree(os.path.join(tiles_directory, name))
+
+    os.makedirs(tiles_directory, exist_ok = True)
+
+    def get_jobs():
+        #Levels are culled as the pool gets to them, every tile is sent only its own segments
+        lod_segments = None
+
+        for level in range(max_level, -1, -1):
+            level_scale = scale / 2 ** (max_level - level)
+            level_grid = None
+
+            #Coarser than the canvas, cull the level above's geometry
+            if level_scale < 1:
+                lod_segments = get_lod_segments(grid.segments if lod_segments == None else lod_segments, 
+                    level_scale if lod_segments == None else 0.5)
+                level_grid = spatial.SegmentGrid(tile_size)
+                for segment in lod_segments:
+                    level_grid.insert(segment, segment[4] / 2 + overlap)
+
+            os.makedirs(os.path.join(tiles_directory, str(level)), exist_ok = True)
+            level_width = math.ceil(width * level_scale / scale)
+            level_height = math.ceil(height * level_scale / scale)
+
+            for row in range(math.ceil(level_height / tile_size)):
+                for column in range(math.ceil(level_width / tile_size)):
+                    tile_filepath = os.path.join(tiles_directory, str(level), "%d_%d.png" % (column, row))
+                    if can_skip and os.path.exists(tile_filepath):
+                        continue
+
+                    #Tiles overlap their neighbours by overlap pixels
+                    x0 = max(column * tile_size - overlap, 0)
+                    y0 = max(row * tile_size - overlap, 0)
+                    x1 = min((column + 1) * tile_size + overlap, level_width)
+                    y1 = min((row + 1) * tile_size + overlap, level_height)
+
+                    if level_grid == None:
+                        tile_segments = []
+                        for index in grid.query(x0 / level_scale, y0 / level_scale, x1 / level_scale, y1 / level_scale):
+                            segment = grid.segments[index]
+                            tile_segments.append((segment[0] * level_scale, segment[1] * level_scale, 
+                                segment[2] * level_scale, segment[3] * level_scale, 
+                                max(segment[4], 1) * level_scale, raster.get_rgb_bytes(segment[5])))
+                    else:
+                        tile_segments = [level_grid.segments[index][:5] + (raster.get_rgb_bytes(level_grid.segments[index][5]),)
+                            for index in level_grid.query(x0, y0, x1, y1)]
+
+                    yield (tile_filepath, x0, y0, x1 - x0, y1 - y0, background_rgb, mode, tile_segments)
+
+    if workers == None:
+        workers = os.cpu_count() or 1
+
+    rendered = sum(map_in_order(render_dzi_tile, get_jobs(), workers, 2 * workers))
+
+    with open(hash_filepath, "w") as fp:
+        fp.write(settings_hash.hexdigest())
+
+    with open(filepath, "w") as fp:
+        fp.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        fp.write('<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" TileSize="%d" Overlap="%d" Format="png">\n' % (
+            tile_size, overlap))
+        fp.write('    <Size Width="%d" Height="%d"/>\n</Image>\n' % (width, height))
+
+    return rendered
+
+@contextlib.contextmanager
+def expand_lsystem_object(lsysobj, iterations = None, out_of_core = False):
+    '''
+    Context manager yielding the lsystem object expanded the given amount of
+    times (defaults to the object's own iterations). If out_of_core is true, the
+    generations are expanded to temporary files and a MappedLSystemString is yielded.
+    '''
+    lsystem = fh.create_lsystem(lsysobj)
+
+    if iterations == None:
+        iterations = lsysobj["settings"]["iterations"]
+
+    if not out_of_core:
+        for _ in range(iterations):
+            next(lsystem)
+        yield lsystem.current_state
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        mapped = lsys.expand_to_file(lsystem, iterations, directory)
+        try:
+            yield mapped
+        finally:
+            mapped.close()
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Export an l-system file")
+    parser.add_argument("format", choices = ["svg", "png", "dzi", "npz", "arrow"])
+    parser.add_argument("input", help = "l-system json file")
+    parser.add_argument("output", help = "file to export to")
+    parser.add_argument("--iterations", type = int, default = None, help = "defaults to the file's iterations")
+    parser.add_argument("--width", type = int, default = headless.CANVAS_WIDTH)
+    parser.add_argument("--height", type = int, default = headless.CANVAS_HEIGHT)
+    parser.add_argument("--scale", type = float, default = 1, help = "png & dzi image size relative to the canvas size")
+    parser.add_argument("--tile-size", type = int, default = None, help = "png & dzi tile size in pixels")
+    parser.add_argument("--workers", type = int, default = None, help = "png & dzi rendering processes")
+    parser.add_argument("--raster-mode", default = None, choices = ["aliased", "coverage", "density"],
+        help = "png & dzi raster mode, needs NumPy, defaults to coverage if NumPy is installed")
+    parser.add_argument("--dedupe", action = "store_true", help = "skip lines that have already been drawn")
+    parser.add_argument("--out-of-core", action = "store_true", help = "expand through temporary files")
+    args = parser.parse_args(argv)
+
+    lsysobj = fh.load_lsystem(args.input)
+    size = (args.width, args.height)
+
+    with expand_lsystem_object(lsysobj, args.iterations, args.out_of_core) as lsystem:
+        segments = fh.trace_lsystem_object(size, lsysobj, lsystem)
+
+        deduplicator = lsys.SegmentDeduplicator() if args.dedupe else None
+        if deduplicator != None:
+            segments = deduplicator.filter(segments)
+
+        if args.format == "svg":
+            writer = export_svg(args.output, segments, size)
+            print("%d segments written as %d paths" % (writer.segment_count, writer.path_count))
+
+        elif args.format == "png":
+            image_size = export_png(args.output, segments, size, args.scale, tile_size = args.tile_size or 512, 
+                workers = args.workers, mode = args.raster_mode)
+            print("%dx%d image written" % image_size)
+
+        elif args.format == "dzi":
+            rendered = export_dzi(args.output, segments, size, args.scale, tile_size = args.tile_size or 254, 
+                workers = args.workers, mode = args.raster_mode)
+            print("%d tiles rendered" % rendered)
+
+        elif args.format in ("npz", "arrow"):
+            columns = geometry.trace_to_columns(segments)
+            if args.format == "npz":
+                columns.save_npz(args.output)
+            else:
+                columns.save_arrow(args.output, lsysobj)
+            print("%d segments written" % len(columns))
+
+    if deduplicator != None:
+        print("%d of %d segments were duplicates (%.1f%%)" % (deduplicator.duplicate_count, 
+            deduplicator.segment_count, deduplicator.get_duplicate_ratio() * 100))
+
+if __name__ == "__main__":
+    main()
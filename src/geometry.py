@@ -0,0 +1,108 @@
+'''
+Holds the columnar storage of traced l-system geometry, for handing
+segments over as data instead of pixels.
+'''
+
+import array
+import json
+import headless
+import lsysfilehandler as fh
+
+class SegmentColumns:
+    '''
+    Stores segments column by column in typed arrays, one value per segment:
+    x0, y0, x1, y1, color_num, width, depth (state stack depth) and
+    symbol_index (index of the symbol in the lsystem string that drew it).
+
+    The columns are stdlib arrays, so they're filled without NumPy, and
+    to_numpy() returns NumPy views of their buffers without copying.
+    '''
+
+    FIELDS = [
+        ("x0", "d"),
+        ("y0", "d"),
+        ("x1", "d"),
+        ("y1", "d"),
+        ("color_num", "d"),
+        ("width", "d"),
+        ("depth", "q"),
+        ("symbol_index", "q")
+    ]
+
+    def __init__(self):
+        self.columns = {name : array.array(typecode) for name, typecode in self.FIELDS}
+
+    def __len__(self):
+        return len(self.columns["x0"])
+
+    def extend(self, segments):
+        '''
+        Appends the given Segments (e.g. from trace_lsystem) to the columns.
+        '''
+        x0 = self.columns["x0"].append
+        y0 = self.columns["y0"].append
+        x1 = self.columns["x1"].append
+        y1 = self.columns["y1"].append
+        color_num = self.columns["color_num"].append
+        width = self.columns["width"].append
+        depth = self.columns["depth"].append
+        symbol_index = self.columns["symbol_index"].append
+
+        for segment in segments:
+            x0(segment.x0)
+            y0(segment.y0)
+            x1(segment.x1)
+            y1(segment.y1)
+            color_num(segment.color_num)
+            width(segment.thickness)
+            depth(segment.depth)
+            symbol_index(segment.index)
+
+        return self
+
+    def to_numpy(self):
+        '''
+        Returns a dictionary of NumPy arrays sharing memory with the columns.
+        The columns must not be extended while the arrays are in use.
+        '''
+        import numpy as np
+
+        return {name : np.frombuffer(self.columns[name], dtype = np.dtype(typecode))
+            for name, typecode in self.FIELDS}
+
+    def save_npz(self, filepath):
+        import numpy as np
+
+        np.savez(filepath, **self.to_numpy())
+
+    def save_arrow(self, filepath, metadata = None):
+        '''
+        Saves the columns as an Arrow IPC file. Needs pyarrow.
+        '''
+        import pyarrow as pa
+
+        table = pa.table({name : pa.array(column) for name, column in self.to_numpy().items()})
+
+        if metadata != None:
+            table = table.replace_schema_metadata({"lsystem" : json.dumps(metadata)})
+
+        with pa.OSFile(filepath, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+def trace_to_columns(segments):
+    '''
+    Returns a SegmentColumns holding the given segments.
+    '''
+    return SegmentColumns().extend(segments)
+
+def get_lsystem_object_columns(lsysobj, size = (headless.CANVAS_WIDTH, headless.CANVAS_HEIGHT), iterations = None):
+    '''
+    Expands the given lsystem object (its own iterations by default) and returns
+    the segments draw_lsystem would draw, on a canvas of the given size, as a SegmentColumns.
+    '''
+    lsystem = fh.create_lsystem(lsysobj)
+    for _ in range(lsysobj["settings"]["iterations"] if iterations == None else iterations):
+        next(lsystem)
+
+    return trace_to_columns(fh.trace_lsystem_object(size, lsysobj, lsystem.current_state))
@@ -0,0 +1,296 @@
+'''
+Golden output harness for l-system engines.
+
+The reference engine (LSystem.__next__ followed by draw_lsystem on a
+RecordingCanvas) is run over every bundled l-system, and hashes of the
+expanded strings and of the quantized segment lists are stored in
+data/golden.json. Any other engine can then be checked against them,
+quirks included, e.g. color_set not refreshing the current color.
+
+An engine is a function taking an lsystem file object and returning a tuple
+(expanded string, segments) where segments is an iterable of
+(x0, y0, x1, y1, width, fill) tuples, in drawing order.
+
+Usage: py golden.py record
+       py golden.py check [--engine module:function]
+
+e.g. py golden.py check --engine golden:power_engine
+
+The *_engine functions below check the other ways the application expands an
+l-system against the reference, with small chunks and blocks so every l-system
+is split up.
+'''
+
+import argparse
+import glob
+import hashlib
+import importlib
+import json
+import os
+import sys
+import tempfile
+import headless
+import lsystem as lsys
+import lsysfilehandler as fh
+
+#Get project root directory
+ROOT_DIR = os.path.split(os.path.dirname(os.path.abspath(__file__)))[0]
+LSYSTEMS_DIR = os.path.join(ROOT_DIR, "data", "lsystems")
+GOLDEN_FILE = os.path.join(ROOT_DIR, "data", "golden.json")
+
+#Amount of segments hashed together, the first divergent block
+#is located from these hashes before the segments are compared
+BLOCK_SIZE = 256
+
+#Chunk & block size of the engines splitting the state up, small enough to split the bundled l-systems
+ENGINE_CHUNK_SIZE = 1 << 6
+
+#Coordinates are rounded to this many decimals, so float noise from
+#a different order of operations doesn't count as a divergence
+PRECISION = 2
+
+def reference_engine(lsysobj):
+    '''
+    Expands and draws the lsystem object the way the application does.
+    '''
+    lsystem = fh.create_lsystem(lsysobj)
+    for _ in range(lsysobj["settings"]["iterations"]):
+        next(lsystem)
+
+    canvas = headless.RecordingCanvas()
+    fh.draw_lsystem_object(canvas, lsysobj, lsystem.current_state)
+
+    return (str(lsystem), canvas.lines)
+
+def power_engine(lsysobj):
+    '''
+    Draws the lazily built PowerLSystem state of the lsystem object, for the
+    l-systems PowerLSystem supports, and falls back to the reference engine otherwise.
+    '''
+    rules = fh.get_rules(lsysobj)
+    if fh.is_parametric(lsysobj) or lsys.is_stochastic(rules) or lsys.is_context_sensitive(rules):
+        return reference_engine(lsysobj)
+
+    state = lsys.PowerLSystem(lsysobj["settings"]["axiom"], rules).get_state(lsysobj["settings"]["iterations"])
+
+    canvas = headless.RecordingCanvas()
+    fh.draw_lsystem_object(canvas, lsysobj, state)
+
+    return (state, canvas.lines)
+
+#ExpansionCache of cache_engine
+_expansion_cache = lsys.ExpansionCache()
+
+def parallel_engine(lsysobj):
+    '''
+    Expands the lsystem object with LSystem.next_parallel on a pool of two workers,
+    parametric l-systems falling back to the reference engine.
+    '''
+    if fh.is_parametric(lsysobj):
+        return reference_engine(lsysobj)
+
+    lsystem = fh.create_lsystem(lsysobj)
+    lsys.expand_parallel(lsystem, lsysobj["settings"]["iterations"], processes = 2, chunk_size = ENGINE_CHUNK_SIZE)
+
+    canvas = headless.RecordingCanvas()
+    fh.draw_lsystem_object(canvas, lsysobj, lsystem.current_state)
+
+    return (str(lsystem), canvas.lines)
+
+def file_engine(lsysobj):
+    '''
+    Expands the lsystem object to files with expand_to_file and draws the
+    MappedLSystemString, l-systems it can't expand falling back to the reference engine.
+    '''
+    rules = fh.get_rules(lsysobj)
+    if fh.is_parametric(lsysobj) or lsys.is_context_sensitive(rules):
+        return reference_engine(lsysobj)
+
+    with tempfile.TemporaryDirectory() as directory:
+        state = lsys.expand_to_file(fh.create_lsystem(lsysobj), lsysobj["settings"]["iterations"], directory,
+            ENGINE_CHUNK_SIZE)
+
+        try:
+            canvas = headless.RecordingCanvas()
+            fh.draw_lsystem_object(canvas, lsysobj, state)
+            return (str(state), canvas.lines)
+        finally:
+            state.close()
+
+def cache_engine(lsysobj):
+    '''
+    Expands the lsystem object through an ExpansionCache shared by every l-system
+    checked, the way the application's is. Its first rule is edited and expanded
+    first, so the expansion comes from a SubtreeCache invalidated by the edit back.
+    '''
+    settings = lsysobj["settings"]
+    rules = fh.get_rules(lsysobj)
+    seed = fh.get_seed(lsysobj)
+    parametric = fh.is_parametric(lsysobj)
+
+    if not parametric and isinstance(rules[0][1], str):
+        edited_rules = [(rules[0][0], rules[0][1] + rules[0][0])] + rules[1:]
+        _expansion_cache.get(settings["axiom"], edited_rules, min(settings["iterations"], 3), seed)
+
+    state = _expansion_cache.get(settings["axiom"], rules, settings["iterations"], seed, parametric)
+
+    canvas = headless.RecordingCanvas()
+    fh.draw_lsystem_object(canvas, lsysobj, state)
+
+    return (state, canvas.lines)
+
+def quantize_segment(segment):
+    '''
+    Returns the segment as a string with its coordinates and width
+    rounded to PRECISION decimals.
+    '''
+    values = []
+    for value in segment[:5]:
+        text = "%.*f" % (PRECISION, value)
+
+        #Don't let -0.00 and 0.00 hash differently
+        if float(text) == 0:
+            text = "%.*f" % (PRECISION, 0)
+
+        values.append(text)
+
+    values.append(str(segment[5]).lower())
+    return ",".join(values)
+
+def create_digest(lsystem, segments):
+    '''
+    Returns the golden entry for the given expanded string and segments.
+    '''
+    segments_hash = hashlib.sha256()
+    block_hash = hashlib.sha256()
+    block_hashes = []
+    segment_count = 0
+
+    for segment in segments:
+        quantized = (quantize_segment(segment) + "\n").encode("utf-8")
+        segments_hash.update(quantized)
+        block_hash.update(quantized)
+        segment_count += 1
+
+        if segment_count % BLOCK_SIZE == 0:
+            block_hashes.append(block_hash.hexdigest()[:16])
+            block_hash = hashlib.sha256()
+
+    if segment_count % BLOCK_SIZE != 0:
+        block_hashes.append(block_hash.hexdigest()[:16])
+
+    return {
+        "string_length" : len(lsystem),
+        "string_sha256" : hashlib.sha256(str(lsystem).encode("utf-8")).hexdigest(),
+        "segment_count" : segment_count,
+        "segments_sha256" : segments_hash.hexdigest(),
+        "block_hashes" : block_hashes
+    }
+
+def get_lsystem_files():
+    return sorted(glob.glob(os.path.join(LSYSTEMS_DIR, "*.json")))
+
+def get_name(filepath):
+    return os.path.splitext(os.path.basename(filepath))[0]
+
+def record(golden_file = GOLDEN_FILE):
+    '''
+    Runs the reference engine over every bundled l-system and saves the digests.
+    '''
+    golden = {}
+    for filepath in get_lsystem_files():
+        golden[get_name(filepath)] = create_digest(*reference_engine(fh.load_lsystem(filepath)))
+
+    with open(golden_file, "w") as fp:
+        json.dump(golden, fp, indent = 4, sort_keys = True)
+
+def find_first_divergence(expected, actual, lsysobj, segments):
+    '''
+    Returns a message describing the first segment where the engine's segments
+    diverge from the golden ones, located through the block hashes and then
+    pinpointed by replaying the reference engine.
+    '''
+    segments = list(segments)
+    actual_blocks = actual["block_hashes"]
+
+    block = 0
+    while (block < len(expected["block_hashes"]) and block < len(actual_blocks) and
+        expected["block_hashes"][block] == actual_blocks[block]):
+        block += 1
+
+    reference_segments = reference_engine(lsysobj)[1]
+
+    #The reference itself no longer matches golden, so only the block is known
+    if create_digest("", reference_segments)["block_hashes"] != expected["block_hashes"]:
+        return "segments diverge in block %d (segments %d-%d), reference engine no longer matches golden" % (
+            block, block * BLOCK_SIZE, (block + 1) * BLOCK_SIZE - 1)
+
+    for index in range(block * BLOCK_SIZE, max(len(segments), len(reference_segments))):
+        expected_segment = quantize_segment(reference_segments[index]) if index < len(reference_segments) else None
+        actual_segment = quantize_segment(segments[index]) if index < len(segments) else None
+
+        if expected_segment != actual_segment:
+            return "first divergent segment %d: expected %s, got %s" % (index, expected_segment, actual_segment)
+
+    return "segments diverge"
+
+def check(engine, golden_file = GOLDEN_FILE):
+    '''
+    Runs the engine over every bundled l-system and compares it with the
+    golden digests. Returns a list of (name, message) tuples for every mismatch.
+    '''
+    with open(golden_file, "r") as fp:
+        golden = json.load(fp)
+
+    failures = []
+    for filepath in get_lsystem_files():
+        name = get_name(filepath)
+        lsysobj = fh.load_lsystem(filepath)
+
+        if name not in golden:
+            failures.append((name, "no golden entry, run record first"))
+            continue
+
+        lsystem, segments = engine(lsysobj)
+        segments = list(segments)
+        expected = golden[name]
+        actual = create_digest(lsystem, segments)
+
+        if actual["string_sha256"] != expected["string_sha256"]:
+            failures.append((name, "expanded string differs (length %d, expected %d)" % (
+                actual["string_length"], expected["string_length"])))
+
+        elif actual["segments_sha256"] != expected["segments_sha256"]:
+            failures.append((name, find_first_divergence(expected, actual, lsysobj, segments)))
+
+    return failures
+
+def load_engine(engine_path):
+    '''
+    Imports an engine given as "module:function".
+    '''
+    module_name, function_name = engine_path.split(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Golden output harness for l-system engines")
+    parser.add_argument("command", choices = ["record", "check"])
+    parser.add_argument("--engine", default = None, help = "engine to check, as module:function")
+    parser.add_argument("--golden", default = GOLDEN_FILE, help = "golden digests file")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        record(args.golden)
+        return 0
+
+    engine = load_engine(args.engine) if args.engine != None else reference_engine
+    failures = check(engine, args.golden)
+
+    for name, message in failures:
+        print("%s: %s" % (name, message))
+
+    print("%d of %d l-systems match golden" % (len(get_lsystem_files()) - len(failures), len(get_lsystem_files())))
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+'''
+Holds canvas stand-ins, making it possible to run draw_lsystem
+without a display.
+'''
+
+#Size of the DrawingCanvas' world coordinates, the application scales drawings from it to fit the window
+CANVAS_WIDTH = 805
+CANVAS_HEIGHT = 770
+
+class NullCanvas:
+    '''
+    A canvas stand-in that only counts the lines drawn on it.
+
+    Implements the subset of the tkinter Canvas interface used by draw_lsystem.
+    '''
+
+    def __init__(self, width = CANVAS_WIDTH, height = CANVAS_HEIGHT):
+        self.width = width
+        self.height = height
+        self.line_count = 0
+
+    def winfo_width(self):
+        return self.width
+
+    def winfo_height(self):
+        return self.height
+
+    def create_line(self, *args, **kw):
+        self.line_count += 1
+        return self.line_count
+
+class RecordingCanvas(NullCanvas):
+    '''
+    A canvas stand-in that records every line drawn on it
+    as a tuple (x0, y0, x1, y1, width, fill).
+    '''
+
+    def __init__(self, width = CANVAS_WIDTH, height = CANVAS_HEIGHT):
+        super().__init__(width, height)
+        self.lines = []
+
+    def create_line(self, x0, y0, x1, y1, width = 1, fill = "black", **kw):
+        self.lines.append((x0, y0, x1, y1, width, fill))
+        return super().create_line()
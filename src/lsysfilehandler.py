@@ -1,4 +1,6 @@
 import json
+import lsystem as lsys
+import utilities as util
 
 def load_lsystem(filepath):
     '''
@@ -16,4 +18,128 @@ def save_lsystem(lsysobj, filepath):
 
     with open(filepath, "w") as fp:
         #Setting the indent keyword pretty prints the json to the file
-        json.dump(lsysobj, fp, indent = 4, sort_keys = False)
\ No newline at end of file
+        json.dump(lsysobj, fp, indent = 4, sort_keys = False)
+
+def get_symbols(lsysobj):
+    '''
+    Returns the symbols dictionary of the given lsystem object, 
+    ready to be passed to draw_lsystem.
+    '''
+
+    if lsysobj["symbols"] == "defaults":
+        return util.symbols_list_to_dict(util.default_symbols)
+
+    return util.symbols_list_to_dict(lsysobj["symbols"])
+
+def get_rules(lsysobj):
+    '''
+    Converts the json rules dictionary list (rules : [ {x1 : y1}, {x2 : y2} ]) 
+    of the given lsystem object to a rules list of tuples.
+
+    A stochastic rule lists its weighted successors,
+    {x1 : [ {"successor" : y1, "weight" : w1}, {"successor" : y2, "weight" : w2} ]},
+    and is converted to (x1, [(y1, w1), (y2, w2)]).
+
+    A context sensitive rule, {x1 : {"successor" : y1, "left" : l1, "right" : r1}},
+    is converted to (x1, ContextSuccessor(y1, l1, r1)). Its successor can be
+    stochastic too, and keys longer than one symbol are multi symbol predecessors.
+    '''
+
+    rules = []
+    for rule_dic in lsysobj["rules"]:
+        for key, val in rule_dic.items():
+            if isinstance(val, dict):
+                val = lsys.ContextSuccessor(get_successor(val["successor"]), val.get("left", ""), val.get("right", ""))
+            else:
+                val = get_successor(val)
+            rules.append((key, val))
+    
+    return rules
+
+def get_successor(val):
+    '''
+    Converts a json successor, a string or a list of weighted successors, to its rules list form.
+    '''
+    if isinstance(val, list):
+        return [(option["successor"], option.get("weight", 1)) for option in val]
+    return val
+
+def get_rules_json(rules):
+    '''
+    Converts a rules list of tuples back to the json rules dictionary list.
+    '''
+    def get_successor_json(successor):
+        if isinstance(successor, str):
+            return successor
+        return [{"successor" : option[0], "weight" : option[1]} for option in successor]
+
+    rules_list = []
+    for var, rule in rules:
+        if isinstance(rule, lsys.ContextSuccessor):
+            rules_list.append({var : {
+                "successor" : get_successor_json(rule.successor), 
+                "left" : rule.left, 
+                "right" : rule.right}})
+        else:
+            rules_list.append({var : get_successor_json(rule)})
+
+    return rules_list
+
+def get_seed(lsysobj):
+    '''
+    Returns the seed of the stochastic rules, 0 if the file has none.
+    '''
+    return lsysobj["settings"].get("seed", 0)
+
+def is_parametric(lsysobj):
+    '''
+    Returns whether the symbols of the given lsystem object take arguments, e.g. F(10).
+    '''
+    return lsysobj["settings"].get("parametric", False)
+
+def create_lsystem(lsysobj):
+    '''
+    Creates an LSystem object from the axiom, rules and seed of the given lsystem object,
+    or a parametric.ParametricLSystem if it's parametric (needs NumPy).
+    '''
+
+    if is_parametric(lsysobj):
+        import parametric
+
+        return parametric.ParametricLSystem(lsysobj["settings"]["axiom"], get_rules(lsysobj), get_seed(lsysobj))
+
+    return lsys.LSystem(lsysobj["settings"]["axiom"], get_rules(lsysobj), get_seed(lsysobj))
+
+def get_draw_arguments(lsysobj):
+    '''
+    Returns the symbols and settings of the given lsystem object as the 
+    arguments draw_lsystem & trace_lsystem take after the lsystem string.
+    '''
+
+    settings = lsysobj["settings"]
+
+    return (
+        get_symbols(lsysobj),
+        (settings["position"]["x"], settings["position"]["y"]),
+        settings["angle"],
+        settings["turn_angle"],
+        settings["step_length"],
+        settings["thickness"],
+        settings["color_palette"],
+        settings["start_color"])
+
+def draw_lsystem_object(canvas, lsysobj, lsystem):
+    '''
+    Draws the given, already iterated, lsystem string to the canvas with the
+    symbols and settings of the given lsystem object.
+    '''
+
+    lsys.draw_lsystem(canvas, lsystem, *get_draw_arguments(lsysobj))
+
+def trace_lsystem_object(size, lsysobj, lsystem):
+    '''
+    Yields the segments of the given, already iterated, lsystem string for a 
+    canvas of the given size, with the symbols and settings of the given lsystem object.
+    '''
+
+    return lsys.trace_lsystem(size, lsystem, *get_draw_arguments(lsysobj))
@@ -3,25 +3,82 @@ Holds everything related to L-Systems
 '''
 
 import utilities as util
+import array
+import bisect
+import collections
+import itertools
 import math
-from tkinter import Canvas
+import mmap
+import os
+import re
+import typing
+
+#Only needed for annotations, so the core doesn't import tkinter
+if typing.TYPE_CHECKING:
+    from tkinter import Canvas
+
+#A line drawn by the turtle, in canvas coordinates. Besides the line itself it
+#holds the color number, the state stack depth and the index of the symbol
+#in the lsystem string that drew it
+Segment = collections.namedtuple("Segment", 
+    ["x0", "y0", "x1", "y1", "thickness", "color", "color_num", "depth", "index"])
+
+#The turtle between two symbols, in canvas coordinates. stack holds the saved states
+#as tuples (x, y, angle, color_num, step_length, directions_flipped), the latest last
+TurtleState = collections.namedtuple("TurtleState", 
+    ["x", "y", "angle", "color_num", "color", "thickness", "step_length", "directions_flipped", "stack"])
+
+#Amount of chars read, rewritten and written at a time when expanding to file
+STREAM_BLOCK_SIZE = 1 << 20
+
+#Chars before the last index read a LazyLSystemString keeps, indexing further back builds it again
+LAZY_LOOKBEHIND = 1 << 10
+
+#Generations shorter than this are rewritten serially, since starting
+#the worker processes would cost more than the rewrite itself.
+#multiprocessing is imported by the functions using it, it's slow to import
+PARALLEL_CHUNK_SIZE = 1 << 18
 
 class LSystem:
     '''
     This class represents the L-system.
 
     Takes an axiom of type string and rules list of tuples list<tuple<string, string>>. 
+    A stochastic rule has a list of (successor, weight) tuples in place of the successor,
+    one of them is picked for every symbol rewritten, see RuleRewriter. The seed
+    picks which. A context sensitive rule has a ContextSuccessor, or a predecessor
+    of more than one symbol, see ContextRewriter.
 
     Passing an LSystem object to the next() function, iterates on the current state/mutation of
     the l-system and returns the next iteration.
     '''
 
-    def __init__(self, axiom, rules):
+    def __init__(self, axiom, rules, seed = 0):
         self.axiom = axiom
         self.rules = rules
+        self.seed = seed
         self.current_state = axiom
+
+        #Amount of rewrites done, stochastic choices depend on it
+        self.generation = 0
+
+        #Rewriter built for the rules & seed of _rewriter_key, see get_rewriter
+        self._rewriter = None
+        self._rewriter_key = None
     
     def __next__(self):
+        if is_context_sensitive(self.rules):
+            next_state = self.get_rewriter().rewrite(self.current_state, self.generation)
+            self.current_state = next_state
+            self.generation += 1
+            return next_state
+
+        if is_stochastic(self.rules):
+            next_state = self.get_rewriter().rewrite(self.current_state, self.generation)
+            self.current_state = next_state
+            self.generation += 1
+            return next_state
+
         next_state = ""
 
         for char in self.current_state:
@@ -33,11 +90,1123 @@ class LSystem:
             if not found:
                 next_state += char
         self.current_state = next_state
+        self.generation += 1
+        return next_state
+
+    def get_rewriter(self):
+        '''
+        Returns the RuleRewriter, or the ContextRewriter for context sensitive rules, of
+        the l-system's rules & seed. It's built once (with its automaton) and kept until
+        the rules (edited in place or replaced) or the seed change.
+        '''
+        key = (get_rules_key(self.rules), self.seed)
+        if key != self._rewriter_key:
+            rewriter_class = ContextRewriter if is_context_sensitive(self.rules) else RuleRewriter
+            self._rewriter = rewriter_class(self.rules, self.seed)
+            self._rewriter_key = key
+        return self._rewriter
+
+    def next_parallel(self, pool, chunk_size = PARALLEL_CHUNK_SIZE):
+        '''
+        Same as next(), but splits the current state into chunks that are
+        rewritten by the processes of the given multiprocessing pool.
+
+        The workers read the current state from, and write the next one to,
+        shared memory buffers at offsets found from a prefix sum of the chunks
+        rewritten lengths, so no strings are pickled between processes.
+        Falls back to next() for short or non-ascii states.
+
+        Stochastic choices only depend on the position of the symbol in the
+        state, so every chunk is rewritten the same way next() would. Context
+        sensitive rules are always rewritten by next(), their matches can span chunks.
+        '''
+        from multiprocessing import shared_memory
+
+        if is_context_sensitive(self.rules):
+            return next(self)
+
+        rewriter = self.get_rewriter()
+
+        if len(self.current_state) < chunk_size or not self.current_state.isascii() or not rewriter.isascii():
+            return next(self)
+
+        source = self.current_state.encode("ascii")
+        chunks = [(start, min(start + chunk_size, len(source)))
+            for start in range(0, len(source), chunk_size)]
+
+        source_shm = shared_memory.SharedMemory(create = True, size = len(source))
+        target_shm = None
+
+        try:
+            source_shm.buf[:len(source)] = source
+
+            #First pass finds the rewritten length of every chunk
+            lengths = pool.map(_measure_chunk,
+                [(source_shm.name, start, end, rewriter, self.generation) for start, end in chunks])
+
+            #Prefix sum of the lengths gives each chunk its offset in the next state
+            offsets = [0]
+            for length in lengths:
+                offsets.append(offsets[-1] + length)
+
+            total_length = offsets[-1]
+            target_shm = shared_memory.SharedMemory(create = True, size = max(total_length, 1))
+
+            #Second pass rewrites every chunk straight into the target buffer
+            pool.map(_rewrite_chunk,
+                [(source_shm.name, target_shm.name, start, end, offset, rewriter, self.generation) 
+                    for (start, end), offset in zip(chunks, offsets)])
+
+            next_state = bytes(target_shm.buf[:total_length]).decode("ascii")
+
+        finally:
+            source_shm.close()
+            source_shm.unlink()
+            if target_shm != None:
+                target_shm.close()
+                target_shm.unlink()
+
+        self.current_state = next_state
+        self.generation += 1
         return next_state
 
     def __str__(self):
         return self.current_state
 
+class ExpansionCache:
+    '''
+    Keeps every generation of the most recently expanded l-systems, keyed by
+    axiom and rules. Asking for an l-system that's already cached, e.g. after
+    changing a setting that doesn't affect the expansion like the angle or step
+    length, costs nothing, and asking for more iterations continues from the
+    last generation cached.
+
+    New l-systems are expanded through a SubtreeCache, so after editing a rule
+    only the symbol expansions depending on it are expanded again. Parametric
+    l-systems are expanded with parametric.ParametricLSystem.
+    '''
+
+    def __init__(self, max_lsystems = 8):
+        self.max_lsystems = max_lsystems
+        self.subtrees = SubtreeCache()
+        self._generations = collections.OrderedDict()
+
+    def get(self, axiom, rules, iterations, seed = 0, parametric = False):
+        '''
+        Returns the state of the l-system after the given amount of iterations.
+        '''
+        return self.get_generations(axiom, rules, iterations, seed, parametric)[iterations]
+
+    def get_generations(self, axiom, rules, iterations, seed = 0, parametric = False):
+        '''
+        Returns a list of the states of the l-system, from the axiom 
+        up to the given amount of iterations.
+        '''
+        key = (axiom, get_rules_key(rules), seed, parametric)
+        generations = self._generations.pop(key, None) or [axiom]
+
+        #Most recently used last, dropping the least recently used
+        self._generations[key] = generations
+        while len(self._generations) > self.max_lsystems:
+            self._generations.popitem(last = False)
+
+        if parametric and (len(generations) <= iterations or isinstance(generations[0], str)):
+            import parametric as par
+
+            lsystem = par.ParametricLSystem(axiom, rules, seed)
+            generations[0] = lsystem.current_state
+            lsystem.current_state = generations[-1]
+            lsystem.generation = len(generations) - 1
+            while len(generations) <= iterations:
+                generations.append(next(lsystem))
+
+        #A stochastic or context sensitive symbol's expansion depends on its position 
+        #or neighbours, so there are no subtrees to share
+        if len(generations) <= iterations and (is_stochastic(rules) or is_context_sensitive(rules)):
+            lsystem = LSystem(generations[-1], rules, seed)
+            lsystem.generation = len(generations) - 1
+            while len(generations) <= iterations:
+                generations.append(next(lsystem))
+
+        if len(generations) <= iterations:
+            self.subtrees.set_rules(rules)
+            while len(generations) <= iterations:
+                generations.append(self.subtrees.expand(axiom, len(generations)))
+
+        return generations[:iterations + 1]
+
+    def clear(self):
+        self._generations.clear()
+        self.subtrees.clear()
+
+class SubtreeCache:
+    '''
+    Caches the expansion of every (symbol, depth) pair, the symbol rewritten
+    depth times, built from the expansions of its successor's symbols at depth - 1.
+
+    Rules can be changed with set_rules(). A rule change only invalidates the
+    expansions that rewrite the changed variable: (symbol, depth) depends on
+    a variable if the variable can be reached from the symbol through the rules
+    in less than depth rewrites. Every other expansion is kept.
+
+    Expansions are evicted least recently used first once they add up to max_chars.
+    '''
+
+    def __init__(self, max_chars = 1 << 26):
+        self.max_chars = max_chars
+        self.hit_count = 0
+        self.miss_count = 0
+        self.invalidated_count = 0
+        self._successors = {}
+        self._expansions = collections.OrderedDict()
+        self._chars = 0
+
+    def set_rules(self, rules):
+        '''
+        Changes the rules, dropping the expansions that depend on the changed ones.
+        '''
+        successors = {chr(key) : successor for key, successor in get_successor_table(rules).items()}
+        changed = set(var for var in set(successors) | set(self._successors) 
+            if successors.get(var) != self._successors.get(var))
+
+        if changed:
+            #The cached expansions were built with the old rules
+            distances = self._get_distances_to(changed)
+
+            for symbol, depth in list(self._expansions):
+                if distances.get(symbol, depth) < depth:
+                    self._chars -= len(self._expansions.pop((symbol, depth)))
+                    self.invalidated_count += 1
+
+        self._successors = successors
+
+    def expand(self, axiom, depth):
+        '''
+        Returns the axiom rewritten depth times.
+        '''
+        return "".join(self.get(symbol, depth) for symbol in axiom)
+
+    def get(self, symbol, depth):
+        '''
+        Returns the symbol rewritten depth times.
+        '''
+        successor = self._successors.get(symbol, None)
+        if depth == 0 or successor == None:
+            return symbol
+
+        key = (symbol, depth)
+        expansion = self._expansions.get(key, None)
+
+        if expansion != None:
+            self._expansions.move_to_end(key)
+            self.hit_count += 1
+            return expansion
+
+        self.miss_count += 1
+        expansion = "".join(self.get(successor_symbol, depth - 1) for successor_symbol in successor)
+
+        self._expansions[key] = expansion
+        self._chars += len(expansion)
+        while self._chars > self.max_chars and len(self._expansions) > 1:
+            self._chars -= len(self._expansions.popitem(last = False)[1])
+
+        return expansion
+
+    def clear(self):
+        self._expansions.clear()
+        self._chars = 0
+
+    def _get_distances_to(self, variables):
+        '''
+        Returns the least amount of rewrites from each symbol to one of the given
+        variables under the current rules, by breadth first search from the variables.
+        '''
+        #Which symbols have each symbol in their successor
+        parents = collections.defaultdict(set)
+        for var, successor in self._successors.items():
+            for symbol in successor:
+                parents[symbol].add(var)
+
+        distances = {var : 0 for var in variables}
+        queue = collections.deque(variables)
+
+        while queue:
+            symbol = queue.popleft()
+            for parent in parents[symbol]:
+                if parent not in distances:
+                    distances[parent] = distances[symbol] + 1
+                    queue.append(parent)
+
+        return distances
+
+class PowerLSystem:
+    '''
+    Jumps an l-system straight to generation n, by exponentiation by squaring.
+
+    For every level k it keeps, per symbol, the symbol counts after 2^k rewrites
+    (the count matrix of level k-1 squared), so the length and symbol counts of
+    generation n are found from the axiom with one matrix product per set bit of n,
+    without rewriting anything.
+
+    While they're shorter than max_jump_length, the successors after 2^k rewrites
+    are also kept as str.translate() tables, each built by translating the previous
+    level with itself. Generation n is then produced lazily by applying the largest
+    jump that fits the remaining rewrites, block by block, so only the requested
+    part (e.g. a prefix) of it is ever built.
+
+    Stochastic and context sensitive rules raise a ValueError, a symbol's expansion
+    depends on its position or neighbours.
+    '''
+
+    def __init__(self, axiom, rules, max_jump_length = 1 << 12):
+        self.axiom = axiom
+        self.rules = rules
+        self.max_jump_length = max_jump_length
+
+        table = get_successor_table(rules)
+        self._alphabet = sorted(set(axiom) | set(chr(key) for key in table) | 
+            set("".join(table.values())))
+
+        #Level 0 is a single rewrite
+        self._count_levels = [{char : collections.Counter(table.get(ord(char), char)) 
+            for char in self._alphabet}]
+        self._tables = [table]
+        self._max_lengths = [max([len(successor) for successor in table.values()] + [1])]
+
+    def get_state(self, iterations):
+        '''
+        Returns the state of the l-system after the given amount of iterations as
+        a LazyLSystemString, nothing of it is built until it's read.
+        '''
+        return LazyLSystemString(self, iterations)
+
+    def get_counts(self, iterations, axiom = None):
+        '''
+        Returns a Counter of the symbols in the state after the given amount of iterations,
+        starting from the given axiom instead of the l-system's own, e.g. a single symbol.
+        '''
+        self._add_levels(iterations.bit_length())
+
+        counts = collections.Counter(self.axiom if axiom == None else axiom)
+        for level in range(iterations.bit_length()):
+            if iterations >> level & 1:
+                counts = self._apply_counts(counts, self._count_levels[level])
+
+        return counts
+
+    def get_length(self, iterations, axiom = None):
+        return sum(self.get_counts(iterations, axiom).values())
+
+    def iter_blocks(self, iterations, block_size = STREAM_BLOCK_SIZE):
+        '''
+        Yields the state after the given amount of iterations in blocks of
+        about block_size chars or less, building it as it's read.
+        '''
+        self._add_levels(iterations.bit_length())
+
+        #Depth first, a stack of (string, rewrites left, next slice start)
+        stack = [(self.axiom, iterations, 0)]
+        while stack:
+            string, remaining, start = stack.pop()
+
+            if remaining == 0:
+                if string:
+                    yield string
+                continue
+
+            if start >= len(string):
+                continue
+
+            #Apply the largest jump that fits, to slices short enough to stay near block_size
+            level = min(remaining.bit_length() - 1, len(self._tables) - 1)
+            step = max(1, block_size // self._max_lengths[level])
+
+            stack.append((string, remaining, start + step))
+            stack.append((string[start:start + step].translate(self._tables[level]), remaining - (1 << level), 0))
+
+    def _add_levels(self, level_count):
+        while len(self._count_levels) < level_count:
+            counts = self._count_levels[-1]
+            self._count_levels.append({char : self._apply_counts(counts[char], counts) for char in self._alphabet})
+
+            #Stop keeping jump tables once their successors get long
+            if len(self._tables) == len(self._count_levels) - 1 and self._max_lengths[-1] ** 2 <= self.max_jump_length:
+                table = self._tables[-1]
+                jump_table = {key : successor.translate(table) for key, successor in table.items()}
+                self._tables.append(jump_table)
+                self._max_lengths.append(max([len(successor) for successor in jump_table.values()] + [1]))
+
+    def _apply_counts(self, counts, level):
+        result = collections.Counter()
+        for char, count in counts.items():
+            for successor_char, successor_count in level[char].items():
+                result[successor_char] += count * successor_count
+        return result
+
+def get_length_bound(axiom, rules, iterations):
+    '''
+    Returns the length of the axiom rewritten iterations times, without rewriting it.
+    For stochastic and context sensitive rules, whose expansion depends on the choices
+    and contexts, returns an upper bound of it instead.
+    '''
+    if not is_stochastic(rules) and not is_context_sensitive(rules):
+        return PowerLSystem(axiom, rules).get_length(iterations)
+
+    #Duplicate rules are joined, the same way the rewriters do it
+    successors = collections.OrderedDict()
+    for var, rule in rules:
+        key = (var, rule.left, rule.right) if isinstance(rule, ContextSuccessor) else (var, "", "")
+        successor = get_successor(rule)
+
+        if key in successors and isinstance(successor, str) and len(successors[key]) == 1:
+            successors[key] = [successors[key][0] + successor]
+        else:
+            successors.setdefault(key, []).extend([successor] if isinstance(successor, str) else 
+                [option[0] for option in successor])
+
+    #A symbol writes at most as many of each symbol as the largest of its possible outputs:
+    #any successor of a predecessor starting with it, itself if it can be copied, or nothing
+    options = collections.OrderedDict()
+    for (var, left, right), var_successors in successors.items():
+        options.setdefault(var[0], []).extend(var_successors)
+        if len(var) > 1 or left or right:
+            options[var[0]].append(var[0])
+
+    bound_rules = []
+    for char, char_options in options.items():
+        counts = collections.Counter()
+        for option in char_options:
+            counts |= collections.Counter(option)
+        bound_rules.append((char, "".join(symbol * count for symbol, count in counts.items())))
+
+    return PowerLSystem(axiom, bound_rules).get_length(iterations)
+
+class LazyLSystemString:
+    '''
+    A read only view of a PowerLSystem state that's only built when it's read.
+    Its length and symbol counts are found without building it at all.
+
+    Supports len(), indexing and iteration like MappedLSystemString, so it can be
+    passed to draw_lsystem in place of a string. Indexing keeps the blocks around
+    the last index read, reading forward builds the next ones, and going back
+    further than LAZY_LOOKBEHIND chars builds the state again from the start.
+    '''
+
+    def __init__(self, power_lsystem, iterations):
+        self.power_lsystem = power_lsystem
+        self.iterations = iterations
+        self._length = None
+        self._blocks = None
+        self._buffer = ""
+        self._buffer_start = 0
+
+    def __len__(self):
+        if self._length == None:
+            self._length = self.power_lsystem.get_length(self.iterations)
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if start == 0 and step == 1:
+                return self.get_prefix(stop)
+            if step != 1 or start >= stop:
+                return "".join(self[position] for position in range(start, stop, step))
+            return self._read(start, stop)
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("LazyLSystemString index out of range")
+
+        return self._read(index, index + 1)
+
+    def __iter__(self):
+        for block in self.iter_blocks():
+            yield from block
+
+    def __str__(self):
+        return "".join(self.iter_blocks())
+
+    def get_counts(self):
+        return self.power_lsystem.get_counts(self.iterations)
+
+    def get_prefix(self, length):
+        '''
+        Returns the first length chars of the state, building only as much of it as needed.
+        '''
+        blocks = []
+        remaining = length
+
+        for block in self.iter_blocks(min(length, STREAM_BLOCK_SIZE) or 1):
+            if remaining <= 0:
+                break
+            blocks.append(block[:remaining])
+            remaining -= len(block)
+
+        return "".join(blocks)
+
+    def iter_blocks(self, block_size = STREAM_BLOCK_SIZE):
+        return self.power_lsystem.iter_blocks(self.iterations, block_size)
+
+    def _read(self, start, stop):
+        if start < self._buffer_start or self._blocks == None:
+            self._blocks = self.iter_blocks()
+            self._buffer = ""
+            self._buffer_start = 0
+
+        while self._buffer_start + len(self._buffer) < stop:
+            #Drop what's too far behind, a number read after a symbol may end in the next block
+            keep = max(0, start - LAZY_LOOKBEHIND - self._buffer_start)
+            self._buffer = self._buffer[keep:] + next(self._blocks)
+            self._buffer_start += keep
+
+        return self._buffer[start - self._buffer_start:stop - self._buffer_start]
+
+#The successor field of a context sensitive rule (predecessor, ContextSuccessor(...)),
+#the successor only replaces the predecessor where it's preceded by left and followed by right
+ContextSuccessor = collections.namedtuple("ContextSuccessor", ["successor", "left", "right"])
+
+#The rule application that produced a symbol: the symbol at parent_index of the
+#previous generation was replaced by successor, offset being the symbol's position in it
+SymbolOrigin = collections.namedtuple("SymbolOrigin", 
+    ["generation", "parent_index", "var", "successor", "offset"])
+
+def get_symbol_origin(generations, rules, index, seed = 0):
+    '''
+    Takes in the generations of an l-system (e.g. from ExpansionCache.get_generations)
+    and returns the SymbolOrigin of the symbol at index of the last generation, or None
+    if it's copied unchanged from the axiom.
+
+    Symbols without rules are copied from generation to generation, so the symbol's
+    ancestors are followed back until one of them was written by a rule.
+
+    For parametric generations the origin's var and successor are the rule's
+    predecessor and successor text, and offset counts modules instead of chars.
+    To look up many symbols, make a SymbolOriginIndex once instead.
+    '''
+    return SymbolOriginIndex(generations, rules, seed).get_origin(index)
+
+class SymbolOriginIndex:
+    '''
+    Finds the SymbolOrigin of symbols of the last of the given generations, see get_symbol_origin.
+
+    The end offset of every symbol's successor (every rewritten part's output for context
+    sensitive rules) is found for every generation when the index is made, so a lookup
+    only bisects them, one generation at a time.
+    '''
+
+    def __init__(self, generations, rules, seed = 0):
+        self.generations = generations
+        self.parametric = getattr(generations[-1], "parents", None) is not None
+        self.rewriter = None
+        self.parts = []
+        self.ends = [None]
+
+        if self.parametric:
+            return
+
+        if is_context_sensitive(rules):
+            self.rewriter = ContextRewriter(rules, seed)
+            self.parts = [None]
+
+            for generation in range(1, len(generations)):
+                parts = self.rewriter.get_parts(generations[generation - 1], generation - 1)
+                self.parts.append(parts)
+                self.ends.append(array.array("q", itertools.accumulate(len(part[2]) for part in parts)))
+
+            return
+
+        self.rewriter = RuleRewriter(rules, seed)
+        lengths_table = {chr(key) : len(successor) for key, successor in self.rewriter.table.items()}
+
+        for generation in range(1, len(generations)):
+            previous = generations[generation - 1]
+
+            if self.rewriter.choices:
+                lengths = (len(self.rewriter.rewrite(char, generation - 1, position)) 
+                    for position, char in enumerate(previous))
+            else:
+                lengths = map(lengths_table.get, previous, itertools.repeat(1))
+
+            self.ends.append(array.array("q", itertools.accumulate(lengths)))
+
+    def get_origin(self, index):
+        '''
+        Returns the SymbolOrigin of the symbol at index of the last generation,
+        or None if it's copied unchanged from the axiom.
+        '''
+        if self.parametric:
+            return _get_parametric_symbol_origin(self.generations, index)
+
+        if isinstance(self.rewriter, ContextRewriter):
+            return self._get_context_origin(index)
+
+        rewriter = self.rewriter
+
+        for generation in range(len(self.generations) - 1, 0, -1):
+            ends = self.ends[generation]
+            parent_index = bisect.bisect_right(ends, index)
+            offset = index - (ends[parent_index - 1] if parent_index > 0 else 0)
+            var = self.generations[generation - 1][parent_index]
+
+            if var in rewriter.choices:
+                return SymbolOrigin(generation, parent_index, var, 
+                    rewriter.choose(var, generation - 1, parent_index), offset)
+
+            if ord(var) in rewriter.table:
+                return SymbolOrigin(generation, parent_index, var, rewriter.table[ord(var)], offset)
+
+            index = parent_index
+
+        return None
+
+    def _get_context_origin(self, index):
+        for generation in range(len(self.generations) - 1, 0, -1):
+            ends = self.ends[generation]
+            part_index = bisect.bisect_right(ends, index)
+            start, length, output, rule_index = self.parts[generation][part_index]
+            offset = index - (ends[part_index - 1] if part_index > 0 else 0)
+
+            if rule_index != None:
+                return SymbolOrigin(generation, start, self.rewriter.rules[rule_index][1], output, offset)
+
+            #Copied unchanged
+            index = start + offset
+
+        return None
+
+def _get_parametric_symbol_origin(generations, index):
+    for generation in range(len(generations) - 1, 0, -1):
+        state = generations[generation]
+        parent_index = int(state.parents[index])
+        rule_index = int(state.rule_indices[index])
+
+        if rule_index != -1:
+            #A module's successor modules are next to each other, the first one has the offset 0
+            first = bisect.bisect_left(state.parents, parent_index, 0, index)
+            predecessor, successor = state.rules[rule_index]
+            return SymbolOrigin(generation, parent_index, predecessor, successor, index - first)
+
+        index = parent_index
+
+    return None
+
+def get_branch_end(lsystem, index, save_symbol = "[", load_symbol = "]"):
+    '''
+    Returns the index of the load symbol closing the branch the symbol at index
+    is in, or the length of the lsystem if it's in the trunk. The symbols from
+    index up to there are the symbol's subtree.
+    '''
+    depth = 0
+    position = index
+
+    while True:
+        next_load = lsystem.find(load_symbol, position)
+        if next_load == -1:
+            return len(lsystem)
+
+        next_save = lsystem.find(save_symbol, position, next_load)
+        if next_save != -1:
+            depth += 1
+            position = next_save + 1
+        elif depth == 0:
+            return next_load
+        else:
+            depth -= 1
+            position = next_load + 1
+
+def get_max_stack_depth(lsystem, symbols, start_depth = 0):
+    '''
+    Returns the deepest the state stack gets while drawing the lsystem, with the given
+    symbols, starting with start_depth states saved. Raises a ValueError telling the
+    index of the first unmatched load symbol.
+
+    States with iter_blocks() (e.g. a MappedLSystemString) are read a block at a time.
+    '''
+    save_chars = [char for char, op in symbols.items() if op[0] == "state_save"]
+    load_chars = [char for char, op in symbols.items() if op[0] == "state_load"]
+
+    if not load_chars and not save_chars:
+        return start_depth
+
+    if hasattr(lsystem, "iter_blocks"):
+        blocks = lsystem.iter_blocks()
+    elif hasattr(lsystem, "get_symbols"):
+        blocks = [lsystem.get_symbols()]
+    else:
+        blocks = [lsystem]
+
+    #Only walk through the save & load chars
+    pattern = re.compile("[" + re.escape("".join(save_chars + load_chars)) + "]")
+
+    depth = start_depth
+    max_depth = start_depth
+    offset = 0
+    for block in blocks:
+        for match in pattern.finditer(block):
+            if match.group() in save_chars:
+                depth += 1
+                if depth > max_depth:
+                    max_depth = depth
+            else:
+                depth -= 1
+                if depth < 0:
+                    raise ValueError("Unmatched %s at index %d, there's no saved state to load" % (
+                        match.group(), offset + match.start()))
+
+        offset += len(block)
+
+    return max_depth
+
+def get_successor_table(rules):
+    '''
+    Takes in a rules list and returns a str.translate() table mapping
+    each variable to its successor. If a variable has more than one rule,
+    the successors are joined in order, the same way LSystem.__next__ does it.
+
+    Stochastic and context sensitive rules have no single successor per symbol,
+    a ValueError is raised for them.
+    '''
+    if is_stochastic(rules) or is_context_sensitive(rules):
+        raise ValueError("Stochastic and context sensitive rules have no single successor per symbol")
+
+    table = {}
+    for var, rule in rules:
+        table[ord(var)] = table.get(ord(var), "") + rule
+    return table
+
+def is_stochastic(rules):
+    '''
+    Returns whether any of the rules has weighted successors to choose from.
+    '''
+    return any(not isinstance(get_successor(rule), str) for _, rule in rules)
+
+def is_context_sensitive(rules):
+    '''
+    Returns whether any of the rules has a context or a multi character predecessor.
+    '''
+    return any(len(var) != 1 or isinstance(rule, ContextSuccessor) for var, rule in rules)
+
+def get_successor(rule):
+    '''
+    Returns the successor (string or weighted successors list) of a rule's successor field.
+    '''
+    return rule.successor if isinstance(rule, ContextSuccessor) else rule
+
+def get_rules_key(rules):
+    '''
+    Returns the rules as a hashable tuple, e.g. for a dictionary key.
+    '''
+    def get_key(rule):
+        if isinstance(rule, ContextSuccessor):
+            return ContextSuccessor(get_key(rule.successor), rule.left, rule.right)
+        return rule if isinstance(rule, str) else tuple(tuple(option) for option in rule)
+
+    return tuple((var, get_key(rule)) for var, rule in rules)
+
+def get_weighted_successors(var, rule):
+    '''
+    Takes in a stochastic rule's list of (successor, weight) tuples and returns
+    a tuple of the successors list and the cumulative weights list.
+    '''
+    successors = [option[0] for option in rule]
+    weights = list(itertools.accumulate(float(option[1]) for option in rule))
+    if not successors or weights[-1] <= 0:
+        raise ValueError("Stochastic rule of %s needs a successor with a positive weight" % var)
+
+    return (successors, weights)
+
+def pick_successor(successors, weights, seed, generation, position):
+    '''
+    Picks one of the weighted successors for the symbol at position of the given generation.
+    '''
+    target = get_random_fraction(seed, generation, position) * weights[-1]
+    return successors[min(bisect.bisect_right(weights, target), len(successors) - 1)]
+
+def get_random_fraction(seed, generation, position):
+    '''
+    Returns a random number in [0, 1) that only depends on the arguments, by
+    hashing them with the SplitMix64 finalizer. Counter based, so any symbol's
+    choice can be found without drawing the choices of the symbols before it.
+    '''
+    mask = 0xFFFFFFFFFFFFFFFF
+    x = (seed * 0x9E3779B97F4A7C15 + generation * 0xD1B54A32D192ED03 + position * 0x8CB92BA72F3D8DD7) & mask
+
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & mask
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & mask
+    x ^= x >> 31
+
+    #The top 53 bits fill a float's mantissa
+    return (x >> 11) / (1 << 53)
+
+class RuleRewriter:
+    '''
+    Rewrites l-system states, or chunks of them, one generation at a time.
+
+    Deterministic variables are rewritten with a str.translate() table. For
+    stochastic ones a successor is picked, by weight, with get_random_fraction of
+    the seed, the generation being rewritten and the symbol's position in it.
+    A chunk rewritten given its start position is thus the same as that part
+    of the whole state rewritten, whichever way the state is split up.
+    '''
+
+    def __init__(self, rules, seed = 0):
+        self.seed = seed
+        self.table = {}
+        self.choices = {}
+
+        if is_context_sensitive(rules):
+            raise ValueError("Context sensitive rules are rewritten by a ContextRewriter")
+
+        for var, rule in rules:
+            if isinstance(rule, str):
+                if var in self.choices:
+                    raise ValueError("Variable %s has both stochastic and deterministic rules" % var)
+                self.table[ord(var)] = self.table.get(ord(var), "") + rule
+                continue
+
+            if var in self.choices or ord(var) in self.table:
+                raise ValueError("Variable %s has more than one rule, one of them stochastic" % var)
+
+            self.choices[var] = get_weighted_successors(var, rule)
+
+        #Finds the stochastic variables to choose successors for
+        self._pattern = re.compile("[" + re.escape("".join(self.choices)) + "]") if self.choices else None
+
+    def isascii(self):
+        return (all(successor.isascii() for successor in self.table.values()) and 
+            all(successor.isascii() for successors, _ in self.choices.values() for successor in successors))
+
+    def choose(self, var, generation, position):
+        '''
+        Returns the successor of the stochastic variable var at position of the given generation.
+        '''
+        successors, weights = self.choices[var]
+        return pick_successor(successors, weights, self.seed, generation, position)
+
+    def rewrite(self, string, generation, start = 0):
+        '''
+        Rewrites string, found at index start of the given generation's state.
+        '''
+        if self._pattern == None:
+            return string.translate(self.table)
+
+        parts = []
+        last = 0
+        for match in self._pattern.finditer(string):
+            index = match.start()
+            parts.append(string[last:index].translate(self.table))
+            parts.append(self.choose(string[index], generation, start + index))
+            last = index + 1
+
+        parts.append(string[last:].translate(self.table))
+        return "".join(parts)
+
+    def get_rewritten_length(self, chunk, generation, start = 0):
+        '''
+        Returns the length the ascii bytes chunk would have rewritten.
+        '''
+        length = len(chunk)
+        for var, rule in self.table.items():
+            length += chunk.count(var) * (len(rule) - 1)
+
+        #Stochastic variables only need their successor picked, not written
+        if self._pattern != None:
+            for match in self._pattern.finditer(chunk.decode("ascii")):
+                length += len(self.choose(match.group(), generation, start + match.start())) - 1
+
+        return length
+
+class ContextRewriter:
+    '''
+    Rewrites l-system states with context sensitive rules, one generation at a time.
+
+    A rule rewrites its predecessor, one or more symbols, where it's preceded by
+    the rule's left context and followed by its right context (both empty for
+    context free rules). The contexts are matched against the state being
+    rewritten and aren't replaced themselves.
+
+    Every rule's left context + predecessor + right context is compiled into an
+    Aho-Corasick automaton, with the failure links folded into a full transition
+    table, so a single pass over the state finds every rule matching anywhere in it.
+    Where several rules match at the same position the longest match (contexts
+    included) wins, then the rule that comes first. The state is then rewritten
+    from left to right, a predecessor being replaced as a whole.
+    '''
+
+    def __init__(self, rules, seed = 0):
+        self.seed = seed
+
+        #(left, predecessor, right) -> successor, or successors & weights if stochastic
+        successors = collections.OrderedDict()
+        for var, rule in rules:
+            if not var:
+                raise ValueError("Rules need a predecessor of at least one symbol")
+
+            left, right = (rule.left, rule.right) if isinstance(rule, ContextSuccessor) else ("", "")
+            successor = get_successor(rule)
+            key = (left, var, right)
+
+            #Duplicate rules are joined, the same way LSystem.__next__ does it
+            if key in successors:
+                if not isinstance(successor, str) or not isinstance(successors[key], str):
+                    raise ValueError("Predecessor %s has more than one rule, one of them stochastic" % var)
+                successors[key] += successor
+            else:
+                successors[key] = successor if isinstance(successor, str) else get_weighted_successors(var, successor)
+
+        self.rules = [(left, var, right, successor) for (left, var, right), successor in successors.items()]
+
+        #Lower ranks win, longest match first and then rule order
+        order = sorted(range(len(self.rules)), 
+            key = lambda index: (-len("".join(self.rules[index][:3])), index))
+        self._ranks = [0] * len(self.rules)
+        for rank, index in enumerate(order):
+            self._ranks[index] = rank
+
+        self._build_automaton()
+
+    def rewrite(self, string, generation):
+        return "".join(part[2] for part in self.get_parts(string, generation))
+
+    def get_parts(self, string, generation):
+        '''
+        Returns the rewritten state as a list of (start, length, output, rule index) parts:
+        the length symbols from start were rewritten as output by the rule, or copied
+        unchanged if the rule index is None.
+        '''
+        transitions = self._transitions
+        outputs = self._outputs
+        ranks = self._ranks
+        rules = self.rules
+
+        #Single pass over the state, keeping the best rule matching at every predecessor start
+        best = {}
+        state = 0
+        for end, char in enumerate(string, 1):
+            state = transitions[state].get(char, 0)
+            for index in outputs[state]:
+                left, var, right, _ = rules[index]
+                start = end - len(right) - len(var)
+                current = best.get(start, None)
+                if current == None or ranks[index] < ranks[current]:
+                    best[start] = index
+
+        parts = []
+        position = 0
+        for start in sorted(best):
+            #Predecessors can't start inside the one rewritten before
+            if start < position:
+                continue
+
+            if start > position:
+                parts.append((position, start - position, string[position:start], None))
+
+            index = best[start]
+            var = rules[index][1]
+            successor = rules[index][3]
+            if not isinstance(successor, str):
+                successor = pick_successor(successor[0], successor[1], self.seed, generation, start)
+
+            parts.append((start, len(var), successor, index))
+            position = start + len(var)
+
+        if position < len(string):
+            parts.append((position, len(string) - position, string[position:], None))
+
+        return parts
+
+    def _build_automaton(self):
+        #Trie of the patterns
+        goto = [{}]
+        outputs = [[]]
+        for index, (left, var, right, _) in enumerate(self.rules):
+            state = 0
+            for char in left + var + right:
+                if char not in goto[state]:
+                    goto[state][char] = len(goto)
+                    goto.append({})
+                    outputs.append([])
+                state = goto[state][char]
+            outputs[state].append(index)
+
+        #Breadth first, every state's transitions are its own plus its failure state's
+        self._transitions = [dict(goto[0])]
+        self._transitions.extend({} for _ in range(len(goto) - 1))
+        failures = [0] * len(goto)
+        queue = collections.deque(goto[0].values())
+
+        while queue:
+            state = queue.popleft()
+            transitions = dict(self._transitions[failures[state]])
+            outputs[state] = outputs[state] + outputs[failures[state]]
+
+            for char, next_state in goto[state].items():
+                failures[next_state] = self._transitions[failures[state]].get(char, 0)
+                transitions[char] = next_state
+                queue.append(next_state)
+
+            self._transitions[state] = transitions
+
+        self._outputs = outputs
+
+def _attach_shared_memory(name):
+    '''
+    Returns the existing SharedMemory of the given name, without this process
+    taking part in unlinking it.
+    '''
+    import sys
+    from multiprocessing import resource_tracker, shared_memory
+
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name = name, track = False)
+
+    #Attaching registers the segment as if this process owned it, so a worker's own
+    #resource tracker unlinks it again at exit and warns of leaks. Unregistering it
+    #after attaching isn't enough, as spawned workers share the creator's tracker
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name = name)
+    finally:
+        resource_tracker.register = register
+
+def _measure_chunk(args):
+    '''
+    Worker function returning the rewritten length of a chunk in shared memory.
+    '''
+    source_name, start, end, rewriter, generation = args
+    source_shm = _attach_shared_memory(source_name)
+
+    try:
+        chunk = bytes(source_shm.buf[start:end])
+        return rewriter.get_rewritten_length(chunk, generation, start)
+    
+    finally:
+        source_shm.close()
+
+def _rewrite_chunk(args):
+    '''
+    Worker function rewriting a chunk in shared memory and writing the
+    result into the target shared memory at the given offset.
+    '''
+    source_name, target_name, start, end, offset, rewriter, generation = args
+    source_shm = _attach_shared_memory(source_name)
+    target_shm = _attach_shared_memory(target_name)
+
+    try:
+        chunk = bytes(source_shm.buf[start:end]).decode("ascii")
+        rewritten = rewriter.rewrite(chunk, generation, start).encode("ascii")
+        target_shm.buf[offset:offset + len(rewritten)] = rewritten
+
+    finally:
+        source_shm.close()
+        target_shm.close()
+
+def expand_parallel(lsystem, iterations, processes = None, chunk_size = PARALLEL_CHUNK_SIZE):
+    '''
+    Iterates the given LSystem object the given amount of times, rewriting
+    large generations with a pool of worker processes (defaults to one
+    per cpu core), and returns the final state.
+    '''
+    import multiprocessing
+
+    with multiprocessing.Pool(processes) as pool:
+        for _ in range(iterations):
+            lsystem.next_parallel(pool, chunk_size)
+
+    return str(lsystem)
+
+class MappedLSystemString:
+    '''
+    A read only, string like view of an l-system state stored in an ascii file.
+
+    The file is memory mapped, so only the pages being read are kept in memory.
+    Supports len(), indexing and iteration, which is all draw_lsystem needs,
+    meaning it can be passed to draw_lsystem in place of a string.
+    '''
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._file = open(filepath, "rb")
+
+        #Empty files can't be memory mapped
+        if os.path.getsize(filepath) > 0:
+            self._map = mmap.mmap(self._file.fileno(), 0, access = mmap.ACCESS_READ)
+        else:
+            self._map = b""
+
+    def __len__(self):
+        return len(self._map)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._map[index].decode("ascii")
+        return chr(self._map[index])
+
+    def __iter__(self):
+        for block in self.iter_blocks():
+            yield from block
+
+    def __str__(self):
+        return self._map[:].decode("ascii")
+
+    def iter_blocks(self, block_size = STREAM_BLOCK_SIZE):
+        '''
+        Yields the state in decoded blocks of block_size chars.
+        '''
+        for start in range(0, len(self._map), block_size):
+            yield self._map[start:start + block_size].decode("ascii")
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+def expand_to_file(lsystem, iterations, directory, block_size = STREAM_BLOCK_SIZE):
+    '''
+    Iterates the given LSystem object the given amount of times without holding
+    any generation in memory. Every generation is written to a file in directory
+    while the previous one is streamed from a memory map, in blocks of block_size chars.
+
+    Only the final generation file is kept, and it's returned as a MappedLSystemString.
+    The LSystem object's current_state is left untouched. Context sensitive
+    rules raise a ValueError, their matches can span blocks.
+    '''
+    if is_context_sensitive(lsystem.rules):
+        raise ValueError("Context sensitive l-systems can't be expanded to file")
+
+    if not isinstance(lsystem.current_state, str):
+        raise ValueError("Only l-systems with string states can be expanded to file")
+
+    rewriter = lsystem.get_rewriter()
+    
+    if not lsystem.current_state.isascii() or not rewriter.isascii():
+        raise ValueError("Only ascii l-systems can be expanded to file")
+
+    #Write the current state as generation 0
+    filepath = os.path.join(directory, "generation_0.txt")
+    with open(filepath, "wb") as fp:
+        fp.write(lsystem.current_state.encode("ascii"))
+
+    for generation in range(1, iterations + 1):
+        previous = MappedLSystemString(filepath)
+        filepath = os.path.join(directory, "generation_%d.txt" % generation)
+
+        try:
+            with open(filepath, "wb") as fp:
+                for index, block in enumerate(previous.iter_blocks(block_size)):
+                    fp.write(rewriter.rewrite(block, lsystem.generation + generation - 1, 
+                        index * block_size).encode("ascii"))
+        finally:
+            previous.close()
+
+        #Previous generation is no longer needed
+        os.remove(previous.filepath)
+
+    return MappedLSystemString(filepath)
+
 def get_new_position(current_x, current_y, angle, step_length):
     '''
     Calculates and returns a new position based on the current position, angle &
@@ -78,28 +1247,156 @@ def get_new_color(color_num, colors):
     return util.rgb_tuple_to_hex_string(rgb_tuple)
 
 #TODO: Find better solution to this way to long argument list
-def draw_lsystem(canvas : Canvas, lsystem, symbols, start_pos, 
+def draw_lsystem(canvas : "Canvas", lsystem, symbols, start_pos, 
                 start_angle, turn_angle_amount, start_step, start_thickness,
-                colors = ["#FFFFFF"], start_color_num = 0):
+                colors = ["#FFFFFF"], start_color_num = 0, deduplicator = None):
     '''
     This function starts the drawing algorithm and displays it to the
     given canvas widget argument.
+
+    If a SegmentDeduplicator is given, lines already drawn are skipped.
     '''
 
-    multiple_colors = len(colors) > 1
+    segments = trace_lsystem(
+        (canvas.winfo_width(), canvas.winfo_height()), lsystem, symbols, start_pos, 
+        start_angle, turn_angle_amount, start_step, start_thickness, colors, start_color_num)
 
-    states = []
-    pos_x = canvas.winfo_width() * ((start_pos[0] + 1) / 2)
-    pos_y = canvas.winfo_height() * ((start_pos[1] + 1) / 2)
-    angle = start_angle * -1
-    turn_angle_amount = turn_angle_amount
-    step_length = start_step
-    thickness = start_thickness
+    if deduplicator != None:
+        segments = deduplicator.filter(segments)
+
+    draw_segments(canvas, segments)
+
+def draw_segments(canvas : "Canvas", segments):
+    '''
+    Draws the given segments (e.g. from trace_lsystem) to the canvas as lines.
+    '''
+    for segment in segments:
+        canvas.create_line(segment[0], segment[1], segment[2], segment[3], width = segment[4], fill = segment[5])
+
+class SegmentDeduplicator:
+    '''
+    Filters out segments that have already been drawn, e.g. by curves retracing
+    themselves or branches ending where another started.
+
+    Segments are keyed by their end points, rounded to precision decimals and
+    ordered so a segment drawn in reverse is a duplicate too, along with their
+    thickness and color. Removing a duplicate only changes which of two equal
+    lines ends up on top of the lines drawn between them.
+    '''
+
+    def __init__(self, precision = 2):
+        self.precision = precision
+        self.segment_count = 0
+        self.duplicate_count = 0
+        self._seen = set()
+
+    def filter(self, segments):
+        '''
+        Yields the given segments, skipping every duplicate.
+        '''
+        precision = self.precision
+        seen = self._seen
+
+        for segment in segments:
+            start = (round(segment[0], precision), round(segment[1], precision))
+            end = (round(segment[2], precision), round(segment[3], precision))
+            key = (min(start, end), max(start, end), segment[4], segment[5])
+
+            self.segment_count += 1
+            if key in seen:
+                self.duplicate_count += 1
+                continue
+
+            seen.add(key)
+            yield segment
+
+    def get_duplicate_ratio(self):
+        return self.duplicate_count / self.segment_count if self.segment_count > 0 else 0
+
+def trace_lsystem(size, lsystem, symbols, start_pos, 
+                start_angle, turn_angle_amount, start_step, start_thickness,
+                colors = ["#FFFFFF"], start_color_num = 0):
+    '''
+    The drawing algorithm behind draw_lsystem. Instead of drawing to a canvas, it
+    yields every line as a Segment, positioned for a canvas of the given size (width, height).
+    Lines are yielded as they are found, so any amount of them can be streamed to a file.
+
+    The lsystem can also be a parametric.ParametricState, whose symbols take their values from
+    their first argument instead of the number after them. A parametric F or G then moves by its
+    argument, and a parametric + or - turns by its argument.
+
+    The saved states are kept in parallel lists, one per turtle setting, indexed by the stack depth.
+    They're allocated up front for the deepest the stack gets, so saving & loading allocates nothing.
+    An unmatched load symbol raises a ValueError before anything is yielded.
+    '''
+
+    start_state = get_start_state(size, start_pos, start_angle, start_step, start_thickness, colors, start_color_num)
+
+    return trace_from_state(lsystem, symbols, start_state, turn_angle_amount, 
+        start_thickness, colors, start_color_num)
+
+def get_start_state(size, start_pos, start_angle, start_step, start_thickness,
+                colors = ["#FFFFFF"], start_color_num = 0):
+    '''
+    Returns the TurtleState trace_lsystem starts from, for a canvas of the given size.
+    '''
     color_num = start_color_num % 256
-    color_rgb = get_new_color(color_num, colors) if multiple_colors else colors[0]
-    directions_flipped = False
 
-    for index, char in enumerate(lsystem):
+    return TurtleState(
+        size[0] * ((start_pos[0] + 1) / 2),
+        size[1] * ((start_pos[1] + 1) / 2),
+        start_angle * -1,
+        color_num,
+        get_new_color(color_num, colors) if len(colors) > 1 else colors[0],
+        start_thickness,
+        start_step,
+        False,
+        ())
+
+def trace_from_state(lsystem, symbols, state, turn_angle_amount, start_thickness,
+                colors = ["#FFFFFF"], start_color_num = 0, end = None, index_offset = 0):
+    '''
+    Yields the Segments of trace_lsystem, starting from the given TurtleState instead of the start
+    settings, and returns the TurtleState after the last symbol (as the generator's return value).
+    start_thickness & start_color_num are what the thickness & color set symbols reset to.
+
+    Only the symbols before end are drawn, any after it are only read for the value after
+    the last drawn symbol. Segment indices are offset by index_offset. Tracing a string in
+    pieces this way, each from the state the previous piece ended in, gives the same segments
+    as tracing it at once.
+    '''
+
+    multiple_colors = len(colors) > 1
+
+    if end != None:
+        max_depth = get_max_stack_depth(lsystem[:end], symbols, len(state.stack))
+    else:
+        max_depth = get_max_stack_depth(lsystem, symbols, len(state.stack))
+
+    stack_x = [0.0] * max_depth
+    stack_y = [0.0] * max_depth
+    stack_angle = [0.0] * max_depth
+    stack_color_num = [0] * max_depth
+    stack_step_length = [0.0] * max_depth
+    stack_flipped = [False] * max_depth
+    depth = len(state.stack)
+    for stack_index, saved in enumerate(state.stack):
+        (stack_x[stack_index], stack_y[stack_index], stack_angle[stack_index], stack_color_num[stack_index],
+            stack_step_length[stack_index], stack_flipped[stack_index]) = saved
+
+    pos_x = state.x
+    pos_y = state.y
+    angle = state.angle
+    step_length = state.step_length
+    thickness = state.thickness
+    color_num = state.color_num
+    color_rgb = state.color
+    directions_flipped = state.directions_flipped
+
+    #Parametric states hold the values of their symbols as arguments
+    get_number = getattr(lsystem, "get_number", None)
+
+    for index, char in enumerate(lsystem if end == None else itertools.islice(lsystem, end)):
 
         #Continue to next char if no operation is associated with it
         op = symbols.get(char, None)
@@ -107,13 +1404,17 @@ def draw_lsystem(canvas : Canvas, lsystem, symbols, start_pos,
             continue
 
         #Try getting number value after symbol if it exists
-        value = util.try_get_number_from_str(lsystem, index)
+        if get_number == None:
+            value = util.try_get_number_from_str(lsystem, index)
+        else:
+            value = get_number(index)
 
         if op[0] == "move_down":
             
             #Calculate end position and draw line
-            new_pos = get_new_position(pos_x, pos_y, angle, step_length)
-            canvas.create_line(pos_x, pos_y, new_pos[0], new_pos[1], width = thickness, fill = color_rgb)
+            new_pos = get_new_position(pos_x, pos_y, angle, step_length if get_number == None or value == None else value)
+            yield Segment(pos_x, pos_y, new_pos[0], new_pos[1], thickness, color_rgb, color_num, depth, 
+                index + index_offset)
 
             #Update current position
             pos_x = new_pos[0]
@@ -121,44 +1422,52 @@ def draw_lsystem(canvas : Canvas, lsystem, symbols, start_pos,
             
         elif op[0] == "move_up":
             #Calculate end position 
-            new_pos = get_new_position(pos_x, pos_y, angle, step_length)
+            new_pos = get_new_position(pos_x, pos_y, angle, step_length if get_number == None or value == None else value)
 
             #Update current position
             pos_x = new_pos[0]
             pos_y = new_pos[1]
 
         elif op[0] == "turn_right":
+            turn = turn_angle_amount if get_number == None or value == None else value
+
             #If reverse_turn is false, update angle normally
             if not directions_flipped:
-                angle = (angle + turn_angle_amount) % 360
+                angle = (angle + turn) % 360
 
             else:
-                angle = (angle - turn_angle_amount) % 360
+                angle = (angle - turn) % 360
 
         elif op[0] == "turn_left":
+            turn = turn_angle_amount if get_number == None or value == None else value
+
             #If reverse_turn is false, update angle normally
             if not directions_flipped:
-                angle = (angle - turn_angle_amount) % 360
+                angle = (angle - turn) % 360
 
             else:
-                angle = (angle + turn_angle_amount) % 360
+                angle = (angle + turn) % 360
 
         elif op[0] == "state_save":
-            #Save current state to states list
-            states.append(((pos_x, pos_y), angle, color_num, step_length, directions_flipped))
+            #Save current state at the top of the stack
+            stack_x[depth] = pos_x
+            stack_y[depth] = pos_y
+            stack_angle[depth] = angle
+            stack_color_num[depth] = color_num
+            stack_step_length[depth] = step_length
+            stack_flipped[depth] = directions_flipped
+            depth += 1
 
         elif op[0] == "state_load":
-            #Pop last state from states list
-            latest_state = states.pop()
-
-            #Update current settings to latest_state
-            pos_x = latest_state[0][0]
-            pos_y = latest_state[0][1]
-            angle = latest_state[1]
-            color_num = latest_state[2]
+            #Update current settings to the state at the top of the stack
+            depth -= 1
+            pos_x = stack_x[depth]
+            pos_y = stack_y[depth]
+            angle = stack_angle[depth]
+            color_num = stack_color_num[depth]
             color_rgb = get_new_color(color_num, colors) if multiple_colors else colors[0]
-            step_length = latest_state[3]
-            directions_flipped = latest_state[4]
+            step_length = stack_step_length[depth]
+            directions_flipped = stack_flipped[depth]
 
         elif op[0] == "color_up":
             if not multiple_colors:
@@ -198,4 +1507,8 @@ def draw_lsystem(canvas : Canvas, lsystem, symbols, start_pos,
 
         elif op[0] == "switch_directions":
             #Set directions_flipped to what directions_flipped is not
-            directions_flipped = not directions_flipped
\ No newline at end of file
+            directions_flipped = not directions_flipped
+
+    return TurtleState(pos_x, pos_y, angle, color_num, color_rgb, thickness, step_length, directions_flipped,
+        tuple(zip(stack_x[:depth], stack_y[:depth], stack_angle[:depth], stack_color_num[:depth], 
+            stack_step_length[:depth], stack_flipped[:depth])))
\ No newline at end of file
@@ -0,0 +1,284 @@
+'''
+Holds the parametric l-system engine, where symbols carry numeric arguments,
+e.g. the rule F(l) -> F(l*0.6)[+F(l*0.5)].
+
+Needs NumPy. Every argument expression is compiled once per rule, and evaluated
+for all the instances of the rule's symbol in a generation at once, as arrays.
+
+In a parametric l-system a symbol directly followed by "(" takes the arguments
+in the parentheses, so the thickness symbols are written with an argument,
+e.g. "((2)". A rule matches the modules (symbol & arguments) with its symbol
+and the same amount of arguments, and modules without a rule are copied.
+'''
+
+import ast
+import collections
+import numpy as np
+
+#Functions & constants argument expressions can use, besides + - * / // % ** and parentheses
+EXPRESSION_NAMES = {
+    "sin" : np.sin,
+    "cos" : np.cos,
+    "tan" : np.tan,
+    "sqrt" : np.sqrt,
+    "exp" : np.exp,
+    "log" : np.log,
+    "abs" : np.abs,
+    "min" : np.minimum,
+    "max" : np.maximum,
+    "pi" : np.pi
+}
+
+_ALLOWED_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.USub, ast.UAdd)
+
+#A rule compiled for a generation-wide rewrite, successor being a list of (symbol, argument code objects)
+ParametricRule = collections.namedtuple("ParametricRule", ["symbol", "params", "successor"])
+
+def split_modules(text):
+    '''
+    Splits a parametric l-system string into a list of (symbol, argument expression strings) tuples.
+    '''
+    modules = []
+    index = 0
+
+    while index < len(text):
+        symbol = text[index]
+        index += 1
+        args = []
+
+        if index < len(text) and text[index] == "(":
+            #Find the closing parenthesis, splitting the arguments on top level commas
+            depth = 0
+            start = index + 1
+            for end in range(index, len(text)):
+                if text[end] == "(":
+                    depth += 1
+                elif text[end] == ")":
+                    depth -= 1
+                    if depth == 0:
+                        break
+                elif text[end] == "," and depth == 1:
+                    args.append(text[start:end].strip())
+                    start = end + 1
+            else:
+                raise ValueError("Unclosed argument list after %s in %s" % (symbol, text))
+
+            args.append(text[start:end].strip())
+            index = end + 1
+
+        modules.append((symbol, args))
+
+    return modules
+
+def compile_expression(expression, params):
+    '''
+    Compiles an argument expression using the given parameter names. Only arithmetic,
+    numbers, the parameters and EXPRESSION_NAMES are allowed.
+    '''
+    tree = ast.parse(expression, mode = "eval")
+
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ValueError("Unsupported syntax in argument expression %s" % expression)
+        if isinstance(node, ast.Name) and node.id not in params and node.id not in EXPRESSION_NAMES:
+            raise ValueError("Unknown name %s in argument expression %s" % (node.id, expression))
+        if isinstance(node, ast.Call) and (not isinstance(node.func, ast.Name) or node.keywords):
+            raise ValueError("Unsupported call in argument expression %s" % expression)
+
+    return compile(tree, expression, "eval")
+
+def evaluate(code, names, count):
+    '''
+    Evaluates a compiled expression, returning an array of count values.
+    '''
+    return np.broadcast_to(np.asarray(eval(code, {"__builtins__" : {}}, names), dtype = np.float64), (count,))
+
+class ParametricState:
+    '''
+    A generation of a parametric l-system, stored as arrays: the symbol codes, the
+    amount of arguments and the arguments (padded with NaN) of every module. Also
+    records, for every module, the index of the module it was rewritten from and
+    the index of the rule that did it (-1 for copied modules), rules holding the
+    (predecessor, successor) text of every rule index.
+
+    Behaves like a string of the symbols for drawing: len(), iteration and
+    indexing give symbols, and get_number(index) the first argument of the module.
+    str() gives the parametric l-system string, e.g. F(12.5)[+(30)F(6)].
+    '''
+
+    def __init__(self, codes, arities, args, parents = None, rule_indices = None, rules = None):
+        self.codes = codes
+        self.arities = arities
+        self.args = args
+        self.parents = parents
+        self.rule_indices = rule_indices
+        self.rules = rules
+        self._symbols = None
+        self._numbers = None
+
+    @classmethod
+    def from_string(cls, text, max_arity = 0):
+        modules = split_modules(text)
+        max_arity = max([max_arity] + [len(args) for _, args in modules])
+
+        args = np.full((len(modules), max_arity), np.nan)
+        for index, (_, module_args) in enumerate(modules):
+            for arg_index, arg in enumerate(module_args):
+                args[index, arg_index] = evaluate(compile_expression(arg, ()), EXPRESSION_NAMES, 1)[0]
+
+        return cls(
+            np.array([ord(symbol) for symbol, _ in modules], dtype = np.uint32),
+            np.array([len(module_args) for _, module_args in modules], dtype = np.int64),
+            args)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        return iter(self.get_symbols())
+
+    def __getitem__(self, index):
+        return self.get_symbols()[index]
+
+    def __str__(self):
+        parts = []
+        for symbol, arity, args in zip(self.get_symbols(), self.arities.tolist(), self.args.tolist()):
+            parts.append(symbol)
+            if arity > 0:
+                parts.append("(" + ",".join("%g" % arg for arg in args[:arity]) + ")")
+        return "".join(parts)
+
+    def find(self, symbol, start = 0, end = None):
+        return self.get_symbols().find(symbol, start, len(self) if end == None else end)
+
+    def get_symbols(self):
+        '''
+        Returns the symbols of the modules as a string.
+        '''
+        if self._symbols == None:
+            self._symbols = self.codes.astype("<u4").tobytes().decode("utf-32-le")
+        return self._symbols
+
+    def get_number(self, index):
+        '''
+        Returns the first argument of the module at index, None if it has none.
+        '''
+        if self._numbers == None:
+            first = self.args[:, 0] if self.args.shape[1] > 0 else np.full(len(self), np.nan)
+            self._numbers = [None if arity == 0 else value
+                for arity, value in zip(self.arities.tolist(), first.tolist())]
+        return self._numbers[index]
+
+class ParametricLSystem:
+    '''
+    A parametric l-system, used the same way as lsystem.LSystem.
+
+    Takes an axiom, e.g. "F(100)", and a rules list of tuples like
+    ("F(l)", "F(l*0.6)[+(20)F(l*0.5)]"). Rules with the same symbol &
+    amount of parameters are joined in order, like LSystem does, and have
+    to name their parameters the same.
+    '''
+
+    def __init__(self, axiom, rules, seed = 0):
+        self.axiom = axiom
+        self.rules = rules
+        self.seed = seed
+        self.generation = 0
+        self._rules = self._compile_rules(rules)
+
+        max_arity = max([0] + [len(rule.params) for rule in self._rules] +
+            [len(args) for rule in self._rules for _, args in rule.successor])
+        self.current_state = ParametricState.from_string(axiom, max_arity)
+
+    def __next__(self):
+        state = self.current_state
+        count = len(state)
+
+        #Amount of modules every module is rewritten into, and which modules every rule rewrites
+        counts = np.ones(count, dtype = np.int64)
+        matched = np.zeros(count, dtype = bool)
+        rule_matches = []
+        for rule in self._rules:
+            indices = np.flatnonzero((state.codes == ord(rule.symbol)) & (state.arities == len(rule.params)) & ~matched)
+            counts[indices] = len(rule.successor)
+            matched[indices] = True
+            rule_matches.append(indices)
+
+        #Prefix sum of the counts gives every module its offset in the next generation
+        offsets = np.cumsum(counts) - counts
+        total = int(counts.sum())
+
+        codes = np.empty(total, dtype = np.uint32)
+        arities = np.zeros(total, dtype = np.int64)
+        args = np.full((total, state.args.shape[1]), np.nan)
+        parents = np.empty(total, dtype = np.int64)
+        rule_indices = np.full(total, -1, dtype = np.int64)
+
+        #Modules without a rule are copied
+        copied = np.flatnonzero(~matched)
+        codes[offsets[copied]] = state.codes[copied]
+        arities[offsets[copied]] = state.arities[copied]
+        args[offsets[copied]] = state.args[copied]
+        parents[offsets[copied]] = copied
+
+        #Every rule's successor modules are written for all its matches at once
+        for rule_index, (rule, indices) in enumerate(zip(self._rules, rule_matches)):
+            if len(indices) == 0:
+                continue
+
+            names = dict(EXPRESSION_NAMES)
+            for param_index, param in enumerate(rule.params):
+                names[param] = state.args[indices, param_index]
+
+            for module_index, (symbol, expressions) in enumerate(rule.successor):
+                positions = offsets[indices] + module_index
+                codes[positions] = ord(symbol)
+                arities[positions] = len(expressions)
+                parents[positions] = indices
+                rule_indices[positions] = rule_index
+
+                for arg_index, code in enumerate(expressions):
+                    args[positions, arg_index] = evaluate(code, names, len(indices))
+
+        self.current_state = ParametricState(codes, arities, args, parents, rule_indices, self._rule_texts)
+        self.generation += 1
+        return self.current_state
+
+    def __str__(self):
+        return str(self.current_state)
+
+    def _compile_rules(self, rules):
+        compiled = collections.OrderedDict()
+        self._rule_texts = []
+
+        for predecessor, successor in rules:
+            if not isinstance(successor, str):
+                raise ValueError("Parametric l-systems only support deterministic context free rules")
+
+            modules = split_modules(predecessor)
+            if len(modules) != 1:
+                raise ValueError("Parametric rule predecessor %s has to be a single module" % predecessor)
+
+            symbol, params = modules[0]
+            for param in params:
+                if not param.isidentifier() or param in EXPRESSION_NAMES:
+                    raise ValueError("Invalid parameter name %s in %s" % (param, predecessor))
+
+            #Joined rules' expressions are evaluated with the first rule's parameter names
+            key = (symbol, len(params))
+            if key in compiled and compiled[key].params != tuple(params):
+                raise ValueError("Joined rules for %s have to use the same parameter names" % predecessor)
+
+            successor_modules = [(successor_symbol, [compile_expression(arg, params) for arg in args])
+                for successor_symbol, args in split_modules(successor)]
+
+            if key in compiled:
+                index = list(compiled).index(key)
+                compiled[key] = compiled[key]._replace(successor = compiled[key].successor + successor_modules)
+                self._rule_texts[index] = (self._rule_texts[index][0], self._rule_texts[index][1] + successor)
+            else:
+                compiled[key] = ParametricRule(symbol, tuple(params), successor_modules)
+                self._rule_texts.append((predecessor, successor))
+
+        return list(compiled.values())
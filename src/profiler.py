@@ -0,0 +1,237 @@
+'''
+Holds the expansion profiler, telling which rule an l-system's size and expansion time come from.
+
+Every generation is expanded with LSystem, timing it, and the symbol counts of the
+generation being rewritten give every rule's applications. The chars, memory and
+time of a generation are attributed to the rules by the chars they wrote, the chars
+copied unchanged being a row of their own. Timing a rewrite as a whole and
+splitting it afterwards leaves the rewrite itself as fast as it is without profiling.
+
+Draw ops (chars with a symbol operation) are attributed to the rule that wrote them
+last, the way get_symbol_origin finds a symbol's rule. A rule applied before the last
+generation keeps the ops it wrote that no rule rewrites, so they're counted from the
+applications and the successor's composition, without reading the final state.
+For context sensitive rules a symbol with a rule counts as rewritten, even
+where its context doesn't match.
+
+Can be run from the command line:
+py profiler.py <lsystem json> [--iterations N] [--sort chars|bytes|time|draw_ops|rule] [--by-generation] [--output FILE]
+'''
+
+import argparse
+import collections
+import json
+import time
+import lsystem as lsys
+import lsysfilehandler as fh
+
+#Rule of the chars copied unchanged, and of the draw ops that are in the axiom
+COPIED = "(copied)"
+AXIOM = "(axiom)"
+
+#A rule's share of a generation, generation being the one the rule wrote
+RuleProfile = collections.namedtuple("RuleProfile",
+    ["generation", "rule", "applications", "chars", "bytes", "time", "draw_ops"])
+
+SORT_KEYS = ("chars", "bytes", "time", "draw_ops", "rule")
+
+class ExpansionProfile:
+    '''
+    The RuleProfiles of an expansion, one per rule and generation, plus the
+    draw ops of the axiom and the totals of the final state.
+    '''
+
+    def __init__(self, rows, draw_op_count):
+        self.rows = rows
+        self.draw_op_count = draw_op_count
+
+    def get_rule_totals(self):
+        '''
+        Returns a RuleProfile per rule summed over the generations, generation being None.
+        '''
+        totals = collections.OrderedDict()
+
+        for row in self.rows:
+            total = totals.get(row.rule, None)
+            if total == None:
+                totals[row.rule] = row._replace(generation = None)
+            else:
+                totals[row.rule] = total._replace(
+                    applications = total.applications + row.applications,
+                    chars = total.chars + row.chars,
+                    bytes = total.bytes + row.bytes,
+                    time = total.time + row.time,
+                    draw_ops = total.draw_ops + row.draw_ops)
+
+        return list(totals.values())
+
+    def get_draw_op_fraction(self, row):
+        return row.draw_ops / self.draw_op_count if self.draw_op_count > 0 else 0
+
+    def get_report(self, sort_key = "chars", by_generation = False):
+        '''
+        Returns the profile as a text table, one line per rule (or per rule and
+        generation), sorted by sort_key, largest first.
+        '''
+        rows = self.rows if by_generation else self.get_rule_totals()
+
+        if sort_key == "rule":
+            rows = sorted(rows, key = lambda row: (row.rule, row.generation or 0))
+        else:
+            rows = sorted(rows, key = lambda row: getattr(row, sort_key), reverse = True)
+
+        lines = ["%-30s %4s %12s %14s %12s %10s %12s %8s" % (
+            "rule", "gen", "applications", "chars", "KiB", "ms", "draw ops", "ops %")]
+
+        for row in rows:
+            lines.append("%-30s %4s %12d %14d %12.1f %10.2f %12d %7.1f%%" % (
+                row.rule[:30],
+                "-" if row.generation == None else row.generation,
+                row.applications,
+                row.chars,
+                row.bytes / 1024,
+                row.time * 1000,
+                row.draw_ops,
+                self.get_draw_op_fraction(row) * 100))
+
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {
+            "draw_op_count" : self.draw_op_count,
+            "rows" : [row._asdict() for row in self.rows]
+        }
+
+def get_char_size(state):
+    '''
+    Returns the bytes a char of the string takes, the way CPython stores it.
+    '''
+    if not state or state.isascii():
+        return 1
+
+    largest = ord(max(state))
+    return 1 if largest < 0x100 else 2 if largest < 0x10000 else 4
+
+def get_rule_outputs(lsystem):
+    '''
+    Returns the successors the LSystem's next rewrite writes, as a Counter of
+    (rule, successor) tuples, and the amount of chars it copies unchanged.
+    '''
+    state = lsystem.current_state
+    outputs = collections.Counter()
+
+    if lsys.is_context_sensitive(lsystem.rules):
+        rewriter = lsystem.get_rewriter()
+        copied = 0
+
+        for _, length, output, rule_index in rewriter.get_parts(state, lsystem.generation):
+            if rule_index == None:
+                copied += length
+            else:
+                left, var, right, _ = rewriter.rules[rule_index]
+                outputs[("%s<%s>%s" % (left, var, right) if left or right else var, output)] += 1
+
+        return (outputs, copied)
+
+    rewriter = lsystem.get_rewriter()
+    counts = collections.Counter(state)
+
+    for key, successor in rewriter.table.items():
+        if counts[chr(key)] > 0:
+            outputs[(chr(key), successor)] += counts[chr(key)]
+
+    #Stochastic choices depend on the position
+    if rewriter.choices:
+        for position, char in enumerate(state):
+            if char in rewriter.choices:
+                outputs[(char, rewriter.choose(char, lsystem.generation, position))] += 1
+
+    copied = len(state) - sum(counts[chr(key)] for key in rewriter.table) - sum(counts[var] for var in rewriter.choices)
+    return (outputs, copied)
+
+def get_rewritten_chars(rules):
+    '''
+    Returns the set of chars in the predecessor of a rule.
+    '''
+    return set("".join(var for var, _ in rules))
+
+def profile_lsystem(lsystem, iterations, symbols):
+    '''
+    Expands the LSystem the given amount of iterations and returns an ExpansionProfile of it,
+    the draw ops being the chars with an operation in symbols (as draw_lsystem takes them).
+    '''
+    rewritten = get_rewritten_chars(lsystem.rules)
+    kept_ops = set(symbols) - rewritten
+    rows = []
+
+    #Ops of the axiom no rule rewrites are never replaced
+    axiom_ops = sum(1 for char in lsystem.current_state if char in (symbols if iterations == 0 else kept_ops))
+    rows.append(RuleProfile(0, AXIOM, 0, len(lsystem.current_state),
+        len(lsystem.current_state) * get_char_size(lsystem.current_state), 0, axiom_ops))
+
+    for iteration in range(iterations):
+        outputs, copied = get_rule_outputs(lsystem)
+
+        start = time.perf_counter()
+        state = next(lsystem)
+        elapsed = time.perf_counter() - start
+
+        char_size = get_char_size(state)
+        last = iteration == iterations - 1
+
+        #Ops written in the last generation are all in the final state
+        ops = symbols if last else kept_ops
+        rule_rows = collections.OrderedDict()
+
+        for (rule, successor), applications in outputs.items():
+            chars = applications * len(successor)
+            draw_ops = applications * sum(1 for char in successor if char in ops)
+            row = rule_rows.get(rule, None)
+
+            if row == None:
+                rule_rows[rule] = RuleProfile(lsystem.generation, rule, applications, chars, 0, 0, draw_ops)
+            else:
+                rule_rows[rule] = row._replace(applications = row.applications + applications,
+                    chars = row.chars + chars, draw_ops = row.draw_ops + draw_ops)
+
+        rule_rows[COPIED] = RuleProfile(lsystem.generation, COPIED, 0, copied, 0, 0, 0)
+
+        #The generation's time is split by the chars written, a rewrite's cost being its output
+        for row in rule_rows.values():
+            rows.append(row._replace(bytes = row.chars * char_size,
+                time = elapsed * row.chars / len(state) if len(state) > 0 else 0))
+
+    draw_op_count = sum(1 for char in lsystem.current_state if char in symbols)
+    return ExpansionProfile(rows, draw_op_count)
+
+def profile_lsystem_object(lsysobj, iterations = None):
+    '''
+    Profiles the expansion of the lsystem object, its own iterations by default.
+    '''
+    if iterations == None:
+        iterations = lsysobj["settings"]["iterations"]
+
+    return profile_lsystem(fh.create_lsystem(lsysobj), iterations, fh.get_symbols(lsysobj))
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Profile an l-system's expansion per rule")
+    parser.add_argument("input", help = "l-system json file")
+    parser.add_argument("--iterations", type = int, default = None, help = "defaults to the file's iterations")
+    parser.add_argument("--sort", choices = SORT_KEYS, default = "chars", help = "column to sort by, largest first")
+    parser.add_argument("--by-generation", action = "store_true", help = "a line per rule and generation")
+    parser.add_argument("--output", default = None, help = "save the rows as json to this file")
+    args = parser.parse_args(argv)
+
+    lsysobj = fh.load_lsystem(args.input)
+    if fh.is_parametric(lsysobj):
+        parser.error("parametric l-systems can't be profiled")
+
+    profile = profile_lsystem_object(lsysobj, args.iterations)
+    print(profile.get_report(args.sort, args.by_generation))
+
+    if args.output != None:
+        with open(args.output, "w") as fp:
+            json.dump(profile.to_dict(), fp, indent = 4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+'''
+Holds the raster renderer used by the image exporters, rendering
+segments to tiles of RGB pixels and streaming them to PNG files.
+'''
+
+import math
+import struct
+import zlib
+import utilities as util
+
+_rgb_cache = {}
+
+class RasterTile:
+    '''
+    A rectangle of RGB pixels at position (x, y) of a larger image.
+
+    Segments are given in image coordinates and drawn as filled quads
+    (butt capped lines) by scanline, so every pixel row is a single slice assignment.
+    '''
+
+    def __init__(self, x, y, width, height, background = (0, 0, 0)):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(bytes(background) * (width * height))
+
+    def draw_segment(self, x0, y0, x1, y1, thickness, rgb):
+        '''
+        Draws a line of the given thickness and color (bytes r, g, b).
+        '''
+        #Convert to tile coordinates
+        x0 -= self.x
+        y0 -= self.y
+        x1 -= self.x
+        y1 -= self.y
+
+        length = math.hypot(x1 - x0, y1 - y0)
+
+        #Draw zero length lines as a dot, one pixel long
+        if length == 0:
+            x0 -= 0.5
+            x1 += 0.5
+            length = 1
+
+        #Offset from the center line to the quad's long edges
+        half = thickness / 2
+        normal_x = -(y1 - y0) / length * half
+        normal_y = (x1 - x0) / length * half
+
+        corners = [
+            (x0 + normal_x, y0 + normal_y),
+            (x1 + normal_x, y1 + normal_y),
+            (x1 - normal_x, y1 - normal_y),
+            (x0 - normal_x, y0 - normal_y)]
+
+        edges = [(corners[i], corners[(i + 1) % 4]) for i in range(4)]
+
+        first_row = max(0, math.ceil(min(corner[1] for corner in corners) - 0.5))
+        last_row = min(self.height - 1, math.floor(max(corner[1] for corner in corners) - 0.5))
+
+        for row in range(first_row, last_row + 1):
+            center_y = row + 0.5
+
+            #Find where the pixel row's center crosses the quad's edges
+            crossings = []
+            for (ax, ay), (bx, by) in edges:
+                if (ay <= center_y < by) or (by <= center_y < ay):
+                    crossings.append(ax + (center_y - ay) * (bx - ax) / (by - ay))
+
+            if len(crossings) < 2:
+                continue
+
+            left = max(0, math.ceil(min(crossings) - 0.5))
+            right = min(self.width - 1, math.floor(max(crossings) - 0.5))
+
+            if left > right:
+                continue
+
+            start = (row * self.width + left) * 3
+            self.pixels[start:start + (right - left + 1) * 3] = rgb * (right - left + 1)
+
+    def draw_segment_list(self, segments):
+        '''
+        Draws a list of (x0, y0, x1, y1, thickness, rgb bytes) segments, in order.
+        '''
+        for segment in segments:
+            self.draw_segment(*segment)
+
+    def get_row(self, row):
+        start = row * self.width * 3
+        return self.pixels[start:start + self.width * 3]
+
+class PngWriter:
+    '''
+    Writes an 8 bit RGB PNG file one pixel row at a time. Rows are compressed
+    as they're written, so the image never has to be held in memory.
+    '''
+
+    #Compressed data is written in IDAT chunks of about this size
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, fp, width, height, compress_level = 6):
+        self._fp = fp
+        self._compressor = zlib.compressobj(compress_level)
+        self._buffer = []
+        self._buffer_size = 0
+
+        fp.write(b"\x89PNG\r\n\x1a\n")
+        self._write_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    def write_row(self, row):
+        #Every row starts with its filter type, 0 meaning no filter
+        data = self._compressor.compress(b"\x00" + bytes(row))
+
+        if data:
+            self._buffer.append(data)
+            self._buffer_size += len(data)
+
+        if self._buffer_size >= self.CHUNK_SIZE:
+            self._flush()
+
+    def close(self):
+        self._buffer.append(self._compressor.flush())
+        self._flush()
+        self._write_chunk(b"IEND", b"")
+
+    def _flush(self):
+        if self._buffer:
+            self._write_chunk(b"IDAT", b"".join(self._buffer))
+            self._buffer = []
+            self._buffer_size = 0
+
+    def _write_chunk(self, chunk_type, data):
+        self._fp.write(struct.pack(">I", len(data)))
+        self._fp.write(chunk_type)
+        self._fp.write(data)
+        self._fp.write(struct.pack(">I", zlib.crc32(chunk_type + data) & 0xffffffff))
+
+def get_rgb_bytes(color):
+    '''
+    Returns the hex color string as bytes (r, g, b), caching every color seen.
+    '''
+    rgb = _rgb_cache.get(color, None)
+    if rgb == None:
+        rgb = bytes(util.hex_string_to_rgb_tuple(color))
+        _rgb_cache[color] = rgb
+    return rgb
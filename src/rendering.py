@@ -0,0 +1,113 @@
+'''
+Holds the incremental canvas renderer, drawing segments to a
+canvas a batch at a time so the GUI stays responsive.
+'''
+
+import itertools
+import time
+
+#Target time spent drawing per tick, in seconds
+FRAME_BUDGET = 0.016
+
+class RenderJob:
+    '''
+    Draws segments (any iterable, e.g. trace_lsystem's generator) to a canvas,
+    a batch of lines per tk after() tick. The job can be cancelled at any
+    tick, e.g. when the segments are outdated, and on_done is called once
+    every segment has been drawn.
+
+    Creating canvas items gets slower the more items there are, so the time
+    every batch takes is measured and the next batch is sized to fit in
+    frame_budget seconds. on_progress is called with the job after every tick.
+    '''
+
+    def __init__(self, canvas, segments, frame_budget = FRAME_BUDGET, batch_size = 100, 
+                 on_done = None, on_progress = None):
+        self.canvas = canvas
+        self.frame_budget = frame_budget
+        self.batch_size = batch_size
+        self.on_done = on_done
+        self.on_progress = on_progress
+        self.drawn_count = 0
+        self.tick_count = 0
+        self.draw_time = 0
+        self.is_cancelled = False
+        self.is_done = False
+
+        self._segments = iter(segments)
+        self._after_id = None
+        self._start_time = None
+        self._end_time = None
+
+    def start(self):
+        self._start_time = time.perf_counter()
+        self._after_id = self.canvas.after_idle(self._tick)
+
+    def cancel(self):
+        if self._after_id != None:
+            self.canvas.after_cancel(self._after_id)
+            self._after_id = None
+        self.is_cancelled = True
+
+    def get_throughput(self):
+        '''
+        Returns the lines drawn per second of wall time since the job started.
+        '''
+        end_time = self._end_time if self._end_time != None else time.perf_counter()
+        wall_time = end_time - self._start_time
+        return self.drawn_count / wall_time if wall_time > 0 else 0
+
+    def get_frame_time(self):
+        '''
+        Returns the average time a tick spent drawing, in seconds.
+        '''
+        return self.draw_time / self.tick_count if self.tick_count > 0 else 0
+
+    def get_summary(self):
+        '''
+        Returns a one line summary fit for a status bar.
+        '''
+        return "%d lines  %.0f lines/s  frame %.1f ms (budget %.0f ms)  batch %d" % (
+            self.drawn_count,
+            self.get_throughput(),
+            self.get_frame_time() * 1000,
+            self.frame_budget * 1000,
+            self.batch_size)
+
+    def _tick(self):
+        self._after_id = None
+        if self.is_cancelled:
+            return
+
+        batch_size = self.batch_size
+        start = time.perf_counter()
+
+        count = 0
+        for segment in itertools.islice(self._segments, batch_size):
+            self.canvas.create_line(segment[0], segment[1], segment[2], segment[3], 
+                width = segment[4], fill = segment[5])
+            count += 1
+
+        elapsed = time.perf_counter() - start
+        self.drawn_count += count
+        self.draw_time += elapsed
+        self.tick_count += 1
+
+        #Size the next batch to fit the budget, at most doubling it so a fast tick can't overshoot
+        if elapsed > 0:
+            self.batch_size = max(1, min(batch_size * 2, int(batch_size * self.frame_budget / elapsed)))
+
+        #Fewer lines than a batch means the segments ran out
+        if count < batch_size:
+            self.is_done = True
+            self._end_time = time.perf_counter()
+
+        if self.on_progress != None:
+            self.on_progress(self)
+
+        if self.is_done:
+            if self.on_done != None:
+                self.on_done()
+            return
+
+        self._after_id = self.canvas.after(1, self._tick)
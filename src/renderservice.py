@@ -0,0 +1,369 @@
+'''
+Holds a small localhost HTTP service rendering l-systems on demand with the headless core.
+
+Requests POST an lsystem object, in the schema app.create_lsystem_file_object
+and the json files use, to /render. Identical requests being rendered are
+coalesced into a single render, finished renders are kept in a content addressed
+cache, and new renders are spread over a pool of worker processes.
+GET /metrics returns the queue depth, cache and latency metrics as json.
+
+Can be run from the command line:
+py renderservice.py [--host HOST] [--port PORT] [--workers N] [--cache-size BYTES] [--max-iterations N]
+    [--max-length N] [--max-size N] [--max-pixels N]
+
+POST /render?format=png|svg&width=W&height=H&scale=S with the lsystem json as the body
+'''
+
+import argparse
+import collections
+import concurrent.futures
+import concurrent.futures.process
+import hashlib
+import math
+import http.server
+import io
+import json
+import os
+import threading
+import time
+import urllib.parse
+import exporters as ex
+import headless
+import lsystem as lsys
+import lsysfilehandler as fh
+
+FORMATS = {
+    "png" : "image/png",
+    "svg" : "image/svg+xml"
+}
+
+#Requests with a larger body are refused
+MAX_REQUEST_SIZE = 1 << 20
+
+#Amount of the latest latencies the percentiles are found from
+LATENCY_WINDOW = 1000
+
+def render_lsystem_object(lsysobj, image_format, size, scale = 1):
+    '''
+    Expands the lsystem object its own amount of iterations and returns it
+    rendered as png or svg bytes, for a canvas of the given size (width, height).
+    Runs in the worker processes of a RenderService.
+    '''
+    with ex.expand_lsystem_object(lsysobj) as lsystem:
+        segments = fh.trace_lsystem_object(size, lsysobj, lsystem)
+
+        if image_format == "png":
+            with io.BytesIO() as fp:
+                #Already in one of the service's worker processes
+                ex.write_png(fp, segments, size, scale, workers = 1)
+                return fp.getvalue()
+
+        with io.StringIO() as fp:
+            writer = ex.SvgWriter(fp, size, ex.BACKGROUND_COLOR)
+            for segment in segments:
+                writer.add_segment(segment)
+            writer.close()
+            return fp.getvalue().encode("utf-8")
+
+def get_request_key(lsysobj, image_format, size, scale):
+    '''
+    Returns the content address of a render, the sha256 of the lsystem object
+    with its keys sorted and the render settings. Svg images don't depend on
+    the scale, so every scale of an svg has the same key.
+    '''
+    if image_format == "svg":
+        scale = 1
+
+    text = json.dumps([lsysobj, image_format, list(size), scale], sort_keys = True, separators = (",", ":"))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def get_expanded_length(lsysobj):
+    '''
+    Returns the length of the lsystem object expanded its iterations, or an upper
+    bound of it when it depends on stochastic choices or contexts (see lsystem.get_length_bound),
+    without expanding it. Parametric l-systems are measured in modules.
+    '''
+    settings = lsysobj["settings"]
+    rules = fh.get_rules(lsysobj)
+
+    if not fh.is_parametric(lsysobj):
+        return lsys.get_length_bound(settings["axiom"], rules, settings["iterations"])
+
+    import parametric as par
+
+    #A module is rewritten by the joined rules of its symbol & amount of arguments, or copied
+    successors = collections.OrderedDict()
+    for predecessor, successor in rules:
+        (symbol, params), = par.split_modules(predecessor)
+        successor_symbols = "".join(successor_symbol for successor_symbol, _ in par.split_modules(successor))
+        successors[(symbol, len(params))] = successors.get((symbol, len(params)), "") + successor_symbols
+
+    symbol_rules = [(symbol, [(successor, 1), (symbol, 1)]) for (symbol, _), successor in successors.items()]
+    axiom = "".join(symbol for symbol, _ in par.split_modules(settings["axiom"]))
+    return lsys.get_length_bound(axiom, symbol_rules, settings["iterations"])
+
+def get_percentiles(values):
+    '''
+    Returns the 50th & 95th percentile and the maximum of values in milliseconds, as a dict.
+    '''
+    if not values:
+        return {"p50" : None, "p95" : None, "max" : None}
+
+    ordered = sorted(values)
+    return {
+        "p50" : ordered[int(0.5 * (len(ordered) - 1))] * 1000,
+        "p95" : ordered[int(0.95 * (len(ordered) - 1))] * 1000,
+        "max" : ordered[-1] * 1000
+    }
+
+class RenderService:
+    '''
+    Renders lsystem objects in a pool of worker processes (defaults to one
+    per cpu core), keeping the results in a least recently used cache of at
+    most cache_size bytes, keyed by get_request_key.
+
+    A request for a render that's already running waits for that render
+    instead of starting another one. Requests over max_iterations, expanding to
+    more than max_length symbols (see get_expanded_length), with a canvas wider or
+    higher than max_size, or an image of more than max_pixels are refused.
+    A pool broken by a worker dying is replaced. Safe to call from many threads.
+    '''
+
+    def __init__(self, workers = None, cache_size = 1 << 28, max_iterations = 12, max_size = 8192, 
+                 max_pixels = 1 << 26, max_length = 1 << 24):
+        self.cache_size = cache_size
+        self.max_iterations = max_iterations
+        self.max_length = max_length
+        self.max_size = max_size
+        self.max_pixels = max_pixels
+        self._workers = workers if workers != None else (os.cpu_count() or 1)
+        self._executor = concurrent.futures.ProcessPoolExecutor(self._workers)
+        self._lock = threading.RLock()
+        self._cache = collections.OrderedDict()
+        self._cache_bytes = 0
+        self._in_flight = {}
+        self._waiting = 0
+        self._counters = collections.Counter()
+        self._latencies = collections.deque(maxlen = LATENCY_WINDOW)
+        self._render_latencies = collections.deque(maxlen = LATENCY_WINDOW)
+
+    def render(self, lsysobj, image_format = "png", size = (headless.CANVAS_WIDTH, headless.CANVAS_HEIGHT), scale = 1):
+        '''
+        Returns the tuple (key, rendered bytes) of the lsystem object. Invalid
+        requests raise a ValueError, and a failed render raises what the worker raised.
+        '''
+        start = time.perf_counter()
+
+        if image_format not in FORMATS:
+            raise ValueError("Unknown format %s, expected one of %s" % (image_format, ", ".join(FORMATS)))
+
+        try:
+            iterations = lsysobj["settings"]["iterations"]
+        except (KeyError, TypeError):
+            raise ValueError("The lsystem object has no settings.iterations")
+
+        if iterations > self.max_iterations:
+            raise ValueError("%d iterations is over the limit of %d" % (iterations, self.max_iterations))
+
+        #Bushy rules expand to billions of symbols well within the iterations limit
+        length = get_expanded_length(lsysobj)
+        if length > self.max_length:
+            raise ValueError("The lsystem expands to %d symbols, over the limit of %d" % (length, self.max_length))
+
+        if not all(0 < length <= self.max_size for length in size):
+            raise ValueError("Canvas size %dx%d is out of the range 1-%d" % (size[0], size[1], self.max_size))
+
+        if not (math.isfinite(scale) and scale > 0):
+            raise ValueError("Scale %s has to be a positive number" % scale)
+
+        pixels = math.ceil(size[0] * scale) * math.ceil(size[1] * scale)
+        if image_format == "png" and pixels > self.max_pixels:
+            raise ValueError("%d pixel image is over the limit of %d" % (pixels, self.max_pixels))
+
+        key = get_request_key(lsysobj, image_format, size, scale)
+
+        with self._lock:
+            self._counters["requests"] += 1
+
+            data = self._cache.get(key, None)
+            if data != None:
+                self._cache.move_to_end(key)
+                self._counters["cache_hits"] += 1
+                self._latencies.append(time.perf_counter() - start)
+                return (key, data)
+
+            future = self._in_flight.get(key, None)
+            if future == None:
+                future = self._submit(render_lsystem_object, lsysobj, image_format, size, scale)
+                executor = self._executor
+                self._in_flight[key] = future
+                future.add_done_callback(lambda future: self._on_render_done(key, future, start, executor))
+            else:
+                self._counters["coalesced"] += 1
+
+            self._waiting += 1
+
+        try:
+            data = future.result()
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+        with self._lock:
+            self._latencies.append(time.perf_counter() - start)
+
+        return (key, data)
+
+    def get_metrics(self):
+        '''
+        Returns the service's counters, queue depth, cache usage and latencies as a dict.
+        '''
+        with self._lock:
+            return {
+                "requests" : self._counters["requests"],
+                "cache_hits" : self._counters["cache_hits"],
+                "coalesced" : self._counters["coalesced"],
+                "rendered" : self._counters["rendered"],
+                "errors" : self._counters["errors"],
+                "pool_restarts" : self._counters["pool_restarts"],
+                "workers" : self._workers,
+                "in_flight" : len(self._in_flight),
+                "queue_depth" : max(0, len(self._in_flight) - self._workers),
+                "waiting_requests" : self._waiting,
+                "cache_entries" : len(self._cache),
+                "cache_bytes" : self._cache_bytes,
+                "latency_ms" : get_percentiles(self._latencies),
+                "render_latency_ms" : get_percentiles(self._render_latencies)
+            }
+
+    def close(self):
+        self._executor.shutdown(cancel_futures = True)
+
+    def _submit(self, *args):
+        #Called holding the lock. A worker dying (e.g. killed for running out of memory)
+        #breaks the whole pool, so every later submit would fail until it's replaced
+        try:
+            return self._executor.submit(*args)
+        except concurrent.futures.process.BrokenProcessPool:
+            self._replace_executor(self._executor)
+            return self._executor.submit(*args)
+
+    def _replace_executor(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._counters["pool_restarts"] += 1
+                self._executor = concurrent.futures.ProcessPoolExecutor(self._workers)
+                executor.shutdown(wait = False, cancel_futures = True)
+
+    def _on_render_done(self, key, future, start, executor):
+        #Cache the result before it's no longer in flight, so no request renders it again in between
+        with self._lock:
+            if future.cancelled() or future.exception() != None:
+                self._counters["errors"] += 1
+
+                if isinstance(future.exception(), concurrent.futures.process.BrokenProcessPool):
+                    self._replace_executor(executor)
+            else:
+                data = future.result()
+                self._counters["rendered"] += 1
+                self._render_latencies.append(time.perf_counter() - start)
+
+                if len(data) <= self.cache_size:
+                    self._cache[key] = data
+                    self._cache_bytes += len(data)
+
+                #Evict least recently used first
+                while self._cache_bytes > self.cache_size:
+                    self._cache_bytes -= len(self._cache.popitem(last = False)[1])
+
+            self._in_flight.pop(key, None)
+
+class RenderRequestHandler(http.server.BaseHTTPRequestHandler):
+    '''
+    Serves POST /render and GET /metrics with the server's RenderService.
+    '''
+
+    def do_GET(self):
+        if urllib.parse.urlparse(self.path).path != "/metrics":
+            self.send_error(404)
+            return
+
+        self._send(200, "application/json", json.dumps(self.server.service.get_metrics()).encode("utf-8"))
+
+    def do_POST(self):
+        url = urllib.parse.urlparse(self.path)
+        if url.path != "/render":
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        if length > MAX_REQUEST_SIZE:
+            self.send_error(413)
+            return
+
+        try:
+            query = urllib.parse.parse_qs(url.query)
+            image_format = query.get("format", ["png"])[0]
+            size = (int(query.get("width", [headless.CANVAS_WIDTH])[0]),
+                int(query.get("height", [headless.CANVAS_HEIGHT])[0]))
+            scale = float(query.get("scale", [1])[0])
+            lsysobj = json.loads(self.rfile.read(length))
+
+            key, data = self.server.service.render(lsysobj, image_format, size, scale)
+
+        except (ValueError, KeyError, TypeError) as e:
+            #Also covers malformed json and lsystem objects the worker couldn't read
+            self._send(400, "text/plain", ("Invalid request: %s\n" % e).encode("utf-8"))
+            return
+
+        except Exception as e:
+            self._send(500, "text/plain", ("Render failed: %s\n" % e).encode("utf-8"))
+            return
+
+        self._send(200, FORMATS[image_format], data, {"ETag" : '"%s"' % key})
+
+    def _send(self, status, content_type, body, headers = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+def create_server(host = "127.0.0.1", port = 8765, service = None):
+    '''
+    Returns a threaded HTTP server serving the given RenderService
+    (a new one by default). Every request is handled in its own thread.
+    '''
+    server = http.server.ThreadingHTTPServer((host, port), RenderRequestHandler)
+    server.service = service if service != None else RenderService()
+    return server
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Serve l-system renders over HTTP")
+    parser.add_argument("--host", default = "127.0.0.1", help = "defaults to localhost only")
+    parser.add_argument("--port", type = int, default = 8765)
+    parser.add_argument("--workers", type = int, default = None, help = "render processes, defaults to the cpu count")
+    parser.add_argument("--cache-size", type = int, default = 1 << 28, help = "result cache size in bytes")
+    parser.add_argument("--max-iterations", type = int, default = 12, help = "requests over this are refused")
+    parser.add_argument("--max-length", type = int, default = 1 << 24, 
+        help = "requests expanding to more symbols than this are refused")
+    parser.add_argument("--max-size", type = int, default = 8192, help = "largest canvas width & height accepted")
+    parser.add_argument("--max-pixels", type = int, default = 1 << 26, help = "largest png image, in pixels, accepted")
+    args = parser.parse_args(argv)
+
+    server = create_server(args.host, args.port, RenderService(args.workers, args.cache_size, args.max_iterations,
+        args.max_size, args.max_pixels, args.max_length))
+    print("Serving on http://%s:%d" % server.server_address[:2])
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,678 @@
+'''
+Holds the sharded renderer, tracing a single large l-system on several worker
+processes, possibly on other machines, that are connected to over sockets.
+
+The coordinator expands the top of the derivation until it has enough symbols,
+and uses the PowerLSystem length tables to cut them into runs whose subtrees
+expand to about equally long parts of the final string. Every worker is sent
+the rules, a run with the amount of iterations left, and the turtle state the
+part starts from, so it expands and traces only its own part. The returned
+segment columns are joined in order, giving the segments trace_lsystem would.
+
+The coordinator finds the state every part starts from without expanding it,
+from TurtleTransforms of the subtrees (see TransformTable). Only runs whose
+transforms don't compose are expanded and walked at the coordinator.
+
+Only deterministic context free rules can be sharded, like PowerLSystem.
+
+Workers unpickle what they're sent, so they only accept coordinators knowing the
+key in LSYSTEM_SHARD_KEY. A worker started without it makes a random key and
+prints it, and local workers get a random key of their own.
+
+Can be run from the command line:
+py sharding.py worker [--host HOST] [--port PORT]
+py sharding.py render <lsystem json> <output file> (--workers HOST:PORT,... | --local N) [--shards N]
+    [--iterations N] [--width W] [--height H] [--scale S]
+'''
+
+import argparse
+import array
+import collections
+import math
+import multiprocessing
+import multiprocessing.connection
+import os
+import queue
+import secrets
+import threading
+import geometry
+import headless
+import lsystem as lsys
+import lsysfilehandler as fh
+import utilities as util
+
+DEFAULT_PORT = 8766
+
+#Workers only accept connections knowing the key, set LSYSTEM_SHARD_KEY on every machine
+AUTHKEY = os.environ["LSYSTEM_SHARD_KEY"].encode("utf-8") if os.environ.get("LSYSTEM_SHARD_KEY") else None
+
+#Chars a number read after a symbol is made of
+NUMBER_CHARS = set("0123456789.")
+
+#Ops reading the number after their symbol, when it's not parametric
+VALUE_OPS = ("color_up", "color_down", "color_set", "thickness_up", "thickness_down", "thickness_set", "multiply_step")
+
+#The top of the derivation is expanded until it has this many symbols per shard to balance
+SYMBOLS_PER_SHARD = 16
+
+#Chars after a part sent along with it, for reading the value of the part's last symbol
+LOOKAHEAD_LENGTH = 64
+
+#A part of the final string: run expanded depth times, starting at offset of the final string
+Shard = collections.namedtuple("Shard", ["run", "depth", "offset", "length"])
+
+def split_derivation(axiom, rules, iterations, shard_count):
+    '''
+    Returns a list of at most shard_count Shards covering the state of the
+    l-system after the given amount of iterations, in order.
+    '''
+    power = lsys.PowerLSystem(axiom, rules)
+    lsystem = lsys.LSystem(axiom, rules)
+
+    #Expand the top of the derivation, its every symbol is the root of a subtree
+    while lsystem.generation < iterations and len(lsystem.current_state) < shard_count * SYMBOLS_PER_SHARD:
+        next(lsystem)
+
+    top = lsystem.current_state
+    depth = iterations - lsystem.generation
+    lengths = {char : power.get_length(depth, char) for char in set(top)}
+    total = sum(lengths[char] for char in top)
+
+    #Cut where the expanded length passes the next multiple of total / shard_count
+    shards = []
+    start = 0
+    offset = 0
+    length = 0
+    for index, char in enumerate(top):
+        length += lengths[char]
+
+        if (offset + length) * shard_count >= total * (len(shards) + 1) or index == len(top) - 1:
+            shards.append(Shard(top[start:index + 1], depth, offset, length))
+            start = index + 1
+            offset += length
+            length = 0
+
+    return shards
+
+def get_shard_string(shard, rules):
+    return "".join(lsys.PowerLSystem(shard.run, rules).iter_blocks(shard.depth))
+
+def get_shard_prefix(shard, rules, length):
+    return lsys.PowerLSystem(shard.run, rules).get_state(shard.depth).get_prefix(length)
+
+#What drawing a bracket balanced subtree does to the turtle, relative to the state it
+#starts from: the position in a frame at the start angle, scaled by the start step
+#length, and the change of angle & step length. color_num and thickness are tuples
+#(is absolute, value), color the color_num the color was last set from (None if
+#it wasn't) and directions_flipped the end value for the start value it was made for
+TurtleTransform = collections.namedtuple("TurtleTransform", 
+    ["x", "y", "angle", "step_factor", "directions_flipped", "color_num", "color", "thickness"])
+
+class Turtle:
+    '''
+    A turtle whose state is either absolute, made from a TurtleState, or relative to
+    the state a subtree starts from, for finding the subtree's TurtleTransform.
+    '''
+
+    def __init__(self, x, y, angle, step_length, directions_flipped, color_num, color, thickness, stack):
+        self.x = x
+        self.y = y
+        self.angle = angle
+        self.step_length = step_length
+        self.directions_flipped = directions_flipped
+        self.color_num = color_num
+        self.color = color
+        self.thickness = thickness
+        self.stack = stack
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(state.x, state.y, state.angle, state.step_length, state.directions_flipped,
+            (True, state.color_num), None, (True, state.thickness),
+            [(x, y, angle, (True, color_num), step_length, flipped) 
+                for x, y, angle, color_num, step_length, flipped in state.stack])
+
+    @classmethod
+    def relative(cls, directions_flipped):
+        return cls(0.0, 0.0, 0.0, 1.0, directions_flipped, (False, 0), None, (False, 0), [])
+
+    def to_state(self, color, colors):
+        '''
+        Returns the absolute turtle as a TurtleState, color being the color it started with.
+        '''
+        if self.color != None:
+            color = lsys.get_new_color(self.color[1], colors) if len(colors) > 1 else colors[0]
+
+        return lsys.TurtleState(self.x, self.y, self.angle, self.color_num[1], color, self.thickness[1],
+            self.step_length, self.directions_flipped,
+            tuple((x, y, angle, color_num[1], step_length, flipped) 
+                for x, y, angle, color_num, step_length, flipped in self.stack))
+
+    def to_transform(self):
+        return TurtleTransform(self.x, self.y, self.angle, self.step_length, self.directions_flipped, 
+            self.color_num, self.color, self.thickness)
+
+    def apply(self, transform):
+        '''
+        Moves the turtle the way drawing the subtree of the TurtleTransform would.
+        '''
+        radians = self.angle * math.pi / 180
+        cos = math.cos(radians)
+        sin = math.sin(radians)
+
+        self.x += self.step_length * (cos * transform.x - sin * transform.y)
+        self.y += self.step_length * (sin * transform.x + cos * transform.y)
+        self.angle = (self.angle + transform.angle) % 360
+        self.step_length *= transform.step_factor
+        self.directions_flipped = transform.directions_flipped
+
+        if transform.color != None:
+            self.color = _add_number(self.color_num, transform.color, 256)
+        self.color_num = _add_number(self.color_num, transform.color_num, 256)
+        self.thickness = _add_number(self.thickness, transform.thickness)
+
+    def do_op(self, op, char, value, symbols, turn_angle, start_thickness, multiple_colors, start_color_num):
+        '''
+        Does the op of a symbol the way trace_from_state does, except saving & loading states.
+        '''
+        name = op[0]
+
+        if name == "move_down" or name == "move_up":
+            new_pos = lsys.get_new_position(self.x, self.y, self.angle, self.step_length)
+            self.x = new_pos[0]
+            self.y = new_pos[1]
+
+        elif name == "turn_right" or name == "turn_left":
+            if (name == "turn_right") != self.directions_flipped:
+                self.angle = (self.angle + turn_angle) % 360
+            else:
+                self.angle = (self.angle - turn_angle) % 360
+
+        elif name == "color_up" or name == "color_down":
+            if multiple_colors:
+                amount = symbols.get(char)[1] if value == None else value
+                self.color_num = _add_number(self.color_num, (False, amount if name == "color_up" else -amount), 256)
+                self.color = self.color_num
+
+        elif name == "color_set":
+            #Like trace_from_state, doesn't update the color
+            if multiple_colors:
+                self.color_num = (True, value if value != None else start_color_num)
+
+        elif name == "thickness_up" or name == "thickness_down":
+            amount = symbols.get(char)[1] if value == None else value
+            self.thickness = _add_number(self.thickness, (False, amount if name == "thickness_up" else -amount))
+
+        elif name == "thickness_set":
+            self.thickness = (True, value if value != None else start_thickness)
+
+        elif name == "multiply_step":
+            self.step_length *= symbols.get(char)[1] if value == None else value
+
+        elif name == "switch_directions":
+            self.directions_flipped = not self.directions_flipped
+
+    def push(self):
+        self.stack.append((self.x, self.y, self.angle, self.color_num, self.step_length, self.directions_flipped))
+
+    def pop(self):
+        self.x, self.y, self.angle, self.color_num, self.step_length, self.directions_flipped = self.stack.pop()
+        self.color = self.color_num
+
+def _add_number(number, change, modulo = None):
+    #Numbers are (is absolute, value) tuples, an absolute change replaces the number
+    if change[0]:
+        return change
+
+    value = number[1] + change[1]
+    return (number[0], value % modulo if modulo != None else value)
+
+class TransformTable:
+    '''
+    Finds the TurtleTransforms of symbols expanded a given amount of times, for the
+    draw arguments of an l-system, without expanding them.
+
+    The transform of a symbol is composed from the transforms of its successor's
+    symbols one expansion less, and kept. A subtree has no transform if it isn't
+    bracket balanced, or if the number read after one of its symbols may go on
+    after the subtree. Moves & turns don't read numbers unless parametric.
+    '''
+
+    def __init__(self, rules, symbols, turn_angle, start_thickness, colors, start_color_num):
+        self.table = lsys.get_successor_table(rules)
+        self.symbols = symbols
+        self.turn_angle = turn_angle
+        self.start_thickness = start_thickness
+        self.multiple_colors = len(colors) > 1
+        self.start_color_num = start_color_num
+        self._transforms = {}
+        self._first_chars = {}
+
+    def get(self, char, depth, directions_flipped, following = None):
+        '''
+        Returns the TurtleTransform of char, a symbol with a rule, expanded depth (at
+        least 1) times, starting with the given directions_flipped and followed by
+        following (see walk), or None if it has none.
+        '''
+        #Any char that's not part of a number ends one the same way
+        if following and following not in NUMBER_CHARS:
+            following = " "
+
+        key = (char, depth, directions_flipped, following)
+
+        if key not in self._transforms:
+            turtle = Turtle.relative(directions_flipped)
+            balanced = self.walk(turtle, self.table[ord(char)], depth - 1, following) and not turtle.stack
+            self._transforms[key] = turtle.to_transform() if balanced else None
+
+        return self._transforms[key]
+
+    def get_first_char(self, string, depth):
+        '''
+        Returns the first char of string expanded depth times, "" if it expands to nothing.
+        '''
+        for char in string:
+            key = (char, depth)
+            if key not in self._first_chars:
+                self._first_chars[key] = char if self._is_leaf(char, depth) else self.get_first_char(
+                    self.table[ord(char)], depth - 1)
+
+            if self._first_chars[key]:
+                return self._first_chars[key]
+
+        return ""
+
+    def walk(self, turtle, string, depth, following = None):
+        '''
+        Moves the turtle the way drawing string expanded depth times would, following
+        being the first char after it ("" at the end, None if unknown). Returns False,
+        leaving the turtle partly moved, if a subtree's transform is needed and it has none.
+        '''
+        for index, char in enumerate(string):
+            if not self._is_leaf(char, depth):
+                #A number read at the end of the subtree may go on in what follows it
+                next_char = self.get_first_char(string[index + 1:], depth)
+                transform = self.get(char, depth, turtle.directions_flipped, next_char or following)
+                if transform == None:
+                    return False
+                turtle.apply(transform)
+                continue
+
+            op = self.symbols.get(char, None)
+            if op == None:
+                continue
+
+            if op[0] == "state_save":
+                turtle.push()
+                continue
+
+            if op[0] == "state_load":
+                if not turtle.stack:
+                    return False
+                turtle.pop()
+                continue
+
+            value = None
+            if op[0] in VALUE_OPS:
+                found, value = self._read_value(string, index, depth, following)
+                if not found:
+                    return False
+
+            self._do_op(turtle, char, op, value)
+
+        return True
+
+    def _is_leaf(self, char, depth):
+        return depth == 0 or ord(char) not in self.table
+
+    def _do_op(self, turtle, char, op, value):
+        if op != None:
+            turtle.do_op(op, char, value, self.symbols, self.turn_angle, self.start_thickness, 
+                self.multiple_colors, self.start_color_num)
+
+    def _read_value(self, string, index, depth, following):
+        #Returns (whether the value is known, value) of the symbol at index, like
+        #try_get_number_from_str would read it from the expanded string
+        text = string[index]
+
+        for char in string[index + 1:]:
+            if not self._is_leaf(char, depth):
+                char = self.get_first_char(char, depth)
+                if char == "":
+                    continue
+                if char in NUMBER_CHARS:
+                    return (False, None)
+
+            text += char
+            if char not in NUMBER_CHARS:
+                return (True, util.try_get_number_from_str(text, 0))
+
+        if following == None or following in NUMBER_CHARS:
+            return (False, None)
+
+        return (True, util.try_get_number_from_str(text + following, 0))
+
+def trace_shard(job):
+    '''
+    Expands and traces the shard of a job (as sent by ShardCoordinator) and returns
+    the segments as a tuple (column bytes by name, color table, color index bytes).
+    Runs on the workers.
+    '''
+    shard = job["shard"]
+    text = get_shard_string(shard, job["rules"])
+    symbols, _, _, turn_angle, _, thickness, colors, start_color = job["draw_arguments"]
+
+    segments = lsys.trace_from_state(text + job["lookahead"], symbols, job["state"], turn_angle,
+        thickness, colors, start_color, end = len(text), index_offset = shard.offset)
+
+    color_table = {}
+    color_indices = array.array("q")
+    columns = geometry.trace_to_columns(_record_colors(segments, color_table, color_indices))
+
+    return ({name : column.tobytes() for name, column in columns.columns.items()}, list(color_table),
+        color_indices.tobytes())
+
+def _record_colors(segments, color_table, color_indices):
+    #Colors are strings, so they're sent as indices to a table of the colors used
+    for segment in segments:
+        color_indices.append(color_table.setdefault(segment.color, len(color_table)))
+        yield segment
+
+def serve_worker(host = "127.0.0.1", port = DEFAULT_PORT, authkey = None, ready = None):
+    '''
+    Serves trace_shard jobs to coordinators connecting to (host, port), each connection
+    in its own thread, until interrupted. ready, if given, is a multiprocessing
+    Connection the bound address is sent to once the worker's listening.
+
+    The key defaults to LSYSTEM_SHARD_KEY, raising a ValueError if it isn't set.
+    '''
+    if authkey == None:
+        authkey = get_authkey()
+
+    with multiprocessing.connection.Listener((host, port), authkey = authkey) as listener:
+        if ready != None:
+            ready.send(listener.address)
+
+        while True:
+            connection = listener.accept()
+            threading.Thread(target = _serve_connection, args = (connection,), daemon = True).start()
+
+def _serve_connection(connection):
+    with connection:
+        while True:
+            try:
+                job = connection.recv()
+            except EOFError:
+                return
+
+            try:
+                connection.send(("segments", trace_shard(job)))
+            except Exception as e:
+                connection.send(("error", "%s: %s" % (type(e).__name__, e)))
+
+def get_authkey():
+    '''
+    Returns the key in LSYSTEM_SHARD_KEY, raising a ValueError if it isn't set.
+    '''
+    if AUTHKEY == None:
+        raise ValueError("Set LSYSTEM_SHARD_KEY to the key the workers print, or to a secret key "
+            "of your own, anyone knowing the key can run code on the workers")
+
+    return AUTHKEY
+
+def create_authkey():
+    '''
+    Returns a random key as a tuple (key, its text to set LSYSTEM_SHARD_KEY to).
+    '''
+    text = secrets.token_hex(32)
+    return (text.encode("utf-8"), text)
+
+def start_local_workers(count, authkey):
+    '''
+    Starts count worker processes listening on free localhost ports, accepting the given
+    key (e.g. from create_authkey). Returns a tuple (list of processes, list of addresses).
+    '''
+    processes = []
+    addresses = []
+
+    for _ in range(count):
+        receiver, sender = multiprocessing.Pipe(duplex = False)
+        process = multiprocessing.Process(target = serve_worker, args = ("127.0.0.1", 0, authkey, sender), daemon = True)
+        process.start()
+        processes.append(process)
+        addresses.append(receiver.recv())
+
+    return (processes, addresses)
+
+class ShardCoordinator:
+    '''
+    Traces l-systems on the workers listening at the given (host, port) addresses,
+    with the given key (defaults to LSYSTEM_SHARD_KEY, raising a ValueError if it isn't set).
+
+    The turtle state every part starts from is found by applying the TurtleTransforms
+    of the previous part's symbols, and a part is sent to the next free worker as
+    soon as it's known. Parts whose transforms don't compose are expanded and walked.
+    A part a worker had when it failed is left to the other workers.
+    '''
+
+    def __init__(self, addresses, authkey = None):
+        self.addresses = addresses
+        self.authkey = authkey if authkey != None else get_authkey()
+
+    def trace(self, lsysobj, size = (headless.CANVAS_WIDTH, headless.CANVAS_HEIGHT),
+                iterations = None, shard_count = None):
+        '''
+        Returns the segments of the lsystem object, on a canvas of the given size, as a
+        tuple (geometry.SegmentColumns, color of every segment). Defaults to the object's
+        own iterations and four shards per worker.
+        '''
+        if iterations == None:
+            iterations = lsysobj["settings"]["iterations"]
+
+        if shard_count == None:
+            shard_count = 4 * len(self.addresses)
+
+        rules = fh.get_rules(lsysobj)
+        draw_arguments = fh.get_draw_arguments(lsysobj)
+        symbols, start_pos, start_angle, turn_angle, start_step, thickness, colors, start_color = draw_arguments
+
+        shards = split_derivation(lsysobj["settings"]["axiom"], rules, iterations, shard_count)
+        transforms = TransformTable(rules, symbols, turn_angle, thickness, colors, start_color)
+        results = [None] * len(shards)
+        errors = []
+        jobs = queue.Queue()
+
+        #Notified as parts are traced and workers stop, running counts the workers left
+        finished = threading.Condition()
+        running = [len(self.addresses)]
+
+        threads = [threading.Thread(target = self._run_worker, args = (address, jobs, results, errors, finished, running),
+            daemon = True) for address in self.addresses]
+        for thread in threads:
+            thread.start()
+
+        try:
+            state = lsys.get_start_state(size, start_pos, start_angle, start_step, thickness, colors, start_color)
+            lookahead = get_shard_prefix(shards[0], rules, LOOKAHEAD_LENGTH) if shards else ""
+
+            for index, shard in enumerate(shards):
+                following = lookahead
+                lookahead = get_shard_prefix(shards[index + 1], rules, LOOKAHEAD_LENGTH) if index + 1 < len(shards) else ""
+
+                jobs.put((index, {
+                    "shard" : shard,
+                    "rules" : rules,
+                    "draw_arguments" : draw_arguments,
+                    "state" : state,
+                    "lookahead" : lookahead
+                }))
+
+                if index + 1 < len(shards):
+                    state = self._find_next_state(shard, state, lookahead, index + 2 < len(shards), rules, 
+                        transforms, draw_arguments)
+
+            #Wait for every part, or for every worker to fail
+            with finished:
+                finished.wait_for(lambda: all(result != None for result in results) or running[0] == 0)
+
+        finally:
+            for _ in threads:
+                jobs.put(None)
+            for thread in threads:
+                thread.join()
+
+        if any(result == None for result in results):
+            raise RuntimeError("Not every shard was traced, no worker was left: %s" % "; ".join(errors))
+
+        return self._merge(results)
+
+    def _find_next_state(self, shard, state, lookahead, has_more, rules, transforms, draw_arguments):
+        #The first char after the part, unknown if the next part expands to nothing
+        following = lookahead[:1] if lookahead or not has_more else None
+
+        turtle = Turtle.from_state(state)
+        if transforms.walk(turtle, shard.run, shard.depth, following):
+            return turtle.to_state(state.color, draw_arguments[6])
+
+        #Expand and walk the part
+        symbols, _, _, turn_angle, _, thickness, colors, start_color = draw_arguments
+        text = get_shard_string(shard, rules)
+        return _get_end_state(lsys.trace_from_state(text + lookahead, symbols, state, turn_angle,
+            thickness, colors, start_color, end = len(text)))
+
+    def _run_worker(self, address, jobs, results, errors, finished, running):
+        connection = None
+        job = None
+
+        try:
+            connection = multiprocessing.connection.Client(address, authkey = self.authkey)
+
+            while True:
+                job = jobs.get()
+                if job == None:
+                    return
+
+                index, message = job
+                connection.send(message)
+                results[index] = connection.recv()
+                job = None
+
+                with finished:
+                    finished.notify_all()
+
+        except (OSError, EOFError, multiprocessing.AuthenticationError, ValueError) as e:
+            #Leave the part in hand and the remaining ones to the other workers
+            if job != None:
+                jobs.put(job)
+            errors.append("Worker %s:%d failed: %s" % (address[0], address[1], e))
+
+        finally:
+            if connection != None:
+                connection.close()
+
+            with finished:
+                running[0] -= 1
+                finished.notify_all()
+
+    def _merge(self, results):
+        columns = geometry.SegmentColumns()
+        segment_colors = []
+
+        for result in results:
+            if result[0] == "error":
+                raise RuntimeError(result[1])
+
+            column_bytes, color_table, color_indices = result[1]
+            for name, column in columns.columns.items():
+                column.frombytes(column_bytes[name])
+
+            indices = array.array("q")
+            indices.frombytes(color_indices)
+            segment_colors.extend(color_table[color_index] for color_index in indices)
+
+        return (columns, segment_colors)
+
+def _get_end_state(walk):
+    while True:
+        try:
+            next(walk)
+        except StopIteration as stop:
+            return stop.value
+
+def iter_segments(columns, segment_colors):
+    '''
+    Yields the joined segment columns as lsystem.Segments, for the exporters.
+    '''
+    values = [columns.columns[name] for name in ("x0", "y0", "x1", "y1", "width")]
+    for x0, y0, x1, y1, width, color, color_num, depth, index in zip(*values, segment_colors,
+            columns.columns["color_num"], columns.columns["depth"], columns.columns["symbol_index"]):
+        yield lsys.Segment(x0, y0, x1, y1, width, color, color_num, depth, index)
+
+def main(argv = None):
+    import exporters as ex
+
+    parser = argparse.ArgumentParser(description = "Trace an l-system on several worker processes")
+    commands = parser.add_subparsers(dest = "command", required = True)
+
+    worker_parser = commands.add_parser("worker", help = "serve shards to coordinators")
+    worker_parser.add_argument("--host", default = "127.0.0.1")
+    worker_parser.add_argument("--port", type = int, default = DEFAULT_PORT)
+
+    render_parser = commands.add_parser("render", help = "render a file on workers")
+    render_parser.add_argument("input", help = "l-system json file")
+    render_parser.add_argument("output", help = "svg, png or npz file to write")
+    render_parser.add_argument("--workers", default = None, help = "comma separated worker host:port addresses")
+    render_parser.add_argument("--local", type = int, default = None, help = "start this many local workers instead")
+    render_parser.add_argument("--shards", type = int, default = None, help = "defaults to four per worker")
+    render_parser.add_argument("--iterations", type = int, default = None, help = "defaults to the file's iterations")
+    render_parser.add_argument("--width", type = int, default = headless.CANVAS_WIDTH)
+    render_parser.add_argument("--height", type = int, default = headless.CANVAS_HEIGHT)
+    render_parser.add_argument("--scale", type = float, default = 1, help = "png image size relative to the canvas size")
+    args = parser.parse_args(argv)
+
+    if args.command == "worker":
+        authkey = AUTHKEY
+        if authkey == None:
+            authkey, text = create_authkey()
+            print("LSYSTEM_SHARD_KEY isn't set, coordinators connect with LSYSTEM_SHARD_KEY=%s" % text)
+
+        print("Serving shards on %s:%d" % (args.host, args.port))
+        try:
+            serve_worker(args.host, args.port, authkey)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    processes = []
+    authkey = None
+    if args.local != None:
+        authkey, _ = create_authkey()
+        processes, addresses = start_local_workers(args.local, authkey)
+    elif args.workers != None:
+        addresses = [(address.rsplit(":", 1)[0], int(address.rsplit(":", 1)[1])) for address in args.workers.split(",")]
+        if AUTHKEY == None:
+            parser.error("Set LSYSTEM_SHARD_KEY to the key the workers print")
+    else:
+        parser.error("render needs --workers or --local")
+
+    try:
+        lsysobj = fh.load_lsystem(args.input)
+        size = (args.width, args.height)
+        columns, segment_colors = ShardCoordinator(addresses, authkey).trace(lsysobj, size, args.iterations, args.shards)
+
+        extension = os.path.splitext(args.output)[1].lower()
+        if extension == ".npz":
+            columns.save_npz(args.output)
+        elif extension == ".png":
+            ex.export_png(args.output, iter_segments(columns, segment_colors), size, args.scale)
+        else:
+            ex.export_svg(args.output, iter_segments(columns, segment_colors), size)
+
+        print("%d segments traced on %d workers" % (len(columns), len(addresses)))
+
+    finally:
+        for process in processes:
+            process.terminate()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+'''
+Holds the spatial index used to find segments by position.
+'''
+
+import bisect
+import math
+
+class SegmentGrid:
+    '''
+    A uniform grid spatial index of segments.
+
+    Every segment is stored once, and its index is added to every cell its
+    bounding box (grown by padding) overlaps. Cells keep the indices in
+    insertion order, so segments found through a cell are still in drawing order.
+    '''
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.segments = []
+        self.cells = {}
+
+    def insert(self, segment, padding = 0):
+        '''
+        Adds a segment (x0, y0, x1, y1, ...) to the grid and returns its index.
+        '''
+        index = len(self.segments)
+        self.segments.append(segment)
+
+        first_column, first_row, last_column, last_row = self._get_cell_range(
+            min(segment[0], segment[2]) - padding,
+            min(segment[1], segment[3]) - padding,
+            max(segment[0], segment[2]) + padding,
+            max(segment[1], segment[3]) + padding)
+
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                self.cells.setdefault((column, row), []).append(index)
+
+        return index
+
+    def get_cell(self, column, row):
+        '''
+        Returns the indices of the segments in the given cell, in drawing order.
+        '''
+        return self.cells.get((column, row), [])
+
+    def query(self, min_x, min_y, max_x, max_y):
+        '''
+        Returns the indices of the segments whose (padded) bounding box may overlap
+        the given rectangle, in drawing order.
+        '''
+        first_column, first_row, last_column, last_row = self._get_cell_range(min_x, min_y, max_x, max_y)
+
+        indices = set()
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                indices.update(self.cells.get((column, row), []))
+
+        return sorted(indices)
+
+    def _get_cell_range(self, min_x, min_y, max_x, max_y):
+        return (
+            math.floor(min_x / self.cell_size),
+            math.floor(min_y / self.cell_size),
+            math.floor(max_x / self.cell_size),
+            math.floor(max_y / self.cell_size))
+
+class SegmentPicker:
+    '''
+    Finds the segment drawn at a point, for hit testing lines on a canvas
+    without asking the canvas about its items.
+
+    Segments (lsystem.Segment) are recorded into a SegmentGrid while they're
+    drawn, so a pick only measures the distance to the few segments near the point.
+    '''
+
+    def __init__(self, cell_size = 16):
+        self.grid = SegmentGrid(cell_size)
+        self._symbol_indices = []
+
+    def __len__(self):
+        return len(self.grid.segments)
+
+    def add(self, segment):
+        self.grid.insert(segment, segment.thickness / 2)
+        self._symbol_indices.append(segment.index)
+
+    def record(self, segments):
+        '''
+        Yields the given segments, adding each of them to the picker.
+        '''
+        for segment in segments:
+            self.add(segment)
+            yield segment
+
+    def pick(self, x, y, tolerance = 3):
+        '''
+        Returns the segment at (x, y), give or take tolerance pixels, or None.
+        Of overlapping segments the one drawn last, on top, is picked.
+        '''
+        picked = None
+        picked_distance = None
+
+        for index in self.grid.query(x - tolerance, y - tolerance, x + tolerance, y + tolerance):
+            segment = self.grid.segments[index]
+            distance = get_point_segment_distance(x, y, segment) - segment.thickness / 2
+
+            if distance <= tolerance and (picked == None or distance <= picked_distance):
+                picked = segment
+                picked_distance = distance
+
+        return picked
+
+    def get_segments_between(self, start, end):
+        '''
+        Returns the segments drawn by the symbols from index start up to end.
+        '''
+        first = bisect.bisect_left(self._symbol_indices, start)
+        last = bisect.bisect_left(self._symbol_indices, end)
+        return self.grid.segments[first:last]
+
+def get_point_segment_distance(x, y, segment):
+    '''
+    Returns the distance from (x, y) to the nearest point of the segment (x0, y0, x1, y1, ...).
+    '''
+    x0, y0, x1, y1 = segment[0], segment[1], segment[2], segment[3]
+    dx = x1 - x0
+    dy = y1 - y0
+    length_squared = dx * dx + dy * dy
+
+    #Position of the nearest point along the segment, 0 at start and 1 at end
+    t = 0
+    if length_squared > 0:
+        t = min(1, max(0, ((x - x0) * dx + (y - y0) * dy) / length_squared))
+
+    return math.hypot(x - (x0 + t * dx), y - (y0 + t * dy))
@@ -122,9 +122,39 @@ op_conversion_dict = {
     "Load state" : "state_load"
 }
 
+#The symbols used when an l-system file's symbols are set to "defaults"
+default_symbols = [
+    ("F", "Move pen down"),
+    ("G", "Move pen up"),
+    ("+", "Turn right"),
+    ("-", "Turn left"),
+    ("!", "Switch turn directions"),
+    ("@", "Multiply step", 0.6),
+    ("[", "Save state"),
+    ("]", "Load state"),
+    ("<", "Color up", 1),
+    (">", "Color down", 1),
+    ("%", "Color set"),
+    ("(", "Thickness up", 1),
+    (")", "Thickness down", 1),
+    ("&", "Thickness set")
+]
+
 def get_op_code_from_readable_op(text_op):
     return op_conversion_dict[text_op]
 
+def symbols_list_to_dict(symbols):
+    '''
+    Takes in a list of symbol tuples (symbol, readable op, default value) where the
+    default value is optional, and returns the symbols dictionary draw_lsystem expects,
+    {symbol : (op code, default value)}
+    '''
+    dictionary = {}
+    for symbol in symbols:
+        dictionary[symbol[0]] = (op_conversion_dict[symbol[1]], symbol[2] if len(symbol) > 2 else None)
+    
+    return dictionary
+
 def normalized_to_canvas_coordinates(canvas_width, canvas_height, 
     min_coords, max_coords, coords):
         
@@ -8,6 +8,7 @@ import tkinter.colorchooser as colorchooser
 import tkinter.filedialog as filedialog
 import tkinter.ttk as ttk
 import utilities as util
+import base64
 import math 
 import os
 
@@ -233,6 +234,9 @@ class ColorPaletteOptions(tk.Frame):
                 fill = self._colors[index],
                 width = 0)
 
+        #Let listeners know the palette changed
+        self.event_generate("<<PaletteChanged>>")
+
     def remove_color_from_palette(self, index):
         self._colors.remove(self._colors[index])
 
@@ -302,11 +306,16 @@ class DrawingCanvas(tk.Canvas):
     '''
     The canvas widget for displaying the L-systems.
 
+    Drawings are made in world coordinates, a world_size (width, height) area that
+    doesn't change with the window. The world is shown scaled to fit the canvas and
+    centered, the view. When the canvas is resized every item is moved to the new view
+    with a single scale & move, and a <<ViewChanged>> event is generated.
+
     A lot of magic numbers are used to setup this widget because
     I haven't find a good way to update the positions before 
     initializing it.
     '''
-    def __init__(self, master=None, **kw):
+    def __init__(self, master=None, world_size = (805, 770), **kw):
         super().__init__(master=master, **kw)
 
         # x = 800, y = 766
@@ -314,17 +323,47 @@ class DrawingCanvas(tk.Canvas):
         self._FOREGROUND_COLOR = "#ffffff"
         self._SHADOW_COLOR = "#000000"
 
+        #World to view transform, view = world * view_scale + view_offset
+        self.world_size = world_size
+        self.view_scale = 1
+        self.view_offset = (0, 0)
+
         #Setup context option menu
         self.contextmenu = tk.Menu(self, tearoff = 0)
         self.contextmenu.add_command(label = "Clear canvas", command = self.on_contextmenu_clear_option_clicked)
 
         #Setup event bindings
         self.bind("<Button-3>", self.on_canvas_right_mouse_click)
+        self.bind("<Configure>", self.on_configure, add = "+")
 
         self.draw_coordination_help()
 
     def clear_canvas(self):
         self.delete(tk.ALL)
+
+    def draw_png(self, data, x = 0, y = 0, tags = None):
+        '''
+        Draws the given png image data with its top left corner at (x, y) of the view.
+        '''
+        #Keep a reference to the image, otherwise it's garbage collected
+        self._image = tk.PhotoImage(data = base64.b64encode(data))
+        self.create_image(x, y, anchor = tk.NW, image = self._image, tags = tags)
+
+    def to_view(self, x, y):
+        return (x * self.view_scale + self.view_offset[0], y * self.view_scale + self.view_offset[1])
+
+    def to_world(self, x, y):
+        return ((x - self.view_offset[0]) / self.view_scale, (y - self.view_offset[1]) / self.view_scale)
+
+    def get_view_segments(self, segments):
+        '''
+        Yields the given segments in world coordinates moved to the view,
+        as it is when each of them is yielded.
+        '''
+        for segment in segments:
+            x0, y0 = self.to_view(segment[0], segment[1])
+            x1, y1 = self.to_view(segment[2], segment[3])
+            yield segment._replace(x0 = x0, y0 = y0, x1 = x1, y1 = y1)
     
     def draw_coordination_help(self):
         '''
@@ -345,21 +384,29 @@ class DrawingCanvas(tk.Canvas):
 
         self.create_oval(
             400 - graphics_len, 383 - graphics_len, 400 + graphics_len, 383 + graphics_len,
-            outline = self._FOREGROUND_COLOR)
+            outline = self._FOREGROUND_COLOR,
+            tags = "help")
 
         self.create_line(
             400, 383, 400 + graphics_len, 383, 
             width = 1, 
-            fill = self._FOREGROUND_COLOR)
+            fill = self._FOREGROUND_COLOR,
+            tags = "help")
 
         self.create_line(
             400, 383 - graphics_len, 400, 383, 
             width = 1, 
-            fill = self._FOREGROUND_COLOR)
+            fill = self._FOREGROUND_COLOR,
+            tags = "help")
 
         self.__draw_text(400 + graphics_len + 12, 383, ("0°", 10, "normal"), False)
         self.__draw_text(400, 383 - graphics_len - 12, ("90°", 10, "normal"), False)
 
+        #Drawn in world coordinates, move to the view
+        self.scale("help", 0, 0, self.view_scale, self.view_scale)
+        self.move("help", self.view_offset[0], self.view_offset[1])
+        self.dtag("help", "help")
+
     def __draw_text(self, x, y, text_options, shadow = True):
         '''
         Draws text graphics to the canvas at the given x, y position.
@@ -375,17 +422,38 @@ class DrawingCanvas(tk.Canvas):
                 x + 3, y + 3, 
                 text = text_options[0], 
                 font = ("", text_options[1], text_options[2]),
-                fill = self._SHADOW_COLOR)
+                fill = self._SHADOW_COLOR,
+                tags = "help")
         
         self.create_text(
             x, y, 
             text = text_options[0], 
             font = ("", text_options[1], text_options[2]),
-            fill = self._FOREGROUND_COLOR)
+            fill = self._FOREGROUND_COLOR,
+            tags = "help")
 
     def on_canvas_right_mouse_click(self, event):
         self.contextmenu.tk_popup(event.x_root + 45, event.y_root + 11, 0)
         
     def on_contextmenu_clear_option_clicked(self):
         self.clear_canvas()
-        self.draw_coordination_help()
\ No newline at end of file
+        self.draw_coordination_help()
+
+    def on_configure(self, event):
+        #Skip the sizes the canvas has before it's mapped
+        if event.width < 2 or event.height < 2:
+            return
+
+        view_scale = min(event.width / self.world_size[0], event.height / self.world_size[1])
+        view_offset = (
+            (event.width - self.world_size[0] * view_scale) / 2,
+            (event.height - self.world_size[1] * view_scale) / 2)
+
+        #Move every item from the old view to the new one, without redrawing anything
+        ratio = view_scale / self.view_scale
+        self.scale(tk.ALL, 0, 0, ratio, ratio)
+        self.move(tk.ALL, view_offset[0] - self.view_offset[0] * ratio, view_offset[1] - self.view_offset[1] * ratio)
+
+        self.view_scale = view_scale
+        self.view_offset = view_offset
+        self.event_generate("<<ViewChanged>>")
\ No newline at end of file
@@ -0,0 +1,5 @@
+import os
+import sys
+
+#The modules are flat in src, imported the way the application imports them
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
@@ -0,0 +1,68 @@
+import os
+import pytest
+import exporters as ex
+import lsysfilehandler as fh
+
+LSYSTEMS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "lsystems")
+SIZE = (805, 770)
+
+def get_segments(name):
+    lsysobj = fh.load_lsystem(os.path.join(LSYSTEMS_DIR, name + ".json"))
+    lsystem = fh.create_lsystem(lsysobj)
+    for _ in range(lsysobj["settings"]["iterations"]):
+        next(lsystem)
+    return list(fh.trace_lsystem_object(SIZE, lsysobj, lsystem.current_state))
+
+def export_png(tmp_path, segments, name, **kwargs):
+    filepath = os.path.join(tmp_path, name)
+    ex.export_png(filepath, segments, SIZE, 0.5, tile_size = 64, **kwargs)
+    with open(filepath, "rb") as fp:
+        return fp.read()
+
+def test_png_is_the_same_on_any_amount_of_workers(tmp_path, monkeypatch):
+    segments = get_segments("koch-curve_color")
+    expected = export_png(tmp_path, segments, "serial.png", workers = 1)
+
+    assert export_png(tmp_path, segments, "pool.png", workers = 3) == expected
+
+    #A row of tiles over the limit is rendered one at a time
+    monkeypatch.setattr(ex, "MAX_PIXELS_IN_FLIGHT", 1)
+    assert export_png(tmp_path, segments, "capped.png", workers = 3) == expected
+
+def test_map_in_order_bounds_the_jobs_taken_ahead():
+    taken = []
+
+    def get_jobs():
+        for number in range(10):
+            taken.append(number)
+            yield (number,)
+
+    for number in ex.map_in_order(abs, get_jobs(), 2, 3):
+        assert len(taken) <= number + 3
+
+def read_tiles(directory):
+    tiles = {}
+    for root, _, files in os.walk(directory):
+        for name in files:
+            with open(os.path.join(root, name), "rb") as fp:
+                tiles[os.path.relpath(os.path.join(root, name), directory)] = fp.read()
+    return tiles
+
+def test_dzi_is_the_same_on_any_amount_of_workers_and_reruns_skip_it(tmp_path):
+    segments = get_segments("koch-curve_color")
+
+    serial = ex.export_dzi(os.path.join(tmp_path, "serial.dzi"), segments, SIZE, 0.5, workers = 1)
+    pool = ex.export_dzi(os.path.join(tmp_path, "pool.dzi"), segments, SIZE, 0.5, workers = 3)
+
+    assert serial == pool > 0
+    assert read_tiles(os.path.join(tmp_path, "serial_files")) == read_tiles(os.path.join(tmp_path, "pool_files"))
+    assert ex.export_dzi(os.path.join(tmp_path, "pool.dzi"), segments, SIZE, 0.5, workers = 3) == 0
+
+def test_dzi_of_other_settings_replaces_the_tiles(tmp_path):
+    segments = get_segments("koch-curve_color")
+    filepath = os.path.join(tmp_path, "image.dzi")
+    ex.export_dzi(filepath, segments, SIZE, 0.5, workers = 1)
+
+    rendered = ex.export_dzi(filepath, segments, SIZE, 0.25, workers = 1)
+
+    assert rendered == len(read_tiles(os.path.join(tmp_path, "image_files"))) - 1
@@ -0,0 +1,296 @@
+import collections
+import itertools
+import multiprocessing
+import os
+import subprocess
+import sys
+import pytest
+import lsystem as lsys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+DETERMINISTIC_RULES = [("F", "F+F-F-F+F"), ("G", "GG")]
+STOCHASTIC_RULES = [("F", [("F[+F]F", 1), ("F[-F]", 2), ("FF", 0.5)]), ("G", "G-F")]
+
+def expand(lsystem, iterations):
+    for _ in range(iterations):
+        next(lsystem)
+    return lsystem.current_state
+
+@pytest.mark.parametrize("rules", [DETERMINISTIC_RULES, STOCHASTIC_RULES])
+def test_rewritten_length_is_the_length_rewritten(rules):
+    rewriter = lsys.RuleRewriter(rules, 7)
+    state = expand(lsys.LSystem("FG", rules, 7), 4)
+
+    for start, end in [(0, len(state)), (3, 40), (17, len(state))]:
+        chunk = state[start:end]
+        assert rewriter.get_rewritten_length(chunk.encode("ascii"), 4, start) == len(rewriter.rewrite(chunk, 4, start))
+
+@pytest.mark.parametrize("rules", [DETERMINISTIC_RULES, STOCHASTIC_RULES])
+def test_next_parallel_is_next(rules):
+    lsystem = lsys.LSystem("FG", rules, 3)
+
+    with multiprocessing.Pool(2) as pool:
+        for _ in range(6):
+            lsystem.next_parallel(pool, chunk_size = 100)
+
+    assert lsystem.current_state == expand(lsys.LSystem("FG", rules, 3), 6)
+    assert lsystem.generation == 6
+
+@pytest.mark.parametrize("method", multiprocessing.get_all_start_methods())
+def test_next_parallel_leaves_no_shared_memory_warnings(method):
+    script = (
+        "import multiprocessing, lsystem as lsys\n"
+        "if __name__ == '__main__':\n"
+        "    lsystem = lsys.LSystem('F', %r)\n"
+        "    with multiprocessing.get_context(%r).Pool(2) as pool:\n"
+        "        for _ in range(5):\n"
+        "            lsystem.next_parallel(pool, chunk_size = 100)\n") % (STOCHASTIC_RULES, method)
+
+    result = subprocess.run([sys.executable, "-c", script], cwd = SRC_DIR, capture_output = True, text = True, 
+        timeout = 120)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stderr == ""
+
+def rewrite_naively(string, rules, seed, generation):
+    return "".join(output for _, _, output, _ in get_parts_naively(string, rules, seed, generation))
+
+def get_parts_naively(string, rules, seed, generation):
+    #Tries every rule at every position, longest match (contexts included) first, then rule order.
+    #Returns (start, length, output, matched) parts
+    ranked = sorted(enumerate(rules), key = lambda rule: (-len(rule[1][0]) - len(rule[1][1].left) - len(rule[1][1].right), 
+        rule[0]))
+    parts = []
+    position = 0
+
+    while position < len(string):
+        for _, (var, rule) in ranked:
+            if (string.startswith(var, position) and position >= len(rule.left) and 
+                    string[position - len(rule.left):position] == rule.left and 
+                    string.startswith(rule.right, position + len(var))):
+                successor = rule.successor
+                if not isinstance(successor, str):
+                    successor = lsys.pick_successor(*lsys.get_weighted_successors(var, successor), seed, generation, position)
+                parts.append((position, len(var), successor, True))
+                position += len(var)
+                break
+        else:
+            parts.append((position, 1, string[position], False))
+            position += 1
+
+    return parts
+
+def get_random_context_rules(random):
+    rules = []
+    for _ in range(random.randint(1, 6)):
+        var = "".join(random.choice("AB") for _ in range(random.randint(1, 2)))
+        successor = "".join(random.choice("AB+") for _ in range(random.randint(0, 3)))
+        if random.random() < 0.2:
+            successor = [(successor, 1), (successor + "A", 2)]
+        rule = lsys.ContextSuccessor(successor, "".join(random.choice("AB+") for _ in range(random.randint(0, 2))), 
+            "".join(random.choice("AB+") for _ in range(random.randint(0, 2))))
+
+        #Duplicate rules are joined, which the naive matcher doesn't do
+        if all((var, rule.left, rule.right) != (other_var, other.left, other.right) for other_var, other in rules):
+            rules.append((var, rule))
+
+    return rules
+
+def test_context_rewriter_matches_a_naive_matcher():
+    import random
+    random = random.Random(5)
+
+    for _ in range(300):
+        rules = get_random_context_rules(random)
+        string = "".join(random.choice("AB+") for _ in range(random.randint(0, 40)))
+        generation = random.randint(0, 5)
+
+        assert lsys.ContextRewriter(rules, 3).rewrite(string, generation) == rewrite_naively(string, rules, 3, generation)
+
+def test_context_sensitive_lsystem_expands_like_a_naive_matcher():
+    #Signal propagation, a B moves right along the As
+    rules = [("A", lsys.ContextSuccessor("B", "B", "")), ("B", lsys.ContextSuccessor("A", "", "")), 
+        ("AA", lsys.ContextSuccessor("A+A", "+", "B"))]
+    lsystem = lsys.LSystem("BAAAAA+AAB", rules)
+    state = lsystem.current_state
+
+    for generation in range(6):
+        state = rewrite_naively(state, rules, 0, generation)
+        assert next(lsystem) == state
+
+def test_context_rewriter_parts_cover_the_state():
+    rules = [("A", lsys.ContextSuccessor("AB", "B", "A")), ("BA", lsys.ContextSuccessor("", "", ""))]
+    string = "ABABAABBAAB"
+    parts = lsys.ContextRewriter(rules).get_parts(string, 0)
+
+    assert [part[0] for part in parts] == list(itertools.accumulate([0] + [part[1] for part in parts[:-1]]))
+    assert sum(part[1] for part in parts) == len(string)
+    assert all(string[start:start + length] == output for start, length, output, index in parts if index == None)
+
+def test_subtree_cache_only_expands_what_a_rule_edit_changed():
+    cache = lsys.SubtreeCache()
+    rules = [("A", "AB"), ("B", "C"), ("C", "C+")]
+    cache.set_rules(rules)
+    cache.expand("ABC", 6)
+
+    #A reaches C in two rewrites, so every A and B expansion of depth above one depends on it
+    edited_rules = [("A", "AB"), ("B", "C"), ("C", "-C")]
+    cache.set_rules(edited_rules)
+    hits = cache.hit_count
+    state = cache.expand("ABC", 6)
+
+    assert state == expand(lsys.LSystem("ABC", edited_rules), 6)
+    assert cache.invalidated_count > 0
+    assert ("B", 1) in cache._expansions and cache.hit_count > hits
+
+def test_expansion_cache_continues_and_switches_rules():
+    cache = lsys.ExpansionCache(max_lsystems = 2)
+
+    for rules in ([("F", "F+G"), ("G", "F-G")], [("F", "F+G"), ("G", "FF-G")], [("F", "F+G"), ("G", "F-G")]):
+        assert cache.get("F", rules, 3) == expand(lsys.LSystem("F", rules), 3)
+        assert cache.get_generations("F", rules, 6) == [lsys.LSystem("F", rules).current_state] + [
+            next(lsystem) for lsystem in [lsys.LSystem("F", rules)] for _ in range(6)]
+
+def test_stochastic_choices_only_depend_on_seed_generation_and_position():
+    rewriter = lsys.RuleRewriter(STOCHASTIC_RULES, 11)
+    state = expand(lsys.LSystem("FG", STOCHASTIC_RULES, 11), 5)
+
+    #Any split rewrites the same as the whole state
+    whole = rewriter.rewrite(state, 5)
+    for size in (1, 7, 64):
+        assert "".join(rewriter.rewrite(state[start:start + size], 5, start) for start in range(0, len(state), size)) == whole
+
+    assert lsys.RuleRewriter(STOCHASTIC_RULES, 11).rewrite(state, 5) == whole
+    assert lsys.RuleRewriter(STOCHASTIC_RULES, 12).rewrite(state, 5) != whole
+    assert rewriter.rewrite(state, 6) != whole
+
+def test_stochastic_choices_follow_the_weights():
+    rewriter = lsys.RuleRewriter([("F", [("a", 1), ("b", 3), ("c", 0)])], 2)
+    counts = collections.Counter(rewriter.rewrite("F" * 20000, 0))
+
+    assert counts["c"] == 0
+    assert counts["b"] / counts["a"] == pytest.approx(3, rel = 0.1)
+
+def test_deterministic_rules_rewrite_like_the_plain_loop():
+    #Duplicate rules are joined, a quirk of the original __next__
+    rules = [("F", "F+F"), ("G", "GG"), ("F", "-")]
+    lsystem = lsys.LSystem("FGX", rules)
+    rewriter = lsys.RuleRewriter(rules)
+
+    assert rewriter.rewrite("FGX", 0) == "F+F-GGX"
+    assert next(lsystem) == "F+F-GGX"
+    assert lsystem.get_rewriter() is lsystem.get_rewriter()
+
+@pytest.mark.parametrize("rules", [
+    [("F", [("F", 0)])],
+    [("F", [])],
+    [("F", "FF"), ("F", [("F", 1)])],
+    [("F", [("F", 1)]), ("F", [("G", 1)])]])
+def test_invalid_stochastic_rules_raise(rules):
+    with pytest.raises(ValueError):
+        lsys.RuleRewriter(rules)
+
+def test_rewriter_is_rebuilt_when_rules_or_seed_change():
+    lsystem = lsys.LSystem("F", [("F", [("F+", 1), ("F-", 1)])], 1)
+    rewriter = lsystem.get_rewriter()
+
+    lsystem.rules[0][1].append(("FF", 1))
+    assert lsystem.get_rewriter() is not rewriter
+    rewriter = lsystem.get_rewriter()
+
+    lsystem.seed = 2
+    assert lsystem.get_rewriter() is not rewriter and lsystem.get_rewriter().seed == 2
+
+def test_deduplicator_removes_retraced_segments_in_either_direction():
+    deduplicator = lsys.SegmentDeduplicator()
+    segments = [(0, 0, 10, 0, 1, "#fff"), (10, 0, 0, 0.001, 1, "#fff"), (0, 0, 10, 0, 2, "#fff"), 
+        (0, 0, 10, 0, 1, "#000"), (0, 0, 10, 0.01, 1, "#fff"), (0, 0, 10, 0, 1, "#fff")]
+
+    assert list(deduplicator.filter(segments)) == [segments[0], segments[2], segments[3], segments[4]]
+    assert deduplicator.get_duplicate_ratio() == 2 / 6
+
+def test_deduplicated_trace_draws_every_distinct_line():
+    rules = [("F", "F[+F]F[-F][F]")]
+    symbols = {"F" : ("move_down", None), "+" : ("turn_right", None), "-" : ("turn_left", None), 
+        "[" : ("state_save", None), "]" : ("state_load", None)}
+    segments = list(lsys.trace_lsystem((400, 400), expand(lsys.LSystem("F", rules), 3), symbols, (0, 0), 90, 90, 
+        0.1, 1))
+    deduplicator = lsys.SegmentDeduplicator()
+    kept = list(deduplicator.filter(segments))
+
+    def get_key(segment):
+        start = (round(segment.x0, 2), round(segment.y0, 2))
+        end = (round(segment.x1, 2), round(segment.y1, 2))
+        return (min(start, end), max(start, end))
+
+    assert 0 < deduplicator.duplicate_count < len(segments)
+    assert len(kept) == len(set(get_key(segment) for segment in segments))
+
+def get_origins_naively(generations, rules, seed):
+    #Rewrites every generation again one symbol (or context match) at a time, recording
+    #(parent index, rule var or None if copied, successor, offset) for every symbol written
+    context_sensitive = lsys.is_context_sensitive(rules)
+    rewriter = lsys.RuleRewriter(rules, seed) if not context_sensitive else None
+    origins = [None]
+
+    for generation in range(1, len(generations)):
+        previous = generations[generation - 1]
+        written = []
+
+        if context_sensitive:
+            for start, length, output, matched in get_parts_naively(previous, rules, seed, generation - 1):
+                for offset in range(len(output)):
+                    if matched:
+                        written.append((start, previous[start:start + length], output, offset))
+                    else:
+                        written.append((start + offset, None, None, None))
+        else:
+            for position, char in enumerate(previous):
+                successor = rewriter.rewrite(char, generation - 1, position)
+                has_rule = char in rewriter.choices or ord(char) in rewriter.table
+                for offset in range(len(successor)):
+                    written.append((position, char, successor, offset) if has_rule else (position, None, None, None))
+
+        assert len(written) == len(generations[generation])
+        origins.append(written)
+
+    return origins
+
+def find_origin_naively(origins, index):
+    for generation in range(len(origins) - 1, 0, -1):
+        parent_index, var, successor, offset = origins[generation][index]
+        if var != None:
+            return lsys.SymbolOrigin(generation, parent_index, var, successor, offset)
+        index = parent_index
+    return None
+
+@pytest.mark.parametrize("axiom, rules", [
+    ("FX", [("F", "F+G"), ("G", "F-G[X]"), ("X", "")]),
+    ("FG", STOCHASTIC_RULES),
+    ("BAAAA+AB", [("A", lsys.ContextSuccessor("BA", "B", "")), ("B", lsys.ContextSuccessor("A", "", "")), 
+        ("AA", lsys.ContextSuccessor("A+", "+", "B"))])])
+def test_symbol_origin_index_finds_the_rule_that_wrote_every_symbol(axiom, rules):
+    lsystem = lsys.LSystem(axiom, rules, 9)
+    generations = [axiom] + [next(lsystem) for _ in range(5)]
+    origins = get_origins_naively(generations, rules, 9)
+    index = lsys.SymbolOriginIndex(generations, rules, 9)
+
+    found = [index.get_origin(symbol_index) for symbol_index in range(len(generations[-1]))]
+
+    assert found == [find_origin_naively(origins, symbol_index) for symbol_index in range(len(generations[-1]))]
+    assert lsys.get_symbol_origin(generations, rules, len(generations[-1]) - 1, 9) == found[-1]
+
+def test_length_bound_is_exact_for_deterministic_rules():
+    assert lsys.get_length_bound("FX", [("F", "F+G"), ("G", "F-G[X]"), ("X", ""), ("F", "-")], 7) == len(
+        expand(lsys.LSystem("FX", [("F", "F+G"), ("G", "F-G[X]"), ("X", ""), ("F", "-")]), 7))
+
+def test_length_bound_bounds_random_stochastic_and_context_rules():
+    import random
+    random = random.Random(8)
+
+    for seed in range(200):
+        rules = get_random_context_rules(random)
+        axiom = "".join(random.choice("AB+") for _ in range(random.randint(1, 6)))
+
+        assert lsys.get_length_bound(axiom, rules, 5) >= len(expand(lsys.LSystem(axiom, rules, seed), 5))
@@ -0,0 +1,66 @@
+import math
+import pytest
+
+np = pytest.importorskip("numpy")
+import parametric as par
+
+NAMES = {"sin" : math.sin, "cos" : math.cos, "sqrt" : math.sqrt, "abs" : abs, "min" : min, "max" : max, "pi" : math.pi}
+
+def rewrite_naively(modules, rules):
+    #Rewrites one module at a time, evaluating the arguments with floats
+    rewritten = []
+    for symbol, args in modules:
+        for predecessor, successor in rules:
+            (rule_symbol, params), = par.split_modules(predecessor)
+            if rule_symbol == symbol and len(params) == len(args):
+                names = dict(NAMES, **dict(zip(params, args)))
+                rewritten.extend((successor_symbol, [eval(arg, {"__builtins__" : {}}, names) for arg in successor_args])
+                    for successor_symbol, successor_args in par.split_modules(successor))
+                break
+        else:
+            rewritten.append((symbol, args))
+    return rewritten
+
+def get_modules(state):
+    return [(symbol, args[:arity]) for symbol, arity, args in zip(state.get_symbols(), state.arities.tolist(), state.args.tolist())]
+
+@pytest.mark.parametrize("axiom, rules", [
+    ("F(160,9)", [("F(l,w)", "&(w)F(l)[+(25)F(l*0.62,w*0.7)][-(35)F(l*0.55,w*0.6)]%(l/2)F(l*0.4,w*0.8)")]),
+    ("A(1)B(2,3)FA", [("A(x)", "A(x+1)B(sqrt(x),x**2)"), ("B(a,b)", "F(max(a,b))-(sin(a)*pi)A(b/2)"), ("A", "AF(1)")])])
+def test_parametric_lsystem_rewrites_like_a_module_by_module_rewrite(axiom, rules):
+    lsystem = par.ParametricLSystem(axiom, rules)
+    modules = [(symbol, [float(arg) for arg in args]) for symbol, args in par.split_modules(axiom)]
+
+    for _ in range(4):
+        modules = rewrite_naively(modules, rules)
+        actual = get_modules(next(lsystem))
+
+        assert [symbol for symbol, _ in actual] == [symbol for symbol, _ in modules]
+        assert [args for _, args in actual] == [pytest.approx(args) for _, args in modules]
+
+def test_parametric_state_reads_like_a_string():
+    state = par.ParametricState.from_string("F(1.5,2)+(30)G[F]")
+
+    assert len(state) == 6 and "".join(state) == "F+G[F]" and state[2] == "G"
+    assert str(state) == "F(1.5,2)+(30)G[F]"
+    assert [state.get_number(index) for index in range(3)] == [1.5, 30, None]
+    assert state.find("F", 1) == 4
+
+def test_rules_record_where_modules_came_from():
+    lsystem = par.ParametricLSystem("XF(2)", [("F(x)", "F(x)G(x)"), ("F(x)", "+")])
+    state = next(lsystem)
+
+    assert "".join(state) == "XFG+"
+    assert state.parents.tolist() == [0, 1, 1, 1]
+    assert state.rule_indices.tolist() == [-1, 0, 0, 0]
+    assert state.rules == [("F(x)", "F(x)G(x)+")]
+
+@pytest.mark.parametrize("expression", ["__import__('os')", "x.real", "y + 1", "[x]", "(lambda: 1)()", "sin(x, key = 1)"])
+def test_unsafe_or_unknown_expressions_are_refused(expression):
+    with pytest.raises(ValueError):
+        par.compile_expression(expression, ("x",))
+
+@pytest.mark.parametrize("rules", [[("F(l)", [("F", 1)])], [("FG(l)", "F")], [("F(sin)", "F")], [("F(a)", "F"), ("F(b)", "G")]])
+def test_invalid_rules_are_refused(rules):
+    with pytest.raises(ValueError):
+        par.ParametricLSystem("F(1)", rules)
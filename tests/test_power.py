@@ -0,0 +1,59 @@
+import collections
+import random
+import pytest
+import lsystem as lsys
+
+RULES = [("F", "F+G"), ("G", "F-G[X]"), ("X", "")]
+
+def expand(axiom, rules, iterations):
+    lsystem = lsys.LSystem(axiom, rules)
+    for _ in range(iterations):
+        next(lsystem)
+    return lsystem.current_state
+
+@pytest.mark.parametrize("iterations", [0, 1, 2, 5, 8, 11])
+def test_power_lsystem_state_is_the_expansion(iterations):
+    power = lsys.PowerLSystem("FX", RULES, max_jump_length = 16)
+    expected = expand("FX", RULES, iterations)
+    state = power.get_state(iterations)
+
+    assert len(state) == len(expected)
+    assert power.get_counts(iterations) == collections.Counter(expected)
+    assert str(state) == expected
+    assert "".join(power.iter_blocks(iterations, block_size = 7)) == expected
+
+def test_power_lsystem_counts_from_another_axiom():
+    power = lsys.PowerLSystem("FX", RULES)
+
+    assert power.get_length(6, "G") == len(expand("G", RULES, 6))
+    assert power.get_counts(6, "GF") == collections.Counter(expand("GF", RULES, 6))
+
+def test_lazy_string_indexing_and_slicing():
+    expected = expand("FX", RULES, 10)
+    state = lsys.PowerLSystem("FX", RULES, max_jump_length = 16).get_state(10)
+    random_ = random.Random(3)
+
+    #Forwards, backwards and far back past the lookbehind
+    for index in [0, 1, 500, 499, len(expected) - 1, 3, -1, -len(expected)] + [
+            random_.randrange(len(expected)) for _ in range(50)]:
+        assert state[index] == expected[index]
+
+    for start, stop, step in [(0, 10, 1), (5, 200, 1), (None, None, 3), (100, 10, -2), (-50, None, 1), (7, 7, 1)]:
+        assert state[start:stop:step] == expected[start:stop:step]
+
+    with pytest.raises(IndexError):
+        state[len(expected)]
+
+def test_lazy_string_draws_like_the_string():
+    expected = expand("F", [("F", "F[+F]F[-F]F")], 4)
+    state = lsys.PowerLSystem("F", [("F", "F[+F]F[-F]F")]).get_state(4)
+    symbols = {"F" : ("move_down", None), "+" : ("turn_right", None), "-" : ("turn_left", None), 
+        "[" : ("state_save", None), "]" : ("state_load", None)}
+    arguments = (symbols, (0, 0), 90, 25, 0.1, 1, ["#ffffff"], 0)
+
+    assert list(lsys.trace_lsystem((400, 400), state, *arguments)) == list(lsys.trace_lsystem((400, 400), expected, *arguments))
+
+@pytest.mark.parametrize("rules", [[("F", [("F", 1), ("FF", 1)])], [("F", lsys.ContextSuccessor("FF", "G", ""))]])
+def test_power_lsystem_refuses_position_dependent_rules(rules):
+    with pytest.raises(ValueError):
+        lsys.PowerLSystem("F", rules)
@@ -0,0 +1,43 @@
+import collections
+import glob
+import os
+import pytest
+import lsysfilehandler as fh
+import profiler
+
+LSYSTEMS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "lsystems")
+
+def get_profiled_files():
+    return [filepath for filepath in sorted(glob.glob(os.path.join(LSYSTEMS_DIR, "*.json")))
+        if not fh.is_parametric(fh.load_lsystem(filepath))]
+
+@pytest.mark.parametrize("filepath", get_profiled_files(), ids = os.path.basename)
+def test_draw_ops_add_up_to_the_final_state(filepath):
+    lsysobj = fh.load_lsystem(filepath)
+    iterations = min(lsysobj["settings"]["iterations"], 5)
+
+    profile = profiler.profile_lsystem_object(lsysobj, iterations)
+
+    lsystem = fh.create_lsystem(lsysobj)
+    for _ in range(iterations):
+        next(lsystem)
+    symbols = fh.get_symbols(lsysobj)
+
+    assert profile.draw_op_count == sum(1 for char in lsystem.current_state if char in symbols)
+    assert sum(row.draw_ops for row in profile.rows) == profile.draw_op_count
+    assert sum(row.draw_ops for row in profile.get_rule_totals()) == profile.draw_op_count
+
+@pytest.mark.parametrize("filepath", get_profiled_files(), ids = os.path.basename)
+def test_chars_add_up_to_every_generation(filepath):
+    lsysobj = fh.load_lsystem(filepath)
+    iterations = min(lsysobj["settings"]["iterations"], 5)
+
+    profile = profiler.profile_lsystem_object(lsysobj, iterations)
+
+    chars = collections.Counter()
+    for row in profile.rows:
+        chars[row.generation] += row.chars
+
+    lsystem = fh.create_lsystem(lsysobj)
+    lengths = [len(lsystem.current_state)] + [len(next(lsystem)) for _ in range(iterations)]
+    assert [chars[generation] for generation in range(iterations + 1)] == lengths
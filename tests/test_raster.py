@@ -0,0 +1,87 @@
+import io
+import math
+import random
+import struct
+import zlib
+import raster
+
+WHITE = b"\xff\xff\xff"
+
+def is_covered(column, row, x0, y0, x1, y1, thickness):
+    #Whether the pixel's center is inside the segment's quad
+    x = column + 0.5 - x0
+    y = row + 0.5 - y0
+    length = math.hypot(x1 - x0, y1 - y0)
+    along = (x * (x1 - x0) + y * (y1 - y0)) / length
+    across = (x * (y1 - y0) - y * (x1 - x0)) / length
+    return 0 <= along <= length and abs(across) <= thickness / 2
+
+def get_covered_pixels(tile):
+    return {(column, row) for row in range(tile.height) for column in range(tile.width)
+        if tile.get_row(row)[column * 3:column * 3 + 3] == WHITE}
+
+def test_horizontal_line_covers_the_pixels_it_runs_through():
+    tile = raster.RasterTile(0, 0, 10, 10)
+    tile.draw_segment(1, 5, 8, 5, 2, WHITE)
+
+    assert get_covered_pixels(tile) == {(column, row) for column in range(1, 8) for row in (4, 5)}
+
+def test_segments_cover_the_pixel_centers_inside_them():
+    random_ = random.Random(1)
+
+    for _ in range(200):
+        segment = (random_.uniform(-5, 45), random_.uniform(-5, 35), random_.uniform(-5, 45), random_.uniform(-5, 35), 
+            random_.uniform(0.5, 6))
+        tile = raster.RasterTile(3, 2, 40, 30)
+        tile.draw_segment(*segment, WHITE)
+
+        expected = {(column, row) for row in range(30) for column in range(40)
+            if is_covered(column + 3, row + 2, *segment)}
+        assert get_covered_pixels(tile) == expected
+
+def test_tiles_of_an_image_draw_like_one_tile():
+    random_ = random.Random(2)
+    segments = [(random_.uniform(0, 64), random_.uniform(0, 64), random_.uniform(0, 64), random_.uniform(0, 64), 
+        random_.uniform(1, 4), bytes(random_.randrange(256) for _ in range(3))) for _ in range(50)]
+
+    whole = raster.RasterTile(0, 0, 64, 64, (1, 2, 3))
+    whole.draw_segment_list(segments)
+
+    for tile_y in (0, 24, 48):
+        tiles = [raster.RasterTile(tile_x, tile_y, min(24, 64 - tile_x), min(24, 64 - tile_y), (1, 2, 3)) 
+            for tile_x in (0, 24, 48)]
+        for tile in tiles:
+            tile.draw_segment_list(segments)
+
+        for row in range(tiles[0].height):
+            assert b"".join(tile.get_row(row) for tile in tiles) == whole.get_row(tile_y + row)
+
+def test_png_writer_writes_the_rows():
+    rows = [bytes(random.Random(row).randrange(256) for _ in range(3 * 5)) for row in range(4)]
+    fp = io.BytesIO()
+
+    writer = raster.PngWriter(fp, 5, 4)
+    for row in rows:
+        writer.write_row(row)
+    writer.close()
+
+    data = fp.getvalue()
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+
+    chunks = []
+    position = 8
+    while position < len(data):
+        length, = struct.unpack(">I", data[position:position + 4])
+        chunk_type = data[position + 4:position + 8]
+        chunk = data[position + 8:position + 8 + length]
+        assert struct.unpack(">I", data[position + 8 + length:position + 12 + length])[0] == zlib.crc32(chunk_type + chunk)
+        chunks.append((chunk_type, chunk))
+        position += 12 + length
+
+    assert chunks[0] == (b"IHDR", struct.pack(">IIBBBBB", 5, 4, 8, 2, 0, 0, 0))
+    assert chunks[-1] == (b"IEND", b"")
+    assert zlib.decompress(b"".join(chunk for chunk_type, chunk in chunks if chunk_type == b"IDAT")) == b"".join(
+        b"\x00" + row for row in rows)
+
+def test_rgb_bytes():
+    assert raster.get_rgb_bytes("#ff8000") == b"\xff\x80\x00"
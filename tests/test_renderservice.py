@@ -0,0 +1,103 @@
+import concurrent.futures
+import os
+import threading
+import time
+import pytest
+import lsysfilehandler as fh
+import renderservice
+
+LSYSTEMS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "lsystems")
+
+@pytest.fixture
+def service():
+    service = renderservice.RenderService(workers = 1)
+    yield service
+    service.close()
+
+def wait_for(condition, timeout = 10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_identical_requests_are_rendered_once(service, monkeypatch):
+    release = threading.Event()
+    renders = []
+
+    def render_held(lsysobj, image_format, size, scale = 1):
+        renders.append(lsysobj["settings"]["axiom"])
+        release.wait(10)
+        return b"image"
+
+    #Renders in a thread of this process, so it can be held until every request waits for it
+    monkeypatch.setattr(renderservice, "render_lsystem_object", render_held)
+    service.close()
+    service._executor = concurrent.futures.ThreadPoolExecutor(1)
+
+    lsysobj = fh.load_lsystem(os.path.join(LSYSTEMS_DIR, "koch-curve.json"))
+    results = []
+    threads = [threading.Thread(target = lambda: results.append(service.render(lsysobj, "svg", (100, 100))))
+        for _ in range(8)]
+
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: service.get_metrics()["waiting_requests"] == len(threads))
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    metrics = service.get_metrics()
+    assert len(renders) == 1
+    assert (metrics["requests"], metrics["rendered"], metrics["coalesced"]) == (8, 1, 7)
+    assert len(set(results)) == 1 and results[0][1] == b"image"
+
+    #Finished, the same request is served from the cache
+    assert service.render(lsysobj, "svg", (100, 100)) == results[0]
+    assert service.get_metrics()["cache_hits"] == 1
+
+def test_different_requests_are_not_coalesced(service):
+    lsysobj = fh.load_lsystem(os.path.join(LSYSTEMS_DIR, "koch-curve.json"))
+
+    first = service.render(lsysobj, "svg", (100, 100))
+    second = service.render(lsysobj, "svg", (120, 100))
+
+    assert first[0] != second[0]
+    assert service.get_metrics()["rendered"] == 2
+
+@pytest.mark.parametrize("size, scale", [((0, 100), 1), ((100, 9000), 1), ((100, 100), 0), ((100, 100), float("nan"))])
+def test_out_of_range_requests_are_refused(service, size, scale):
+    lsysobj = fh.load_lsystem(os.path.join(LSYSTEMS_DIR, "koch-curve.json"))
+
+    with pytest.raises(ValueError):
+        service.render(lsysobj, "png", size, scale)
+
+def test_requests_expanding_too_far_are_refused(service):
+    lsysobj = fh.load_lsystem(os.path.join(LSYSTEMS_DIR, "koch-curve.json"))
+    lsysobj["rules"] = [{"F" : "F[+F][-F]F[+F][-F]FF"}]
+    lsysobj["settings"]["iterations"] = 12
+    service.max_length = 1 << 20
+
+    with pytest.raises(ValueError, match = "symbols"):
+        service.render(lsysobj, "svg", (100, 100))
+
+    assert service.get_metrics()["requests"] == 0
+
+@pytest.mark.parametrize("name", ["organic-tree", "stochastic-plant", "parametric-tree"])
+def test_expanded_length_bounds_the_expansion(name):
+    lsysobj = fh.load_lsystem(os.path.join(LSYSTEMS_DIR, name + ".json"))
+    lsystem = fh.create_lsystem(lsysobj)
+    for _ in range(lsysobj["settings"]["iterations"]):
+        next(lsystem)
+
+    assert renderservice.get_expanded_length(lsysobj) >= len(lsystem.current_state)
+
+def test_svg_scales_share_a_cache_entry(service):
+    lsysobj = fh.load_lsystem(os.path.join(LSYSTEMS_DIR, "koch-curve.json"))
+
+    first = service.render(lsysobj, "svg", (100, 100), 1)
+    second = service.render(lsysobj, "svg", (100, 100), 3)
+
+    assert first == second
+    assert (service.get_metrics()["rendered"], service.get_metrics()["cache_hits"]) == (1, 1)
+    assert renderservice.get_request_key(lsysobj, "png", (100, 100), 1) != renderservice.get_request_key(
+        lsysobj, "png", (100, 100), 3)
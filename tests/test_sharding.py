@@ -0,0 +1,134 @@
+import multiprocessing
+import multiprocessing.connection
+import os
+import pytest
+import glob
+import lsystem as lsys
+import lsysfilehandler as fh
+import sharding as sh
+
+LSYSTEMS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "lsystems")
+SIZE = (805, 770)
+
+def get_deterministic_files():
+    files = []
+    for filepath in sorted(glob.glob(os.path.join(LSYSTEMS_DIR, "*.json"))):
+        lsysobj = fh.load_lsystem(filepath)
+        rules = fh.get_rules(lsysobj)
+        if not (fh.is_parametric(lsysobj) or lsys.is_stochastic(rules) or lsys.is_context_sensitive(rules)):
+            files.append(filepath)
+    return files
+
+def get_serial_segments(lsysobj):
+    lsystem = fh.create_lsystem(lsysobj)
+    for _ in range(lsysobj["settings"]["iterations"]):
+        next(lsystem)
+    return list(lsys.trace_lsystem(SIZE, lsystem.current_state, *fh.get_draw_arguments(lsysobj)))
+
+def quantize(segment):
+    return tuple(round(value, 6) for value in segment[:5]) + (segment[5], segment.color_num, segment.depth, segment.index)
+
+def serve_dying_worker(authkey, ready):
+    #Takes a part and dies without answering
+    with multiprocessing.connection.Listener(("127.0.0.1", 0), authkey = authkey) as listener:
+        ready.send(listener.address)
+        connection = listener.accept()
+        connection.recv()
+        os._exit(1)
+
+@pytest.fixture(scope = "module")
+def workers():
+    authkey, _ = sh.create_authkey()
+    processes, addresses = sh.start_local_workers(2, authkey)
+    yield (addresses, authkey)
+    for process in processes:
+        process.terminate()
+
+@pytest.mark.parametrize("filepath", get_deterministic_files(), ids = os.path.basename)
+def test_transform_start_states_match_walk(filepath):
+    lsysobj = fh.load_lsystem(filepath)
+    rules = fh.get_rules(lsysobj)
+    symbols, start_pos, start_angle, turn_angle, start_step, thickness, colors, start_color = fh.get_draw_arguments(lsysobj)
+    shards = sh.split_derivation(lsysobj["settings"]["axiom"], rules, lsysobj["settings"]["iterations"], 8)
+    transforms = sh.TransformTable(rules, symbols, turn_angle, thickness, colors, start_color)
+    state = lsys.get_start_state(SIZE, start_pos, start_angle, start_step, thickness, colors, start_color)
+
+    for index, shard in enumerate(shards[:-1]):
+        lookahead = sh.get_shard_prefix(shards[index + 1], rules, sh.LOOKAHEAD_LENGTH)
+        text = sh.get_shard_string(shard, rules)
+        expected = sh._get_end_state(lsys.trace_from_state(text + lookahead, symbols, state, turn_angle, 
+            thickness, colors, start_color, end = len(text)))
+
+        turtle = sh.Turtle.from_state(state)
+        assert transforms.walk(turtle, shard.run, shard.depth, lookahead[:1])
+        state = turtle.to_state(state.color, colors)
+
+        assert state.x == pytest.approx(expected.x, abs = 1e-9)
+        assert state.y == pytest.approx(expected.y, abs = 1e-9)
+        assert state.step_length == pytest.approx(expected.step_length)
+        assert state.thickness == pytest.approx(expected.thickness)
+        assert (state.color_num, state.color, state.directions_flipped) == (
+            expected.color_num, expected.color, expected.directions_flipped)
+        assert [saved[3:] for saved in state.stack] == [saved[3:] for saved in expected.stack]
+
+@pytest.mark.parametrize("name", ["koch-curve_color", "organic-tree", "doily_color", "sierpinski-triangle_color"])
+def test_sharded_segments_match_serial(workers, name):
+    addresses, authkey = workers
+    lsysobj = fh.load_lsystem(os.path.join(LSYSTEMS_DIR, name + ".json"))
+
+    columns, segment_colors = sh.ShardCoordinator(addresses, authkey).trace(lsysobj, SIZE)
+
+    assert [quantize(segment) for segment in sh.iter_segments(columns, segment_colors)] == [
+        quantize(segment) for segment in get_serial_segments(lsysobj)]
+
+def test_part_of_a_failed_worker_is_traced_by_another(workers):
+    addresses, authkey = workers
+    receiver, sender = multiprocessing.Pipe(duplex = False)
+    dying = multiprocessing.Process(target = serve_dying_worker, args = (authkey, sender), daemon = True)
+    dying.start()
+
+    try:
+        lsysobj = fh.load_lsystem(os.path.join(LSYSTEMS_DIR, "organic-tree.json"))
+        coordinator = sh.ShardCoordinator([receiver.recv(), addresses[0]], authkey)
+        columns, segment_colors = coordinator.trace(lsysobj, SIZE, shard_count = 8)
+    finally:
+        dying.join(5)
+
+    assert dying.exitcode == 1
+    assert [quantize(segment) for segment in sh.iter_segments(columns, segment_colors)] == [
+        quantize(segment) for segment in get_serial_segments(lsysobj)]
+
+def test_no_worker_left_raises(workers):
+    _, authkey = workers
+    receiver, sender = multiprocessing.Pipe(duplex = False)
+    dying = multiprocessing.Process(target = serve_dying_worker, args = (authkey, sender), daemon = True)
+    dying.start()
+
+    lsysobj = fh.load_lsystem(os.path.join(LSYSTEMS_DIR, "koch-curve.json"))
+    with pytest.raises(RuntimeError):
+        sh.ShardCoordinator([receiver.recv()], authkey).trace(lsysobj, SIZE, shard_count = 4)
+
+    dying.join(5)
+
+def test_workers_need_a_key(monkeypatch):
+    monkeypatch.setattr(sh, "AUTHKEY", None)
+
+    with pytest.raises(ValueError):
+        sh.get_authkey()
+    with pytest.raises(ValueError):
+        sh.ShardCoordinator([("127.0.0.1", sh.DEFAULT_PORT)])
+    with pytest.raises(ValueError):
+        sh.serve_worker("127.0.0.1", 0)
+
+def test_created_keys_are_random_and_printable():
+    key, text = sh.create_authkey()
+
+    assert key == text.encode("utf-8")
+    assert len(key) >= 32 and key != sh.create_authkey()[0]
+
+def test_coordinator_with_another_key_is_refused(workers):
+    addresses, _ = workers
+    lsysobj = fh.load_lsystem(os.path.join(LSYSTEMS_DIR, "koch-curve.json"))
+
+    with pytest.raises(RuntimeError):
+        sh.ShardCoordinator(addresses, sh.create_authkey()[0]).trace(lsysobj, SIZE, shard_count = 4)
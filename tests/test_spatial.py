@@ -0,0 +1,58 @@
+import random
+import lsystem as lsys
+import spatial as sp
+
+def get_random_segments(random_, count):
+    return [lsys.Segment(random_.uniform(0, 200), random_.uniform(0, 200), random_.uniform(0, 200), 
+        random_.uniform(0, 200), random_.uniform(1, 5), "#ffffff", 0, 0, index * 2) for index in range(count)]
+
+def test_grid_query_finds_every_overlapping_bounding_box_in_order():
+    random_ = random.Random(4)
+    grid = sp.SegmentGrid(16)
+    segments = get_random_segments(random_, 300)
+    for segment in segments:
+        grid.insert(segment, 2)
+
+    for _ in range(100):
+        min_x, min_y = random_.uniform(-20, 200), random_.uniform(-20, 200)
+        max_x, max_y = min_x + random_.uniform(0, 50), min_y + random_.uniform(0, 50)
+        found = grid.query(min_x, min_y, max_x, max_y)
+
+        assert found == sorted(found)
+        for index, segment in enumerate(segments):
+            if (min(segment.x0, segment.x1) - 2 <= max_x and max(segment.x0, segment.x1) + 2 >= min_x and 
+                    min(segment.y0, segment.y1) - 2 <= max_y and max(segment.y0, segment.y1) + 2 >= min_y):
+                assert index in found
+
+def test_pick_finds_the_nearest_segment_drawn_last():
+    random_ = random.Random(5)
+    picker = sp.SegmentPicker()
+    segments = list(picker.record(get_random_segments(random_, 200)))
+
+    assert len(picker) == 200
+    for _ in range(300):
+        x, y = random_.uniform(0, 200), random_.uniform(0, 200)
+        distances = [sp.get_point_segment_distance(x, y, segment) - segment.thickness / 2 for segment in segments]
+        candidates = [index for index, distance in enumerate(distances) if distance <= 3]
+        picked = picker.pick(x, y)
+
+        if not candidates:
+            assert picked == None
+        else:
+            nearest = min(distances[index] for index in candidates)
+            assert picked == segments[max(index for index in candidates if distances[index] == nearest)]
+
+def test_segments_between_symbol_indices():
+    picker = sp.SegmentPicker()
+    segments = list(picker.record(get_random_segments(random.Random(6), 10)))
+
+    assert picker.get_segments_between(4, 9) == segments[2:5]
+    assert picker.get_segments_between(0, 100) == segments
+
+def test_point_segment_distance():
+    segment = (0, 0, 10, 0)
+
+    assert sp.get_point_segment_distance(5, 3, segment) == 3
+    assert sp.get_point_segment_distance(-3, 4, segment) == 5
+    assert sp.get_point_segment_distance(13, -4, segment) == 5
+    assert sp.get_point_segment_distance(1, 1, (1, 2, 1, 2)) == 1
@@ -0,0 +1,94 @@
+import os
+import random
+import tempfile
+import pytest
+import lsystem as lsys
+import lsysfilehandler as fh
+
+LSYSTEMS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "lsystems")
+SIZE = (805, 770)
+BRACKETS = {"[" : ("state_save", None), "]" : ("state_load", None), "F" : ("move_down", None)}
+
+def run(generator):
+    #Returns the generator's segments and its return value
+    segments = []
+    while True:
+        try:
+            segments.append(next(generator))
+        except StopIteration as stop:
+            return (segments, stop.value)
+
+def load_expanded(name):
+    lsysobj = fh.load_lsystem(os.path.join(LSYSTEMS_DIR, name + ".json"))
+    lsystem = fh.create_lsystem(lsysobj)
+    for _ in range(min(lsysobj["settings"]["iterations"], 5)):
+        next(lsystem)
+    return (lsysobj, lsystem.current_state)
+
+@pytest.mark.parametrize("name", ["organic-tree", "dragon-curve_color", "sierpinski-triangle_color", "doily_color", 
+    "stochastic-plant"])
+def test_tracing_in_pieces_is_tracing_at_once(name):
+    lsysobj, string = load_expanded(name)
+    symbols, start_pos, start_angle, turn_angle, start_step, thickness, colors, start_color = fh.get_draw_arguments(lsysobj)
+    expected = list(lsys.trace_lsystem(SIZE, string, *fh.get_draw_arguments(lsysobj)))
+
+    random_ = random.Random(len(string))
+    cuts = [0] + sorted(random_.sample(range(1, len(string)), 12)) + [len(string)]
+    state = lsys.get_start_state(SIZE, start_pos, start_angle, start_step, thickness, colors, start_color)
+    segments = []
+
+    for start, end in zip(cuts, cuts[1:]):
+        piece, state = run(lsys.trace_from_state(string[start:], symbols, state, turn_angle, thickness, colors, 
+            start_color, end = end - start, index_offset = start))
+        segments.extend(piece)
+
+    assert segments == expected
+
+def test_trace_from_state_returns_the_turtle_after_the_string():
+    symbols = dict(BRACKETS, **{"+" : ("turn_right", None)})
+    state = lsys.get_start_state(SIZE, (0, 0), 90, 0.1, 1)
+
+    segments, end_state = run(lsys.trace_from_state("F[+F[", symbols, state, 90, 1))
+
+    assert len(segments) == 2 and [segment.index for segment in segments] == [0, 3]
+    assert (end_state.x, end_state.y) == pytest.approx((segments[1].x1, segments[1].y1))
+    assert len(end_state.stack) == 2 and end_state.stack[0][:2] == pytest.approx((segments[0].x1, segments[0].y1))
+
+@pytest.mark.parametrize("string, start_depth, depth", [("", 0, 0), ("F", 2, 2), ("[F[F]][[[]]]", 0, 3), ("]][", 2, 2)])
+def test_max_stack_depth(string, start_depth, depth):
+    assert lsys.get_max_stack_depth(string, BRACKETS, start_depth) == depth
+
+def test_max_stack_depth_tells_the_first_unmatched_load():
+    with pytest.raises(ValueError, match = "index 4"):
+        lsys.get_max_stack_depth("[F]F]]", BRACKETS)
+
+    assert lsys.get_max_stack_depth("]]", {"F" : ("move_down", None)}) == 0
+
+def test_max_stack_depth_of_blocked_states():
+    rules = [("F", "F[F[F]]F")]
+    string = "F"
+    for _ in range(4):
+        string = string.translate({ord("F") : "F[F[F]]F"})
+
+    assert lsys.get_max_stack_depth(lsys.PowerLSystem("F", rules).get_state(4), BRACKETS) == lsys.get_max_stack_depth(
+        string, BRACKETS) == 8
+
+    with tempfile.TemporaryDirectory() as directory:
+        state = lsys.expand_to_file(lsys.LSystem("F", rules), 4, directory, block_size = 7)
+        try:
+            assert lsys.get_max_stack_depth(state, BRACKETS) == 8
+        finally:
+            state.close()
+
+    with pytest.raises(ValueError, match = "index %d" % len(string)):
+        lsys.get_max_stack_depth(lsys.PowerLSystem("F]", rules).get_state(4), BRACKETS)
+
+class BlockedString(str):
+    def iter_blocks(self):
+        return (self[start:start + 3] for start in range(0, len(self), 3))
+
+def test_max_stack_depth_across_short_blocks():
+    assert lsys.get_max_stack_depth(BlockedString("F[[F]F[[[F]]]]"), BRACKETS) == 4
+
+    with pytest.raises(ValueError, match = "index 7"):
+        lsys.get_max_stack_depth(BlockedString("[F][FF]]F"), BRACKETS)